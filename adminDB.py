@@ -3,6 +3,20 @@ import sqlite3
 import pandas as pd
 import datetime
 import io
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+import archive
+import batches
+import events
+import fhir_bulk
+import health_data
+import health_import
+import metrics
+import notes_search
 
 # --- Fonctions de la base de données ---
 
@@ -11,7 +25,7 @@ def get_db_connection():
     Établit une connexion à la base de données SQLite.
     """
     try:
-        conn = sqlite3.connect('mesures_sante.db')
+        conn = health_data.get_db_connection()
         return conn
     except sqlite3.Error as e:
         st.error(f"Erreur de connexion à la base de données : {e}")
@@ -19,13 +33,12 @@ def get_db_connection():
 
 def get_table_list():
     """
-    Récupère une liste de toutes les tables non-système dans la base de données.
+    Récupère une liste de toutes les tables de données (hors tables système, index de recherche
+    et tables de fonctionnement comme le journal des imports).
     """
     conn = get_db_connection()
     if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = [row[0] for row in cursor.fetchall()]
+        tables = health_data.get_table_list(conn)
         conn.close()
         return tables
     return []
@@ -40,6 +53,7 @@ def clear_table(table_name):
             cursor = conn.cursor()
             cursor.execute(f"DELETE FROM {table_name}")
             conn.commit()
+            health_data.notify_write(table_name, conn=conn)
             st.success(f"La table '{table_name}' a été vidée avec succès.")
         except sqlite3.Error as e:
             st.error(f"Une erreur est survenue lors du vidage de la table '{table_name}' : {e}")
@@ -55,7 +69,11 @@ def delete_table(table_name):
         try:
             cursor = conn.cursor()
             cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            if table_name in metrics.note_tables() and notes_search.index_exists(conn):
+                # Les déclencheurs ont disparu avec la table : ses notes sont retirées de l'index
+                notes_search.rebuild_table(conn, table_name)
             conn.commit()
+            health_data.notify_write(table_name, conn=conn)
             st.success(f"La table '{table_name}' a été supprimée avec succès.")
         except sqlite3.Error as e:
             st.error(f"Une erreur est survenue lors de la suppression de la table '{table_name}' : {e}")
@@ -64,22 +82,23 @@ def delete_table(table_name):
 
 def load_table_data(table_name):
     """
-    Charge les données d'une table dans un DataFrame Pandas.
+    Charge les données d'une table dans un DataFrame Pandas (cache partagé).
     """
-    conn = get_db_connection()
-    if conn:
-        try:
-            df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-            return df
-        except pd.io.sql.DatabaseError as e:
-            st.warning(f"Impossible de charger les données de la table '{table_name}'. Elle est peut-être vide ou inaccessible. Erreur: {e}")
-            return pd.DataFrame()
-        finally:
-            conn.close()
-    return pd.DataFrame()
+    try:
+        return health_data.load_table(table_name)
+    except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+        st.warning(f"Impossible de charger les données de la table '{table_name}'. Elle est peut-être vide ou inaccessible. Erreur: {e}")
+        return pd.DataFrame()
 
 # --- Fonctions d'Exportation ---
 
+@st.cache_data(max_entries=8)
+def load_raw_table_data(table_name, version):
+    """
+    Contenu brut d'une table, tel qu'en base, pour l'export (relu quand sa version change).
+    """
+    return health_data.read_table(table_name)
+
 @st.cache_data
 def convert_df_to_csv(df):
     """
@@ -106,8 +125,207 @@ st.markdown("Utilisez cette page pour visualiser, gérer et exporter vos tables
 # --- Récupération dynamique des tables ---
 tables = get_table_list()
 
+# --- Rapport d'occupation mémoire ---
+if tables:
+    with st.expander("Empreinte mémoire des tables (avant / après compaction)"):
+        st.write("Comparaison de la taille en mémoire des tables lues brutes et sous forme compacte "
+                 "(dates datetime64, valeurs réduites en int16/float32, notes catégorielles).")
+        if st.button("Calculer le rapport mémoire", key="memory_report_btn"):
+            st.dataframe(health_data.memory_report(tables), use_container_width=True)
+
+# --- Archivage des mesures brutes ---
+with st.expander("Archivage des mesures brutes anciennes"):
+    st.write(f"Les mesures brutes de plus de {archive.RETENTION_DAYS} jours sont déplacées dans "
+             f"`{health_data.ARCHIVE_PATH}` ; elles restent visibles dans les graphiques et les analyses. "
+             "Le premier archivage et le VACUUM complet de la base, qui la bloquent pendant l'opération, "
+             "ne sont lancés que par ce bouton ; la maintenance automatique fait ensuite les archivages "
+             "quotidiens et le vacuum incrémental.")
+    st.dataframe(pd.DataFrame(archive.archive_stats()), use_container_width=True)
+    if st.button("Lancer l'archivage et la maintenance", key="maintenance_btn"):
+        try:
+            done = archive.run_maintenance(force=True)
+            st.success(f"Maintenance terminée : {', '.join(done)}.")
+        except sqlite3.Error as e:
+            st.error(f"Erreur pendant la maintenance : {e}")
+
+# --- Recherche dans les notes ---
+with st.expander("Recherche dans les notes des mesures"):
+    st.write("Recherche plein texte dans `Note1` et `Note2` de toutes les mesures "
+             "(accents et majuscules ignorés, mots partiels acceptés).")
+    notes_query = st.text_input("Mots recherchés :", key="notes_query_admin", placeholder="ex. médicament oublié")
+    notes_tables = st.multiselect("Tables :", metrics.note_tables(), default=metrics.note_tables(),
+                                  key="notes_tables_admin")
+    if notes_query:
+        try:
+            notes_search.ensure_index()
+            started = time.perf_counter()
+            matches = notes_search.search_notes(notes_query, tables=notes_tables, marks=('«', '»'))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if matches.empty:
+                st.info("Aucune note ne correspond à la recherche.")
+            else:
+                st.caption(f"{len(matches)} mesure(s) trouvée(s) en {elapsed_ms:.1f} ms "
+                           f"(limitées aux {notes_search.SEARCH_LIMIT} plus récentes).")
+                st.dataframe(matches[['Table', 'DateHeure', 'Extrait']], use_container_width=True, hide_index=True)
+        except sqlite3.Error as e:
+            st.error(f"Recherche dans les notes indisponible : {e}")
+
+# --- Événements (bandes sur les graphiques) ---
+with st.expander("Événements : traitements, maladies, voyages"):
+    st.write("Les événements sont affichés en bandes colorées sur les graphiques de pression, de glycémie "
+             "et de poids. Un événement d'un seul jour couvre la journée entière.")
+    with st.form("event_form", clear_on_submit=True):
+        col_event1, col_event2, col_event3 = st.columns(3)
+        with col_event1:
+            event_category = st.selectbox("Catégorie :", list(events.CATEGORIES), key="event_category")
+        with col_event2:
+            event_start = st.date_input("Début :", datetime.date.today(), key="event_start")
+        with col_event3:
+            event_end = st.date_input("Fin :", datetime.date.today(), key="event_end")
+        event_description = st.text_input("Description :", key="event_description",
+                                          placeholder="ex. passage à 10 mg de ramipril")
+        if st.form_submit_button("Ajouter l'événement"):
+            try:
+                events.add_event(event_start, datetime.datetime.combine(event_end, datetime.time(23, 59, 59)),
+                                 event_category, event_description)
+                st.success("Événement ajouté.")
+            except ValueError as e:
+                st.error(str(e))
+            except sqlite3.Error as e:
+                st.error(f"Erreur lors de l'enregistrement de l'événement : {e}")
+
+    try:
+        event_list = events.list_events()
+    except sqlite3.Error as e:
+        st.error(f"Erreur de lecture des événements : {e}")
+        event_list = pd.DataFrame()
+    if not event_list.empty:
+        st.dataframe(event_list, use_container_width=True, hide_index=True)
+        event_labels = {event.id: f"{event.Debut:%d/%m/%Y} — {event.Description or event.Categorie}"
+                        for event in event_list.itertuples(index=False)}
+        event_to_delete = st.selectbox("Événement à supprimer :", list(event_labels), format_func=event_labels.get,
+                                       key="event_delete_select")
+        if st.button("Supprimer l'événement", key="event_delete_btn"):
+            if events.delete_event(int(event_to_delete)):
+                st.success("Événement supprimé.")
+                st.rerun()
+
+# --- Import des exports de téléphone ---
+with st.expander("Importer un export Apple Santé ou Google Fit"):
+    st.write("Pression artérielle, pouls, glycémie et poids sont extraits de l'export (`export.zip` ou "
+             "`export.xml` d'Apple Santé, archive Takeout ou fichiers JSON de Google Fit). "
+             "Les mesures déjà présentes sont conservées.")
+    export_file = st.file_uploader("Fichier d'export :", type=["zip", "xml", "json"], key="health_export_file")
+    export_path = st.text_input("Ou chemin local de l'export (conseillé au-delà de quelques centaines de Mo) :",
+                                key="health_export_path")
+    if st.button("Importer l'export", key="health_export_btn"):
+        if export_file is None and not export_path:
+            st.warning("Choisissez un fichier ou indiquez le chemin de l'export.")
+        elif export_path and not os.path.exists(export_path):
+            st.error(f"Fichier introuvable : {export_path}")
+        else:
+            progress_bar = st.progress(0.0, text="Lecture de l'export...")
+
+            def show_progress(fraction, report):
+                progress_bar.progress(fraction, text=f"Lecture de l'export... {report.records:,} enregistrements".replace(',', ' '))
+
+            try:
+                if export_path:
+                    report = health_import.import_export(export_path, progress=show_progress)
+                else:
+                    report = health_import.import_export(export_file, name=export_file.name, progress=show_progress)
+                st.success(f"Import terminé : {report.summary()}")
+            except (sqlite3.Error, ET.ParseError, zipfile.BadZipFile, ValueError, OSError) as e:
+                st.error(f"Erreur pendant l'import de l'export : {e}")
+
+# --- Échange FHIR (NDJSON) ---
+with st.expander("Importer / exporter des Observations FHIR (NDJSON)"):
+    st.write("Une Observation FHIR par ligne (`.ndjson` ou `.ndjson.gz`) : pression artérielle (LOINC 85354-9), "
+             "pouls (8867-4), glycémie (2339-0, 15074-8) et poids (29463-7). Les fichiers sont importés en "
+             "parallèle ; les mesures déjà présentes sont conservées.")
+    fhir_files = st.file_uploader("Fichiers NDJSON :", type=["ndjson", "gz", "json"], accept_multiple_files=True,
+                                  key="fhir_import_files")
+    fhir_path = st.text_input("Ou chemin local d'un fichier ou d'un dossier de fichiers NDJSON :", key="fhir_import_path")
+    if st.button("Importer les Observations", key="fhir_import_btn"):
+        if not fhir_files and not fhir_path:
+            st.warning("Choisissez des fichiers ou indiquez un chemin.")
+        elif fhir_path and not os.path.exists(fhir_path):
+            st.error(f"Fichier ou dossier introuvable : {fhir_path}")
+        else:
+            progress_bar = st.progress(0.0, text="Import des fichiers NDJSON...")
+
+            def show_fhir_progress(fraction, report):
+                progress_bar.progress(fraction, text=f"Import des fichiers NDJSON... {report.records:,} Observations".replace(',', ' '))
+
+            try:
+                if fhir_path:
+                    report = fhir_bulk.import_files([fhir_path], progress=show_fhir_progress)
+                else:
+                    # Les processus d'import lisent des fichiers : les fichiers reçus sont écrits dans un dossier temporaire
+                    with tempfile.TemporaryDirectory(prefix='fhir_') as upload_dir:
+                        paths = []
+                        for uploaded in fhir_files:
+                            paths.append(os.path.join(upload_dir, os.path.basename(uploaded.name)))
+                            with open(paths[-1], 'wb') as f:
+                                f.write(uploaded.getbuffer())
+                        report = fhir_bulk.import_files(paths, progress=show_fhir_progress)
+                st.success(f"Import terminé : {report.summary()}")
+            except (sqlite3.Error, ValueError, OSError) as e:
+                st.error(f"Erreur pendant l'import FHIR : {e}")
+
+    fhir_patient = st.text_input("Identifiant du patient (référence `subject`, facultatif) :", key="fhir_patient")
+    if st.button("Exporter les mesures en NDJSON", key="fhir_export_btn"):
+        try:
+            exported = fhir_bulk.export_tables(fhir_bulk.EXPORT_DIR, patient=fhir_patient or None)
+            archive_buffer = io.BytesIO()
+            with zipfile.ZipFile(archive_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for table_name, (path, count) in exported.items():
+                    if path:
+                        zf.write(path, os.path.basename(path))
+            st.success("Export terminé dans `{}` : {}.".format(fhir_bulk.EXPORT_DIR, ", ".join(
+                f"{table_name} : {count} Observations" for table_name, (path, count) in exported.items() if path)))
+            st.download_button("📥 Télécharger l'export FHIR (zip)", data=archive_buffer.getvalue(),
+                               file_name="observations_fhir.zip", mime='application/zip', key="fhir_download_btn")
+        except (sqlite3.Error, OSError) as e:
+            st.error(f"Erreur pendant l'export FHIR : {e}")
+
+# --- Historique des imports (annulation d'un import) ---
+with st.expander("Historique des imports"):
+    st.write("Chaque import reçoit un numéro de lot. Annuler un import supprime uniquement ses mesures, puis "
+             "recalcule la synthèse, les statistiques de glycémie et les valeurs aberrantes de sa période ; "
+             "les autres mesures sont conservées. Les mesures qu'il avait remplacées ou complétées retrouvent "
+             "leur valeur d'avant l'import.")
+    if "batch_rollback_message" in st.session_state:
+        st.success(st.session_state.pop("batch_rollback_message"))
+    try:
+        batch_list = batches.list_batches()
+    except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+        st.error(f"Erreur de lecture du journal des imports : {e}")
+        batch_list = pd.DataFrame()
+    if batch_list.empty:
+        st.info("Aucun import enregistré.")
+    else:
+        st.dataframe(batch_list, use_container_width=True, hide_index=True)
+        active_batches = batch_list[batch_list['AnnuleLe'].isna()]
+        if not active_batches.empty:
+            batch_labels = {int(batch.Lot): f"Lot {batch.Lot} — {batch.Source} ({batch.ImporteLe}, {batch.Lignes} lignes)"
+                            for batch in active_batches.itertuples(index=False)}
+            batch_to_cancel = st.selectbox("Import à annuler :", list(batch_labels), format_func=batch_labels.get,
+                                           key="batch_rollback_select")
+            confirm_rollback = st.checkbox("Je confirme la suppression des mesures de cet import",
+                                           key="batch_rollback_confirm")
+            if st.button("Annuler l'import", key="batch_rollback_btn", disabled=not confirm_rollback):
+                try:
+                    removed = batches.rollback(batch_to_cancel)
+                    st.session_state["batch_rollback_message"] = "Import annulé : {}.".format(", ".join(
+                        f"{table_name} : {count} ligne(s) supprimée(s)" for table_name, count in removed.items()
+                    ) or "aucune mesure restante")
+                    st.rerun()
+                except sqlite3.Error as e:
+                    st.error(f"Erreur pendant l'annulation de l'import : {e}")
+
 if not tables:
-    st.info("Aucune table trouvée dans la base de données 'mesures_sante.db'.")
+    st.info(f"Aucune table trouvée dans la base de données '{health_data.DB_PATH}'.")
 else:
     # Création dynamique des onglets
     tabs = st.tabs(tables)
@@ -147,12 +365,14 @@ else:
                         )
                     
                     try:
+                        # L'export part des valeurs brutes, pas de la représentation compacte
+                        raw_table = load_raw_table_data(table_name, health_data.table_version(table_name))
                         # Conversion de la colonne de date et de la date de début pour la comparaison
-                        df_table[date_column] = pd.to_datetime(df_table[date_column], errors='coerce')
+                        dates = pd.to_datetime(raw_table[date_column], errors='coerce')
                         start_datetime = pd.to_datetime(start_date)
 
                         # Filtrage du DataFrame
-                        filtered_df = df_table[df_table[date_column] >= start_datetime].copy()
+                        filtered_df = raw_table[dates >= start_datetime].copy()
                         
                         st.write(f"Aperçu des {len(filtered_df)} lignes à exporter :")
                         st.dataframe(filtered_df, use_container_width=True)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Archivage des mesures brutes anciennes et maintenance de la base.
+
+Les lignes des tables brutes archivées (registre `metrics`) plus anciennes
+que la durée de rétention sont déplacées dans la base d'archive attachée ;
+les tables de synthèse restent dans la base principale, qui reste ainsi
+assez petite pour tenir dans le cache de pages. Les lectures passent par
+`health_data.table_source` et couvrent les deux bases de façon transparente.
+
+Un fil de maintenance planifie l'archivage, `PRAGMA optimize`, ANALYZE et
+le vacuum incrémental ; il détecte aussi les valeurs aberrantes des mesures
+écrites par d'autres outils. Le premier archivage (tout l'historique) et le
+VACUUM complet qui active le vacuum incrémental bloquent la base : ils ne
+sont lancés que depuis la page d'administration (`run_maintenance(force=True)`).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import health_data
+import metrics
+import notes_search
+
+# Âge (en jours) au-delà duquel les mesures brutes sont archivées
+RETENTION_DAYS = int(os.environ.get('MYHEALTH_RETENTION_DAYS', 365))
+# Intervalle entre deux passes de maintenance (secondes)
+MAINTENANCE_INTERVAL = 24 * 3600
+# Intervalle entre deux ANALYZE complets (secondes)
+ANALYZE_INTERVAL = 7 * 24 * 3600
+
+
+# --- Archivage ---
+
+def _create_archive_table(conn, table_name):
+    """Crée (ou complète) la table d'archive avec le schéma de la table principale."""
+    sql = conn.execute(
+        "SELECT sql FROM main.sqlite_master WHERE type='table' AND name = ? COLLATE NOCASE", (table_name,)
+    ).fetchone()[0]
+    definition = sql[sql.index('('):]
+    conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table_name} {definition}")
+
+    # Colonnes ajoutées à la table principale depuis la création de l'archive
+    archive_columns = set(health_data.table_columns(conn, table_name, 'archive'))
+    for row in conn.execute(f"PRAGMA main.table_info({table_name})").fetchall():
+        name, col_type = row[1], row[2]
+        if name not in archive_columns:
+            conn.execute(f"ALTER TABLE archive.{table_name} ADD COLUMN {name} {col_type}")
+    if health_data.BATCH_COLUMN in health_data.table_columns(conn, table_name, 'archive'):
+        # Annulation d'un import : ses mesures archivées sont retrouvées par l'index des lots
+        health_data.ensure_batch_column(conn, table_name, 'archive')
+
+
+def archive_old_readings(max_age_days=RETENTION_DAYS, tables=None):
+    """
+    Déplace les mesures brutes plus anciennes que `max_age_days` vers l'archive.
+
+    Retourne un dictionnaire {table: nombre de lignes déplacées}.
+    """
+    tables = tables or metrics.archived_tables()
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    moved = {}
+    conn = health_data.get_db_connection()
+    try:
+        health_data.attach_archive(conn, create=True)
+        for table_name in tables:
+            if not health_data.table_columns(conn, table_name):
+                continue
+            _create_archive_table(conn, table_name)
+            columns = ", ".join(health_data.table_columns(conn, table_name))
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO archive.{table_name} ({columns}) "
+                    f"SELECT {columns} FROM main.{table_name} WHERE DateHeure < ?", (cutoff,)
+                )
+                cursor = conn.execute(f"DELETE FROM main.{table_name} WHERE DateHeure < ?", (cutoff,))
+                moved[table_name] = cursor.rowcount
+                if table_name in metrics.note_tables() and notes_search.index_exists(conn):
+                    # Le déclencheur de suppression a retiré ces mesures de l'index des notes
+                    notes_search.index_rows(conn, table_name, source=f"archive.{table_name}",
+                                            where="s.DateHeure < ?", args=(cutoff,))
+        changed = [table_name for table_name, count in moved.items() if count]
+        if changed:
+            # Le contenu logique (union chaud + archive) est inchangé, mais la
+            # répartition des lignes l'est : les caches sont invalidés par prudence.
+            health_data.notify_write(*changed, end=cutoff, conn=conn)
+    finally:
+        conn.close()
+    return moved
+
+
+def archive_stats():
+    """Nombre de lignes chaudes et archivées pour chaque table archivable."""
+    stats = []
+    conn = health_data.get_db_connection()
+    try:
+        has_archive = health_data.attach_archive(conn)
+        for table_name in metrics.archived_tables():
+            if not health_data.table_columns(conn, table_name):
+                continue
+            hot = conn.execute(f"SELECT COUNT(*) FROM main.{table_name}").fetchone()[0]
+            archived = 0
+            if has_archive and health_data.table_columns(conn, table_name, 'archive'):
+                archived = conn.execute(f"SELECT COUNT(*) FROM archive.{table_name}").fetchone()[0]
+            stats.append({'Table': table_name, 'Lignes chaudes': hot, 'Lignes archivées': archived})
+    finally:
+        conn.close()
+    return stats
+
+
+# --- Maintenance ---
+
+def enable_incremental_vacuum(conn, schema='main'):
+    """Active auto_vacuum=INCREMENTAL d'une base (un VACUUM complet est nécessaire la première fois)."""
+    if conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0] != 2:
+        conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+        conn.execute(f"VACUUM {schema}")
+
+
+def _last_run(conn, task):
+    row = conn.execute("SELECT DernierPassage FROM archive.journal_maintenance WHERE Tache = ?", (task,)).fetchone()
+    return row[0] if row else 0
+
+
+def _record_run(conn, task, when):
+    conn.execute("INSERT OR REPLACE INTO archive.journal_maintenance (Tache, DernierPassage) VALUES (?, ?)",
+                 (task, when))
+
+
+def run_maintenance(force=False):
+    """
+    Passe de maintenance : archivage, statistiques du planificateur et vacuum incrémental.
+
+    Le journal des passages est conservé dans la base d'archive pour ne pas
+    encombrer la base principale. Sans `force` (fil de maintenance), seuls
+    les archivages suivant un premier archivage demandé et le vacuum
+    incrémental sont faits ; `force` lance toutes les tâches, VACUUM complet
+    compris si le vacuum incrémental n'est pas encore actif. Retourne la
+    liste des tâches exécutées.
+    """
+    now = time.time()
+    done = []
+    conn = health_data.get_db_connection()
+    try:
+        health_data.attach_archive(conn, create=True)
+        conn.execute("CREATE TABLE IF NOT EXISTS archive.journal_maintenance "
+                     "(Tache TEXT PRIMARY KEY, DernierPassage REAL)")
+        conn.commit()
+
+        # Mesures écrites hors de l'application : leurs indicateurs sont encore à calculer
+        if metrics.refresh_all_outliers():
+            done.append('aberrants')
+
+        last_archive = _last_run(conn, 'archivage')
+        if force or (last_archive and now - last_archive >= MAINTENANCE_INTERVAL):
+            archive_old_readings()
+            _record_run(conn, 'archivage', now)
+            done.append('archivage')
+
+        if force or now - _last_run(conn, 'analyze') >= ANALYZE_INTERVAL:
+            conn.execute("ANALYZE main")
+            conn.execute("ANALYZE archive")
+            _record_run(conn, 'analyze', now)
+            done.append('analyze')
+        else:
+            # Ne réanalyse que les tables dont les statistiques sont périmées
+            conn.execute("PRAGMA main.optimize")
+            done.append('optimize')
+
+        if force or now - _last_run(conn, 'vacuum') >= MAINTENANCE_INTERVAL:
+            conn.commit()
+            if force:
+                enable_incremental_vacuum(conn)
+                enable_incremental_vacuum(conn, 'archive')
+            conn.execute("PRAGMA main.incremental_vacuum")
+            conn.execute("PRAGMA archive.incremental_vacuum")
+            _record_run(conn, 'vacuum', now)
+            done.append('vacuum')
+        conn.commit()
+    finally:
+        conn.close()
+    return done
+
+
+class MaintenanceScheduler:
+    """Fil d'exécution unique lançant la maintenance à intervalle régulier."""
+
+    def __init__(self, check_interval=3600):
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Première passe au démarrage, puis vérification périodique
+        while True:
+            try:
+                run_maintenance()
+            except sqlite3.Error:
+                # Base occupée (import en cours) : la passe est reportée
+                pass
+            if self._stop.wait(self.check_interval):
+                break
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler():
+    """Démarre le planificateur de maintenance du processus (une seule fois)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = MaintenanceScheduler()
+        _scheduler.start()
+        return _scheduler
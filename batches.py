@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Journal des imports et annulation d'un import par son numéro de lot.
+
+Chaque import (fichier d'une page de mesures, export de téléphone,
+Observations FHIR) reçoit un numéro de lot, écrit dans la colonne indexée
+`Lot` des lignes qu'il ajoute ; le journal `lots_import` conserve sa source
+et, par table, le nombre de lignes et la période couverte.
+
+Annuler un import supprime ses lignes par l'index des lots, archive
+comprise, sans parcourir le reste des tables. Les mesures que l'import avait
+remplacées (glycémie) ou complétées (pouls d'un export de téléphone) sont
+rétablies dans leur version d'avant l'import, conservée dans
+`lots_import_preimage`, sauf si un import plus récent les a réécrites
+depuis. Seules les données dérivées de la période concernée sont ensuite
+recalculées : indicateurs d'aberrance des mesures voisines, tranches de la
+synthèse, statistiques journalières de glycémie.
+"""
+
+import pandas as pd
+
+import glucose_analytics
+import health_data
+import metrics
+import notes_search
+import outliers
+
+# Recalculs propres à une table brute, appelés avec la période modifiée
+DERIVED = {
+    'glycemie': glucose_analytics.refresh_daily_stats,
+}
+
+
+def list_batches(conn=None):
+    """Imports enregistrés, du plus récent au plus ancien, avec le détail par table."""
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        health_data.create_batch_log(conn)
+        return pd.read_sql_query(f'''
+            SELECT l.Lot, l.Source, l.ImporteLe, l.AnnuleLe,
+                   GROUP_CONCAT(t.NomTable || ' : ' || t.Lignes, ' ; ') AS Tables,
+                   COALESCE(SUM(t.Lignes), 0) AS Lignes, MIN(t.Premiere) AS Premiere, MAX(t.Derniere) AS Derniere
+            FROM {health_data.BATCH_LOG} AS l
+            LEFT JOIN {health_data.BATCH_LOG_TABLES} AS t ON t.Lot = l.Lot
+            GROUP BY l.Lot
+            ORDER BY l.Lot DESC
+        ''', conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _restore_rows(conn, table_name, batch):
+    """
+    Rétablit les lignes que le lot avait remplacées ou modifiées, sauf celles réécrites depuis par un autre lot.
+
+    L'indicateur d'aberrance n'est pas repris : il est recalculé.
+    Retourne (première, dernière DateHeure) des lignes rétablies, ou None.
+    """
+    first, last = conn.execute(
+        f"SELECT MIN(DateHeure), MAX(DateHeure) FROM {health_data.BATCH_PREIMAGES} WHERE Lot = ? AND NomTable = ?",
+        (batch, table_name)
+    ).fetchone()
+    if first is None:
+        return None
+    columns = [column for column in health_data.table_columns(conn, table_name) if column != outliers.FLAG_COLUMN]
+    values = ", ".join(f"json_extract(p.Ligne, '$.{column}')" for column in columns)
+    conn.execute(f'''
+        INSERT OR REPLACE INTO main.{table_name} ({', '.join(columns)})
+        SELECT {values} FROM {health_data.BATCH_PREIMAGES} AS p
+        WHERE p.Lot = ? AND p.NomTable = ? AND NOT EXISTS (
+            SELECT 1 FROM main.{table_name} AS t
+            WHERE t.DateHeure = p.DateHeure
+              AND t.{health_data.BATCH_COLUMN} IS NOT json_extract(p.Ligne, '$.{health_data.BATCH_COLUMN}'))
+    ''', (batch, table_name))
+    return first, last
+
+
+def _delete_rows(conn, metric, batch):
+    """
+    Supprime les lignes du lot dans la table brute d'une mesure (et son archive).
+
+    Les lignes que le lot avait remplacées ou modifiées sont rétablies, et les
+    indicateurs d'aberrance des mesures voisines sont remis en attente.
+    Retourne (nombre de lignes supprimées, (première, dernière DateHeure) ou None).
+    """
+    table_name = metric.table
+    if health_data.BATCH_COLUMN not in health_data.table_columns(conn, table_name):
+        return 0, None
+    schemas = ['main']
+    if (health_data.attach_archive(conn)
+            and health_data.BATCH_COLUMN in health_data.table_columns(conn, table_name, 'archive')):
+        schemas.append('archive')
+
+    removed, first, last = 0, None, None
+    with conn:
+        health_data.create_batch_log(conn)
+        for schema in schemas:
+            count, low, high = conn.execute(
+                f"SELECT COUNT(*), MIN(DateHeure), MAX(DateHeure) FROM {schema}.{table_name} "
+                f"WHERE {health_data.BATCH_COLUMN} = ?", (batch,)
+            ).fetchone()
+            if not count:
+                continue
+            if schema == 'archive' and table_name in metrics.note_tables() and notes_search.index_exists(conn):
+                # Les lignes archivées n'ont pas de déclencheur d'indexation
+                notes_search.remove_rows(conn, table_name, f"archive.{table_name}",
+                                         f"s.{health_data.BATCH_COLUMN} = ?", (batch,))
+            conn.execute(f"DELETE FROM {schema}.{table_name} WHERE {health_data.BATCH_COLUMN} = ?", (batch,))
+            removed += count
+            first, last = min(first or low, low), max(last or high, high)
+        restored = _restore_rows(conn, table_name, batch)
+        if restored is not None:
+            first, last = min(first or restored[0], restored[0]), max(last or restored[1], restored[1])
+        if first is not None:
+            outliers.invalidate(conn, table_name, first, last, metric.outlier_window)
+    return removed, (first, last) if first is not None else None
+
+
+def rollback(batch):
+    """
+    Annule un import : supprime ses lignes, rétablit celles qu'il avait remplacées
+    et recalcule les données dérivées de sa période.
+
+    Retourne un dictionnaire {table: nombre de lignes supprimées}.
+    """
+    removed = {}
+    conn = health_data.get_db_connection()
+    try:
+        for metric in metrics.METRICS.values():
+            count, period = _delete_rows(conn, metric, batch)
+            if period is None:
+                continue
+            removed[metric.table] = count
+            start, end = period
+            flagged, _ = metrics.refresh_outliers(metric, conn)
+            if flagged is not None:
+                start, end = min(start, flagged[0]), max(end, flagged[1])
+            health_data.notify_write(metric.table, start=start, end=end, conn=conn)
+
+            if metric.synthesis and health_data.table_columns(conn, metric.synthesis.table):
+                metrics.synthesize(metric, start, end)
+            if metric.table in DERIVED:
+                DERIVED[metric.table](start, end)
+
+        health_data.create_batch_log(conn)
+        with conn:
+            conn.execute(f"UPDATE {health_data.BATCH_LOG} SET AnnuleLe = datetime('now', 'localtime') WHERE Lot = ?",
+                         (batch,))
+            conn.execute(f"DELETE FROM {health_data.BATCH_PREIMAGES} WHERE Lot = ?", (batch,))
+    finally:
+        conn.close()
+    return removed
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Notification des modifications de la base de données entre les sessions.
+
+Un seul fil d'exécution par processus surveille `PRAGMA data_version` (via
+`health_data.check_external_writes`) et collecte aussi les écritures signalées
+par l'application elle-même. Chaque modification devient un `ChangeEvent`
+indiquant la table et la période touchées ; les sessions ouvertes consultent
+ces événements pour ne rafraîchir que les graphiques concernés.
+"""
+
+import collections
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas as pd
+
+import health_data
+
+logger = logging.getLogger(__name__)
+
+# Intervalle de surveillance de la base de données (secondes)
+POLL_INTERVAL = 2.0
+# Intervalle de vérification du journal par les sessions ouvertes (secondes)
+REFRESH_INTERVAL = 5.0
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """Modification d'une table ; `table` vaut None si elle n'a pas pu être identifiée."""
+    seq: int
+    table: Optional[str]
+    start: Optional[pd.Timestamp]
+    end: Optional[pd.Timestamp]
+    timestamp: float
+
+    def concerns(self, tables):
+        """Indique si l'événement touche l'une des tables données."""
+        if self.table is None:
+            return True
+        return self.table in {name.lower() for name in tables}
+
+    def overlaps(self, start=None, end=None):
+        """Indique si la période modifiée recoupe la fenêtre [start, end] affichée."""
+        if self.start is None or self.end is None:
+            return True
+        if start is not None and self.end < pd.Timestamp(start):
+            return False
+        if end is not None and self.start > pd.Timestamp(end):
+            return False
+        return True
+
+
+class ChangeNotifier:
+    """Journal circulaire des modifications alimenté par un fil de surveillance."""
+
+    def __init__(self, poll_interval=POLL_INTERVAL, max_events=1000):
+        self.poll_interval = poll_interval
+        self._events = collections.deque(maxlen=max_events)
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Démarre le fil de surveillance s'il ne tourne pas déjà."""
+        if self._thread is None or not self._thread.is_alive():
+            health_data.add_write_listener(self.publish)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-notifier", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                # Les changements détectés sont publiés via l'abonnement à health_data
+                health_data.check_external_writes()
+            except Exception:
+                # Base momentanément verrouillée ou indisponible : on réessaie plus tard
+                logger.exception("Surveillance de la base : échec de la vérification des écritures externes")
+
+    def publish(self, table, start=None, end=None):
+        """Ajoute un événement de modification au journal."""
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        with self._lock:
+            event = ChangeEvent(next(self._seq), table, start, end, time.time())
+            self._events.append(event)
+            self._last_seq = event.seq
+        return event
+
+    def latest_seq(self):
+        """Numéro du dernier événement publié (0 si aucun)."""
+        with self._lock:
+            return self._last_seq
+
+    def changes_since(self, seq, tables=None):
+        """
+        Retourne les événements postérieurs à `seq`, filtrés par tables.
+
+        Si des événements plus anciens que `seq` ont été évincés du journal,
+        un événement « table inconnue » est retourné pour forcer un rafraîchissement.
+        """
+        with self._lock:
+            events = [event for event in self._events if event.seq > seq]
+            if self._events and self._events[0].seq > seq + 1:
+                events.insert(0, ChangeEvent(seq + 1, None, None, None, time.time()))
+        if tables is not None:
+            events = [event for event in events if event.concerns(tables)]
+        return events
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    """Retourne le notificateur unique du processus, démarré au premier appel."""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = ChangeNotifier()
+        _notifier.start()
+        return _notifier
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Construction des graphiques de suivi (mesures et courbe de tendance LOWESS).
+
+Ces fonctions ne dépendent pas de Streamlit : elles retournent la figure
+Plotly et la liste des messages à afficher, ce qui permet de les réutiliser
+hors de l'application et de conserver leur résultat entre deux exécutions.
+"""
+
+import collections
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import statsmodels.api as sm
+
+# Tendances déjà calculées, partagées entre les sessions (clé : empreinte des données)
+TREND_CACHE_SIZE = 64
+_trend_cache = collections.OrderedDict()
+_trend_lock = threading.Lock()
+
+# Au-delà de ce nombre de points, les mesures sont tracées en WebGL (Scattergl)
+WEBGL_THRESHOLD = 5000
+
+
+def filter_period(df, start_date=None, end_date=None):
+    """Restreint un DataFrame à la période [start_date, end_date] (dates incluses)."""
+    dates = pd.to_datetime(df['DateHeure'])
+    mask = pd.Series(True, index=df.index)
+    # Comparaison directe des datetime64, sans convertir chaque ligne en date Python
+    if start_date is not None:
+        mask &= dates >= pd.Timestamp(start_date).normalize()
+    if end_date is not None:
+        mask &= dates < pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+    return df[mask]
+
+
+def lowess_trend(dates, values, frac=0.3):
+    """
+    Calcule la courbe de tendance LOWESS d'une série temporelle.
+
+    Les régressions locales ne sont faites qu'à 1 % d'intervalle de l'étendue
+    temporelle (`delta`), les points intermédiaires étant interpolés : le coût
+    reste modéré sur les séries denses d'un capteur continu. Le résultat est
+    mémorisé, si bien qu'un graphique inchangé n'est jamais réajusté.
+    """
+    exog = np.asarray(pd.Series(dates).astype('datetime64[ns]').astype('int64'))
+    endog = np.asarray(pd.Series(values).astype(float))
+    key = (hashlib.blake2b(exog.tobytes() + endog.tobytes(), digest_size=16).hexdigest(), frac)
+    with _trend_lock:
+        if key in _trend_cache:
+            _trend_cache.move_to_end(key)
+            return _trend_cache[key]
+
+    delta = 0.01 * (exog.max() - exog.min()) if exog.size else 0.0
+    lowess = sm.nonparametric.lowess(endog=endog, exog=exog, frac=frac, delta=delta)
+    trend = (pd.to_datetime(lowess[:, 0].astype('int64'), unit='ns'), lowess[:, 1])
+    with _trend_lock:
+        _trend_cache[key] = trend
+        if len(_trend_cache) > TREND_CACHE_SIZE:
+            _trend_cache.popitem(last=False)
+    return trend
+
+
+def series_figure(df, columns, y_label, title, start_date=None, end_date=None, trend=True, mode='lines+markers',
+                  outliers=None, hide_outliers=False):
+    """
+    Graphique de colonnes de mesures partageant un axe, avec leurs tendances.
+
+    `columns` associe chaque colonne à son nom dans la légende. `outliers`
+    associe à une colonne ses lignes aberrantes (booléens indexés comme
+    `df`) : elles sont tenues hors de la courbe et de la tendance, et
+    marquées d'une croix sauf si `hide_outliers`. Les séries longues
+    (capteur continu) sont tracées en WebGL. Retourne (figure, messages) ;
+    la figure vaut None s'il n'y a pas assez de données.
+    """
+    df_filtered = filter_period(df, start_date, end_date)
+    values = df_filtered[list(columns)].apply(pd.to_numeric, errors='coerce')
+    valid_rows = values.notna().any(axis=1)
+    dates, values = df_filtered['DateHeure'][valid_rows], values[valid_rows]
+    messages = []
+
+    if len(values) <= 1:
+        messages.append(('info', f"Pas assez de données pour le graphique '{title}' pour la période sélectionnée."))
+        return None, messages
+
+    fig = go.Figure()
+    scatter = go.Scattergl if len(values) > WEBGL_THRESHOLD else go.Scatter
+    single = len(columns) == 1
+
+    for column, name in columns.items():
+        if outliers and column in outliers:
+            flagged = outliers[column].loc[values.index].to_numpy(dtype=bool)
+        else:
+            flagged = np.zeros(len(values), dtype=bool)
+        fig.add_trace(scatter(
+            x=dates[~flagged],
+            y=values[column][~flagged],
+            mode=mode,
+            name='Mesures' if single else f'Mesures {name}'
+        ))
+        if flagged.any() and not hide_outliers:
+            fig.add_trace(go.Scatter(
+                x=dates[flagged],
+                y=values[column][flagged],
+                mode='markers',
+                name='Valeurs aberrantes' if single else f'Aberrantes {name}',
+                marker=dict(symbol='x', size=9, color='#d62728')
+            ))
+        if not trend:
+            continue
+
+        try:
+            valid = values[column].notna() & ~flagged
+            trend_x, trend_y = lowess_trend(dates[valid], values[column][valid])
+            fig.add_trace(go.Scatter(
+                x=trend_x,
+                y=trend_y,
+                mode='lines',
+                name='Tendance' if single else f'Tendance {name}',
+                line=dict(dash='dash')
+            ))
+        except Exception as e:
+            messages.append(('warning', f"Impossible de calculer la courbe de tendance pour '{title if single else name}'. Erreur: {e}"))
+
+    fig.update_layout(
+        title=f"Évolution de {title} avec courbe de tendance" if trend else f"Évolution de {title}",
+        xaxis_title="Date et Heure",
+        yaxis_title=y_label,
+        legend_title_text="Légende"
+    )
+    return fig, messages
+
+
+def add_note_markers(fig, df, y_column, matches):
+    """
+    Met en évidence sur `fig` les mesures de `df` trouvées par une recherche dans les notes.
+
+    `matches` est le résultat de `notes_search.search_notes` (colonnes DateHeure et Extrait).
+    """
+    found = df[['DateHeure', y_column]].merge(matches[['DateHeure', 'Extrait']], on='DateHeure')
+    if found.empty:
+        return fig
+    fig.add_trace(go.Scatter(
+        x=found['DateHeure'],
+        y=found[y_column],
+        mode='markers',
+        name='Notes trouvées',
+        marker=dict(symbol='star', size=13, color='#d62728', line=dict(width=1, color='white')),
+        hovertext=found['Extrait'].str.replace('**', '', regex=False),
+        hoverinfo='x+y+text'
+    ))
+    return fig
+
+
+def focus_on(fig, when, window=pd.Timedelta(hours=12)):
+    """Centre l'axe des temps de `fig` sur `when`, à ± `window`."""
+    when = pd.Timestamp(when)
+    fig.update_xaxes(range=[when - window, when + window])
+    return fig
+
+
+def add_event_overlays(fig, events, colors=None, default_color='#7f7f7f'):
+    """
+    Ombre sur `fig` les événements de la fenêtre affichée (résultat de `events.events_between`).
+
+    Un intervalle devient une bande verticale, un événement ponctuel une ligne ;
+    `colors` associe une couleur à chaque catégorie. Les formes sont ajoutées
+    en une seule mise à jour de la figure, plus rapide qu'un `add_vrect` par
+    événement lorsque la fenêtre en contient beaucoup.
+    """
+    if events is None or events.empty:
+        return fig
+    colors = colors or {}
+    shapes, labels = [], []
+    for event in events.itertuples(index=False):
+        color = colors.get(event.Categorie, default_color)
+        if event.Fin > event.Debut:
+            shapes.append(dict(type='rect', xref='x', yref='paper', x0=event.Debut, x1=event.Fin, y0=0, y1=1,
+                               fillcolor=color, opacity=0.15, line_width=0, layer='below'))
+        else:
+            shapes.append(dict(type='line', xref='x', yref='paper', x0=event.Debut, x1=event.Debut, y0=0, y1=1,
+                               line=dict(color=color, width=2, dash='dot'), layer='below'))
+        labels.append(dict(xref='x', yref='paper', x=event.Debut, y=1, xanchor='left', yanchor='top',
+                           text=event.Description or event.Categorie or '', showarrow=False,
+                           font=dict(size=10, color=color)))
+    fig.update_layout(shapes=list(fig.layout.shapes) + shapes, annotations=list(fig.layout.annotations) + labels)
+    return fig
+
+
+def heatmap_figure(matrix, title, value_label, counts=None):
+    """
+    Carte de chaleur jours × heures d'un profil (`time_profiles.profile_matrix`).
+
+    `counts`, de même forme, donne le nombre de mesures affiché au survol.
+    """
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(),
+        x=[f"{hour:02d}h" for hour in matrix.columns],
+        y=list(matrix.index),
+        colorscale='RdYlBu_r',
+        colorbar=dict(title=value_label),
+        customdata=counts.to_numpy() if counts is not None else None,
+        hovertemplate="%{y} %{x} : %{z}" + (" (%{customdata} mesures)" if counts is not None else "") + "<extra></extra>",
+        hoverongaps=False
+    ))
+    fig.update_layout(title=title, xaxis_title="Heure de la journée", yaxis=dict(autorange='reversed'))
+    return fig
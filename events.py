@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Événements datés (changement de traitement, maladie, voyage...) affichés en
+bandes sur les graphiques de mesures.
+
+Chaque événement est un intervalle [Debut, Fin] de la table `evenements`.
+Un index R*Tree (`evenements_index`, bornes en secondes epoch) tenu à jour
+par déclencheurs permet de ne lire que les événements qui recoupent la
+fenêtre affichée, quel que soit leur nombre. Si le module R*Tree de SQLite
+est absent, un index (Debut, Fin) le remplace.
+
+Les résultats sont mémorisés par fenêtre et par version de la table : un
+graphique réaffiché sans modification des événements ne relit pas la base.
+"""
+
+import collections
+import sqlite3
+import threading
+
+import pandas as pd
+
+import health_data
+
+EVENTS_TABLE = 'evenements'
+INDEX_TABLE = 'evenements_index'
+COLUMNS = ['id', 'Debut', 'Fin', 'Categorie', 'Description']
+
+# Catégories proposées et couleur de leurs bandes
+CATEGORIES = {
+    'Traitement': '#1f77b4',
+    'Maladie': '#d62728',
+    'Voyage': '#2ca02c',
+    'Autre': '#7f7f7f',
+}
+
+# Fenêtres déjà lues, partagées entre les sessions
+EVENTS_CACHE_SIZE = 64
+_events_cache = collections.OrderedDict()
+_events_lock = threading.Lock()
+
+
+def _as_text(when):
+    return pd.Timestamp(when).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def ensure_table(conn=None):
+    """
+    Crée la table des événements et son index d'intervalles s'ils manquent.
+
+    Retourne True si l'index R*Tree est utilisé, False pour l'index (Debut, Fin).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {EVENTS_TABLE} (
+                id INTEGER PRIMARY KEY,
+                Debut TEXT NOT NULL,
+                Fin TEXT NOT NULL,
+                Categorie TEXT,
+                Description TEXT,
+                CHECK (Fin >= Debut)
+            )
+        ''')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{EVENTS_TABLE}_periode ON {EVENTS_TABLE} (Debut, Fin)")
+        trigger = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                               (f"{INDEX_TABLE}_ai",)).fetchone()
+        if trigger is not None:
+            return True
+        try:
+            with conn:
+                # Index orphelin (table des événements supprimée puis recréée) : reconstruit
+                conn.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+                conn.execute(f"CREATE VIRTUAL TABLE {INDEX_TABLE} USING rtree(id, debut, fin)")
+                conn.execute(f'''
+                    CREATE TRIGGER {INDEX_TABLE}_ai AFTER INSERT ON {EVENTS_TABLE} BEGIN
+                        INSERT INTO {INDEX_TABLE} VALUES (NEW.id, strftime('%s', NEW.Debut), strftime('%s', NEW.Fin));
+                    END
+                ''')
+                conn.execute(f'''
+                    CREATE TRIGGER {INDEX_TABLE}_ad AFTER DELETE ON {EVENTS_TABLE} BEGIN
+                        DELETE FROM {INDEX_TABLE} WHERE id = OLD.id;
+                    END
+                ''')
+                conn.execute(f'''
+                    CREATE TRIGGER {INDEX_TABLE}_au AFTER UPDATE OF id, Debut, Fin ON {EVENTS_TABLE} BEGIN
+                        DELETE FROM {INDEX_TABLE} WHERE id = OLD.id;
+                        INSERT INTO {INDEX_TABLE} VALUES (NEW.id, strftime('%s', NEW.Debut), strftime('%s', NEW.Fin));
+                    END
+                ''')
+                conn.execute(f"INSERT INTO {INDEX_TABLE} SELECT id, strftime('%s', Debut), strftime('%s', Fin) "
+                             f"FROM {EVENTS_TABLE}")
+            return True
+        except sqlite3.OperationalError:
+            # SQLite compilé sans R*Tree : l'index (Debut, Fin) suffit
+            return False
+    finally:
+        conn.commit()
+        if own_conn:
+            conn.close()
+
+
+def has_rtree(conn):
+    return bool(health_data.table_columns(conn, INDEX_TABLE))
+
+
+def add_event(start, end, category, description=None):
+    """Enregistre un événement et retourne son identifiant. Lève ValueError si la fin précède le début."""
+    start, end = _as_text(start), _as_text(end)
+    if end < start:
+        raise ValueError("La fin de l'événement précède son début.")
+    conn = health_data.get_db_connection()
+    try:
+        ensure_table(conn)
+        with conn:
+            cursor = conn.execute(
+                f"INSERT INTO {EVENTS_TABLE} (Debut, Fin, Categorie, Description) VALUES (?, ?, ?, ?)",
+                (start, end, category, description or None)
+            )
+        health_data.notify_write(EVENTS_TABLE, start=pd.Timestamp(start), end=pd.Timestamp(end), conn=conn)
+    finally:
+        conn.close()
+    return cursor.lastrowid
+
+
+def delete_event(event_id):
+    """Supprime un événement ; retourne False s'il n'existait pas."""
+    conn = health_data.get_db_connection()
+    try:
+        row = conn.execute(f"SELECT Debut, Fin FROM {EVENTS_TABLE} WHERE id = ?", (event_id,)).fetchone()
+        if row is None:
+            return False
+        with conn:
+            conn.execute(f"DELETE FROM {EVENTS_TABLE} WHERE id = ?", (event_id,))
+        health_data.notify_write(EVENTS_TABLE, start=pd.Timestamp(row[0]), end=pd.Timestamp(row[1]), conn=conn)
+    finally:
+        conn.close()
+    return True
+
+
+def _frame(rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df['Debut'] = pd.to_datetime(df['Debut'])
+    df['Fin'] = pd.to_datetime(df['Fin'])
+    return df
+
+
+def events_between(start, end, conn=None):
+    """
+    Événements qui recoupent la fenêtre [start, end], triés par début.
+
+    L'index R*Tree ne retient que les intervalles candidats ; ses bornes
+    étant arrondies vers l'extérieur, la condition est vérifiée à nouveau
+    sur les dates exactes. Retourne un DataFrame (id, Debut, Fin, Categorie,
+    Description), vide si la table n'existe pas encore.
+    """
+    start, end = _as_text(start), _as_text(end)
+    key = (start, end)
+    version = health_data.table_version(EVENTS_TABLE)
+    with _events_lock:
+        entry = _events_cache.get(key)
+        if entry is not None and entry[0] == version:
+            _events_cache.move_to_end(key)
+            return entry[1].copy()
+
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        if not health_data.table_columns(conn, EVENTS_TABLE):
+            return _frame([])
+        if has_rtree(conn):
+            rows = conn.execute(f'''
+                SELECT e.id, e.Debut, e.Fin, e.Categorie, e.Description
+                FROM {INDEX_TABLE} AS r JOIN {EVENTS_TABLE} AS e ON e.id = r.id
+                WHERE r.debut <= CAST(strftime('%s', :end) AS REAL) AND r.fin >= CAST(strftime('%s', :start) AS REAL)
+                  AND e.Debut <= :end AND e.Fin >= :start
+                ORDER BY e.Debut
+            ''', {'start': start, 'end': end}).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT id, Debut, Fin, Categorie, Description FROM {EVENTS_TABLE} "
+                "WHERE Debut <= :end AND Fin >= :start ORDER BY Debut",
+                {'start': start, 'end': end}
+            ).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+
+    df = _frame(rows)
+    with _events_lock:
+        _events_cache[key] = (version, df)
+        if len(_events_cache) > EVENTS_CACHE_SIZE:
+            _events_cache.popitem(last=False)
+    return df.copy()
+
+
+def list_events(conn=None):
+    """Tous les événements, du plus récent au plus ancien (page d'administration)."""
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        if not health_data.table_columns(conn, EVENTS_TABLE):
+            return _frame([])
+        rows = conn.execute(
+            f"SELECT id, Debut, Fin, Categorie, Description FROM {EVENTS_TABLE} ORDER BY Debut DESC"
+        ).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+    return _frame(rows)
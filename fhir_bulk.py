@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+Import et export de ressources FHIR Observation au format NDJSON (bulk data).
+
+Import : une Observation par ligne. Codes LOINC reconnus :
+- 85354-9, panel de pression artérielle (composants 8480-6 systolique et
+  8462-4 diastolique) -> PressionBrut ;
+- 8867-4, fréquence cardiaque -> Pouls de la mesure de pression de la même minute ;
+- 2339-0 et 2345-7 (mg/dL), 15074-8 (mmol/L), glucose -> glycemie ;
+- 29463-7, poids corporel -> poids.
+Chaque fichier est lu ligne à ligne et inséré par lots (une transaction par
+lot) ; plusieurs fichiers sont importés en parallèle, un processus par
+fichier. La mémoire utilisée ne dépend pas de la taille des fichiers.
+
+Export : chaque table est écrite dans son propre fichier NDJSON, parcourue
+par blocs, les tables étant exportées en parallèle. Les tables exportées,
+leurs codes LOINC et leurs unités viennent du registre `metrics`.
+
+Exemples : python fhir_bulk.py import Observation_1.ndjson Observation_2.ndjson.gz
+           python fhir_bulk.py export --patient 1
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import glucose_analytics
+import health_data
+import health_import
+import metrics
+
+LOINC = 'http://loinc.org'
+UCUM = 'http://unitsofmeasure.org'
+CATEGORY_SYSTEM = 'http://terminology.hl7.org/CodeSystem/observation-category'
+
+BP_PANEL = '85354-9'
+SYSTOLIC = '8480-6'
+DIASTOLIC = '8462-4'
+HEART_RATE = '8867-4'
+GLUCOSE_MASS = ('2339-0', '2345-7')
+GLUCOSE_MOLES = '15074-8'
+BODY_WEIGHT = '29463-7'
+
+# Statuts d'Observation à ne pas importer
+IGNORED_STATUSES = {'entered-in-error', 'cancelled'}
+
+# Fréquences cardiaques en attente : table ordinaire, partagée par les processus d'un
+# import ; chaque import a la sienne, suffixée de son numéro de lot
+PULSE_TABLE = 'import_pouls_fhir'
+health_data.INTERNAL_TABLES.add(PULSE_TABLE)
+
+# Lignes lues puis écrites par bloc lors de l'export
+EXPORT_FETCH_SIZE = 5000
+EXPORT_DIR = 'export_fhir'
+
+
+# --- Import ---
+
+def _codes(concept):
+    """Codes LOINC d'un CodeableConcept (un système absent est accepté)."""
+    return {coding.get('code') for coding in (concept or {}).get('coding', [])
+            if coding.get('system', LOINC) == LOINC}
+
+
+def _effective_time(resource):
+    """
+    Date de la mesure en heure locale, au format de la base.
+
+    Une date avec fuseau est convertie dans le fuseau local
+    ('2024-03-01T08:15:00Z' -> '2024-03-01 09:15:00' à Paris) ; sans fuseau
+    (ou sans heure), elle est prise telle quelle.
+    """
+    text = (resource.get('effectiveDateTime') or resource.get('effectiveInstant')
+            or (resource.get('effectivePeriod') or {}).get('start'))
+    if not text or len(text) < 10:
+        return None
+    try:
+        moment = datetime.fromisoformat(text.replace('Z', '+00:00') if len(text) > 10 else text)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _quantity(element):
+    """(valeur, unité UCUM) d'un valueQuantity, ou (None, None)."""
+    quantity = element.get('valueQuantity') or {}
+    value = quantity.get('value')
+    if not isinstance(value, (int, float)):
+        return None, None
+    return float(value), quantity.get('code') or quantity.get('unit') or ''
+
+
+def _notes(resource):
+    """{Note1, Note2} : les deux premières annotations de l'Observation."""
+    notes = [note.get('text') for note in resource.get('note', []) if note.get('text')]
+    return dict(zip(health_data.NOTE_COLUMNS, notes))
+
+
+def observation_to_row(resource):
+    """
+    Convertit une Observation en (table, enregistrement), ou None si elle n'est pas retenue.
+
+    Lève ValueError pour une mesure reconnue dont l'unité ne l'est pas : elle
+    est comptée parmi les enregistrements rejetés, comme une ligne illisible.
+    """
+    if resource.get('resourceType') != 'Observation' or resource.get('status') in IGNORED_STATUSES:
+        return None
+    when = _effective_time(resource)
+    if when is None:
+        return None
+    codes = _codes(resource.get('code'))
+
+    if BP_PANEL in codes or (SYSTOLIC in codes and DIASTOLIC in codes):
+        values = {}
+        for component in resource.get('component', []):
+            value, _ = _quantity(component)
+            for code in _codes(component.get('code')):
+                values[code] = value
+        if values.get(SYSTOLIC) is None or values.get(DIASTOLIC) is None:
+            return None
+        return ('PressionBrut', {'DateHeure': when, 'Systolique': values[SYSTOLIC], 'Diastolique': values[DIASTOLIC],
+                                 'Pouls': values.get(HEART_RATE), **_notes(resource)})
+
+    value, unit = _quantity(resource)
+    if value is None:
+        return None
+    if HEART_RATE in codes:
+        return ('pouls', {'Minute': when[:16], 'Pouls': value})
+    if codes & {*GLUCOSE_MASS, GLUCOSE_MOLES}:
+        if unit == 'mg/dL':
+            mmol = round(value / glucose_analytics.MMOL_TO_MGDL, 1)
+        elif unit == 'mmol/L':
+            mmol = round(value, 1)
+        else:
+            raise ValueError(f"Unité de glycémie non reconnue : {unit}")
+        return ('glycemie', {'DateHeure': when, 'Valeur': mmol, **_notes(resource)})
+    if BODY_WEIGHT in codes:
+        factors = {'kg': 1.0, 'g': 0.001, '[lb_av]': 1 / health_import.LBS_PER_KG, 'lb': 1 / health_import.LBS_PER_KG}
+        if unit not in factors:
+            raise ValueError(f"Unité de poids non reconnue : {unit}")
+        return health_import.weight_record(when, value * factors[unit])
+    return None
+
+
+def iter_observations(lines, report=None):
+    """Parcourt des lignes NDJSON et produit des couples (table, enregistrement) ; lignes illisibles comptées."""
+    for line in lines:
+        if not line.strip():
+            continue
+        if report is not None:
+            report.records += 1
+        try:
+            record = observation_to_row(json.loads(line))
+        except (ValueError, AttributeError, TypeError):
+            if report is not None:
+                report.rejected += 1
+            continue
+        if record is not None:
+            yield record
+
+
+def _open_ndjson(path, mode='rt'):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode[0], encoding='utf-8')
+
+
+def import_file(path, batch_size=health_import.BATCH_SIZE, batch=None, pulse_table=PULSE_TABLE):
+    """
+    Importe un fichier NDJSON (.ndjson ou .ndjson.gz) et retourne son bilan.
+
+    Exécutée dans les processus de travail ; les fréquences cardiaques sont
+    déposées dans la table d'attente `pulse_table`, rattachées une fois tous les fichiers lus.
+    Les mesures portent le numéro de lot `batch`, commun à tous les fichiers.
+    """
+    report = health_import.ImportReport(source=path)
+    started = time.perf_counter()
+    conn = health_data.get_db_connection()
+    try:
+        # Les processus écrivent à tour de rôle : chacun attend la fin du lot en cours des autres
+        conn.execute("PRAGMA busy_timeout = 60000")
+        writer = health_import.BatchWriter(conn, report, batch_size, pulse_table=pulse_table, batch=batch)
+        with _open_ndjson(path) as f:
+            for table, record in iter_observations(f, report):
+                writer.add(table, record)
+        writer.flush()
+    finally:
+        conn.close()
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def expand_paths(paths):
+    """Remplace les dossiers par les fichiers .ndjson / .ndjson.gz qu'ils contiennent."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.ndjson')) + glob.glob(os.path.join(path, '*.ndjson.gz'))))
+        else:
+            files.append(path)
+    return files
+
+
+def _worker_count(workers, jobs):
+    """Processus utiles : pas plus que de fichiers ou de processeurs (1 = traitement sur place)."""
+    if health_data.in_memory():
+        # Une base en mémoire n'est visible que du processus qui l'a créée
+        return 1
+    return max(1, min(workers or os.cpu_count() or 1, jobs))
+
+
+def _executor(workers):
+    # Processus lancés par « spawn » : l'application Streamlit est multi-fils. Ils
+    # réimportent les modules : la base choisie avec `configure` leur est transmise.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=health_data.configure,
+                               initargs=(health_data.DB_PATH, health_data.ARCHIVE_PATH))
+
+
+def import_files(paths, workers=None, batch_size=health_import.BATCH_SIZE, progress=None):
+    """
+    Importe des fichiers NDJSON d'Observations en parallèle et retourne le bilan global.
+
+    `progress` est appelée après chaque fichier avec (fraction des fichiers traités, bilan en cours).
+    """
+    paths = expand_paths(paths)
+    report = health_import.ImportReport(source=", ".join(os.path.basename(path) for path in paths))
+    started = time.perf_counter()
+
+    pulse_table = None
+    conn = health_data.get_db_connection()
+    try:
+        try:
+            report.batch = health_data.start_batch(conn, report.source)
+            # Table d'attente propre à l'import : deux imports simultanés ne se mélangent pas
+            pulse_table = f"{PULSE_TABLE}_{report.batch}"
+            health_import.create_tables(conn, pulse_table=pulse_table)
+            conn.commit()
+
+            workers = _worker_count(workers, len(paths))
+            if workers == 1:
+                for done, path in enumerate(paths, start=1):
+                    report.merge(import_file(path, batch_size, report.batch, pulse_table))
+                    if progress is not None:
+                        progress(done / len(paths), report)
+            else:
+                with _executor(workers) as executor:
+                    futures = [executor.submit(import_file, path, batch_size, report.batch, pulse_table)
+                               for path in paths]
+                    for done, future in enumerate(as_completed(futures), start=1):
+                        report.merge(future.result())
+                        if progress is not None:
+                            progress(done / len(paths), report)
+
+            report.pulses = health_import.match_pulses(conn, report, pulse_table=pulse_table)
+        finally:
+            if report.batch is not None:
+                health_data.record_batch(conn, report.batch, report.periods)
+            if pulse_table is not None:
+                conn.execute(f"DROP TABLE IF EXISTS {pulse_table}")
+            conn.commit()
+        report.seconds = time.perf_counter() - started
+        health_import.notify_import(report, conn)
+    finally:
+        conn.close()
+    return report
+
+
+# --- Export ---
+
+def _concept(code, display):
+    return {'coding': [{'system': LOINC, 'code': code, 'display': display}], 'text': display}
+
+
+def _category(code, display):
+    return [{'coding': [{'system': CATEGORY_SYSTEM, 'code': code, 'display': display}]}]
+
+
+def _value(value, unit, code):
+    return {'value': value, 'unit': unit, 'system': UCUM, 'code': code}
+
+
+# Mesures du registre exportables (au moins un code FHIR)
+EXPORT_METRICS = {metric.table: metric for metric in metrics.METRICS.values() if metric.fhir_codings}
+EXPORT_TABLES = tuple(EXPORT_METRICS)
+
+# Éléments communs à toutes les Observations exportées (construits une fois)
+CATEGORIES = {
+    'vital-signs': _category('vital-signs', 'Vital Signs'),
+    'laboratory': _category('laboratory', 'Laboratory'),
+}
+CONCEPTS = {coding.code: _concept(coding.code, coding.display)
+            for metric in EXPORT_METRICS.values() for coding in metric.fhir_codings}
+_ID_DIGITS = str.maketrans('', '', '-: ')
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def _observation(prefix, when, category, concept, notes, patient, **fields):
+    resource = {
+        'resourceType': 'Observation',
+        'id': f"{prefix}-{when.translate(_ID_DIGITS)}",
+        'status': 'final',
+        'category': category,
+        'code': concept,
+        # FHIR exige un fuseau dès que l'heure est donnée : décalage local de la mesure
+        'effectiveDateTime': datetime.fromisoformat(when).astimezone().isoformat(),
+    }
+    if patient:
+        resource['subject'] = {'reference': f"Patient/{patient}"}
+    resource.update(fields)
+    notes = [note for note in notes if note and str(note).strip() not in ('', '-')]
+    if notes:
+        resource['note'] = [{'text': str(note)} for note in notes]
+    return resource
+
+
+def _measure_value(measure, value):
+    return _value(value, measure.unit, measure.fhir.ucum)
+
+
+def row_to_observations(table_name, row, patient=None):
+    """
+    Observations FHIR d'une ligne de table (colonnes `Metric.columns` du registre).
+
+    Les colonnes du panel de la mesure forment une Observation à composants,
+    qui porte les notes ; chaque autre colonne codée donne sa propre
+    Observation (le pouls d'une mesure de pression), avec les notes s'il n'y
+    a pas de panel.
+    """
+    metric = EXPORT_METRICS.get(table_name)
+    if metric is None:
+        raise ValueError(f"Table non exportable en FHIR : {table_name}")
+    values = dict(zip(metric.columns, row))
+    when = values['DateHeure']
+    notes = tuple(values[column] for column in health_data.NOTE_COLUMNS) if metric.notes else ()
+    category = CATEGORIES[metric.fhir_category]
+    panel = metric.fhir_panel
+    resources = []
+    if panel is not None:
+        if all(values[column] is not None for column in panel.columns):
+            components = [{'code': CONCEPTS[measure.fhir.code],
+                           'valueQuantity': _measure_value(measure, values[measure.column])}
+                          for measure in map(metric.measure, panel.columns)]
+            resources.append(_observation(panel.fhir.prefix, when, category, CONCEPTS[panel.fhir.code], notes,
+                                          patient, component=components))
+        notes = ()
+    for measure in metric.measures:
+        if measure.fhir is None or (panel is not None and measure.column in panel.columns):
+            continue
+        if values[measure.column] is not None:
+            resources.append(_observation(measure.fhir.prefix, when, category, CONCEPTS[measure.fhir.code], notes,
+                                          patient, valueQuantity=_measure_value(measure, values[measure.column])))
+    return resources
+
+
+def export_table(table_name, output_dir, patient=None):
+    """
+    Écrit les Observations d'une table dans `<output_dir>/Observation.<table>.ndjson`.
+
+    La table (archive comprise) est parcourue par blocs. Retourne (chemin, nombre
+    d'Observations), ou (None, 0) si la table n'existe pas. Exécutée dans les
+    processus de travail.
+    """
+    conn = health_data.get_db_connection()
+    try:
+        if not health_data.table_columns(conn, table_name):
+            return None, 0
+        source = health_data.table_source(conn, table_name)
+        columns = EXPORT_METRICS[table_name].columns
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {source} ORDER BY DateHeure")
+        path = os.path.join(output_dir, f"Observation.{table_name}.ndjson")
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for rows in iter(lambda: cursor.fetchmany(EXPORT_FETCH_SIZE), []):
+                lines = [_ENCODER.encode(resource)
+                         for row in rows for resource in row_to_observations(table_name, row, patient)]
+                if lines:
+                    f.write("\n".join(lines) + "\n")
+                count += len(lines)
+    finally:
+        conn.close()
+    return path, count
+
+
+def export_tables(output_dir=EXPORT_DIR, tables=EXPORT_TABLES, workers=None, patient=None):
+    """Exporte les tables en NDJSON FHIR, une table par processus. Retourne {table: (chemin, nombre)}."""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = _worker_count(workers, len(tables))
+    if workers == 1:
+        return {table: export_table(table, output_dir, patient) for table in tables}
+    with _executor(workers) as executor:
+        futures = {table: executor.submit(export_table, table, output_dir, patient) for table in tables}
+        return {table: future.result() for table, future in futures.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import / export FHIR Observation (NDJSON).")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="Importe des fichiers ou dossiers NDJSON.")
+    import_parser.add_argument('paths', nargs='+')
+    import_parser.add_argument('--workers', type=int, default=None)
+    import_parser.add_argument('--batch-size', type=int, default=health_import.BATCH_SIZE)
+    export_parser = commands.add_parser('export', help="Exporte les tables de mesures.")
+    export_parser.add_argument('--output', default=EXPORT_DIR)
+    export_parser.add_argument('--tables', nargs='+', choices=EXPORT_TABLES, default=list(EXPORT_TABLES))
+    export_parser.add_argument('--patient', default=None, help="Identifiant du Patient référencé (subject).")
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        print(import_files(args.paths, args.workers, args.batch_size).summary())
+    else:
+        for table, (path, count) in export_tables(args.output, args.tables, patient=args.patient).items():
+            print(f"{table} : {count} Observations" + (f" -> {path}" if path else " (table absente)"))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Instantanés compacts de la base pour les tests et les bancs d'essai.
+
+Un instantané est une archive zip (compression LZMA) contenant l'image
+SQLite de la base (`main.db`) et, si elle existe, celle de l'archive des
+mesures (`archive.db`). `load_snapshot` restaure ces images dans la base
+courante par l'API de sauvegarde de SQLite ; avec la base en mémoire
+(`use_memory_database`), les pages tournent sans aucune écriture disque.
+
+Exemples : python fixtures.py save instantane.zip
+           python fixtures.py synthetic instantane.zip --days 365
+"""
+
+import argparse
+import sqlite3
+import zipfile
+
+import health_data
+
+MAIN_MEMBER = 'main.db'
+ARCHIVE_MEMBER = 'archive.db'
+
+
+def save_snapshot(path):
+    """Écrit l'instantané de la base courante (et de son archive) dans `path`."""
+    conn = health_data.get_db_connection()
+    try:
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_LZMA) as zf:
+            zf.writestr(MAIN_MEMBER, conn.serialize())
+            if health_data.attach_archive(conn):
+                zf.writestr(ARCHIVE_MEMBER, conn.serialize(name='archive'))
+    finally:
+        conn.close()
+    return path
+
+
+def _restore(image, target):
+    source = sqlite3.connect(':memory:')
+    try:
+        source.deserialize(image)
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def load_snapshot(path):
+    """
+    Remplace le contenu de la base courante par celui de l'instantané `path`.
+
+    Les pages et modules voient les nouvelles données dès leur prochaine
+    lecture (le cache partagé est vidé).
+    """
+    with zipfile.ZipFile(path) as zf:
+        members = set(zf.namelist())
+        _restore(zf.read(MAIN_MEMBER), health_data.get_db_connection())
+        if ARCHIVE_MEMBER in members:
+            _restore(zf.read(ARCHIVE_MEMBER), health_data.get_archive_connection())
+    health_data.clear_cache()
+
+
+def use_memory_database(snapshot=None):
+    """
+    Bascule le processus sur une base vide en mémoire, remplie avec l'instantané s'il est donné.
+
+    Retourne l'emplacement précédent (chemin de la base, chemin de l'archive),
+    à repasser à `health_data.configure` pour revenir à la base sur disque.
+    """
+    previous = (health_data.DB_PATH, health_data.ARCHIVE_PATH)
+    health_data.configure(health_data.MEMORY)
+    if snapshot is not None:
+        load_snapshot(snapshot)
+    return previous
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Instantanés de la base pour les tests et bancs d'essai.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    save_parser = commands.add_parser('save', help="Enregistre la base courante (MYHEALTH_DB_PATH).")
+    save_parser.add_argument('path')
+    synthetic_parser = commands.add_parser('synthetic', help="Enregistre une base de mesures synthétiques.")
+    synthetic_parser.add_argument('path')
+    synthetic_parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    if args.command == 'synthetic':
+        import load_test
+
+        use_memory_database()
+        conn = health_data.get_db_connection()
+        try:
+            load_test.seed_database(conn, days=args.days)
+        finally:
+            conn.close()
+    print(f"Instantané enregistré : {save_snapshot(args.path)}")
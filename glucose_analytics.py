@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Indicateurs de variabilité glycémique (adaptés aux volumes d'un capteur CGM).
+
+Pour chaque jour : temps dans la cible (TIR), sous la cible (TBR), au-dessus
+(TAR), coefficient de variation (CV), GMI et MAGE. Les calculs sont
+vectorisés avec NumPy ; les résultats journaliers sont conservés dans la
+table `glycemie_jour` et seuls les jours dont les mesures ont changé sont
+recalculés. Les indicateurs d'une période sont combinés à partir des jours.
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import health_data
+
+# Plage cible (mmol/L), consensus international sur le temps dans la cible
+TARGET_LOW = 3.9
+TARGET_HIGH = 10.0
+MMOL_TO_MGDL = 18.0182
+
+DAILY_TABLE = 'glycemie_jour'
+DAILY_COLUMNS = ['Jour', 'Mesures', 'Somme', 'SommeCarres', 'Dessous', 'Dessus', 'Derniere',
+                 'Moyenne', 'EcartType', 'CV', 'TIR', 'TBR', 'TAR', 'GMI', 'MAGE']
+# Version du calcul des indicateurs, stockée avec chaque jour : à incrémenter quand
+# un calcul change (2 : MAGE sur les pics et creux dépassant un écart-type ;
+# 3 : excursions coupées par les bords de la journée écartées, capteur lissé)
+STATS_VERSION = 3
+# Moyenne glissante appliquée avant la recherche des pics et creux du MAGE (capteurs continus)
+SMOOTHING_MINUTES = 30
+
+
+# --- Indicateurs ---
+
+def gmi(mean_mmol):
+    """Glucose Management Indicator (%) à partir de la glycémie moyenne en mmol/L."""
+    return 3.31 + 0.02392 * (np.asarray(mean_mmol) * MMOL_TO_MGDL)
+
+
+def _extrema(values, threshold):
+    """
+    Pics et creux alternés de la série, chacun à plus de `threshold` du précédent.
+
+    Un pic n'est retenu qu'une fois la série redescendue de plus de
+    `threshold` (et inversement pour un creux) : le bruit de mesure ne crée
+    pas de faux retournements. Le premier extrême n'est retenu que si la
+    série s'en est approchée de plus de `threshold` depuis son premier
+    point, le dernier que si elle s'en éloigne d'autant avant son dernier
+    point : une excursion coupée par le début ou la fin de la journée ne
+    compte pas.
+    """
+    series = values.tolist()    # boucle sur des flottants Python, bien plus rapide que sur le tableau
+    extrema = []
+    low = high = 0      # positions du plus bas et du plus haut depuis le dernier extrême
+    trend = 0           # 1 : montée (pic en cours), -1 : descente (creux en cours), 0 : pas encore de sens
+    for i, value in enumerate(series):
+        if value >= series[high]:
+            high = i
+        if value <= series[low]:
+            low = i
+        if trend >= 0 and series[high] - value > threshold:
+            extrema.append(high)
+            trend, low = -1, i
+        elif trend <= 0 and value - series[low] > threshold:
+            extrema.append(low)
+            trend, high = 1, i
+    # Dernier extrême, s'il n'est pas confirmé par un retournement
+    last = high if trend == 1 else low
+    if trend and abs(series[last] - series[extrema[-1]]) > threshold:
+        extrema.append(last)
+    # Excursions coupées par le début ou la fin de la journée : le premier (dernier)
+    # extrême n'est retenu que si la série s'est d'abord (ensuite) éloignée de plus de `threshold`
+    if extrema and abs(series[extrema[0]] - series[0]) <= threshold:
+        extrema.pop(0)
+    if extrema and abs(series[extrema[-1]] - series[-1]) <= threshold:
+        extrema.pop()
+    return values[extrema]
+
+
+def mage(values, window=1):
+    """
+    Amplitude moyenne des excursions glycémiques (MAGE).
+
+    Les pics et creux sont ceux entre lesquels la glycémie varie de plus
+    d'un écart-type de la série ; MAGE est la moyenne des excursions dans le
+    sens de la première (montées ou descentes). Avec `window`, ils sont lus
+    sur la moyenne glissante de `window` mesures : le bruit du capteur ne
+    gonfle pas les extrêmes. NaN si aucune excursion ne dépasse l'écart-type.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.size < 3:
+        return np.nan
+    smoothed = values
+    if 1 < window < values.size:
+        smoothed = np.convolve(values, np.ones(window) / window, mode='valid')
+    excursions = np.diff(_extrema(smoothed, values.std()))
+    if excursions.size == 0:
+        return np.nan
+    return float(np.abs(excursions[::2]).mean())
+
+
+def _smoothing_window(dates):
+    """Nombre de mesures couvrant `SMOOTHING_MINUTES` d'après l'intervalle médian de la journée (1 si espacées)."""
+    if dates.size < 2:
+        return 1
+    step = np.median(np.diff(dates)) / np.timedelta64(1, 'm')
+    return max(int(SMOOTHING_MINUTES // step), 1) if step > 0 else 1
+
+
+def daily_stats(dates, values):
+    """
+    Calcule les indicateurs journaliers d'une série (dates datetime64, valeurs mmol/L).
+
+    Retourne un DataFrame avec une ligne par jour (colonnes `DAILY_COLUMNS`).
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    dates, values = dates[valid], values[valid]
+    if values.size == 0:
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+
+    order = np.argsort(dates, kind='stable')
+    dates, values = dates[order], values[order]
+    days, day_index = np.unique(dates.astype('datetime64[D]'), return_inverse=True)
+
+    count = np.bincount(day_index)
+    total = np.bincount(day_index, weights=values)
+    total_sq = np.bincount(day_index, weights=values * values)
+    below = np.bincount(day_index, weights=values < TARGET_LOW)
+    above = np.bincount(day_index, weights=values > TARGET_HIGH)
+    last = dates[np.r_[np.flatnonzero(np.diff(day_index)), day_index.size - 1]]
+
+    # MAGE : une série par jour (les données sont triées, les jours contigus)
+    bounds = np.flatnonzero(np.diff(day_index)) + 1
+    mages = np.array([mage(chunk, _smoothing_window(day_dates))
+                      for chunk, day_dates in zip(np.split(values, bounds), np.split(dates, bounds))])
+
+    daily = pd.DataFrame({
+        'Jour': pd.DatetimeIndex(days).strftime('%Y-%m-%d'),
+        'Mesures': count,
+        'Somme': total,
+        'SommeCarres': total_sq,
+        'Dessous': below.astype(int),
+        'Dessus': above.astype(int),
+        'Derniere': pd.DatetimeIndex(last).strftime('%Y-%m-%d %H:%M:%S'),
+        'MAGE': mages,
+    })
+    return _add_derived(daily)
+
+
+def _add_derived(df):
+    """Ajoute moyenne, écart-type, CV, TIR/TBR/TAR et GMI à partir des sommes."""
+    n = df['Mesures'].astype(float)
+    mean = df['Somme'] / n
+    variance = (df['SommeCarres'] / n - mean ** 2).clip(lower=0)
+    df['Moyenne'] = mean
+    df['EcartType'] = np.sqrt(variance)
+    df['CV'] = 100 * df['EcartType'] / mean
+    df['TBR'] = 100 * df['Dessous'] / n
+    df['TAR'] = 100 * df['Dessus'] / n
+    df['TIR'] = 100 - df['TBR'] - df['TAR']
+    df['GMI'] = gmi(mean)
+    return df[DAILY_COLUMNS]
+
+
+def summarize_period(daily, start=None, end=None):
+    """
+    Combine les indicateurs journaliers d'une période [start, end] (dates incluses).
+
+    Les sommes conservées par jour donnent des moyennes, écarts-types et
+    pourcentages exacts ; le MAGE de la période est la moyenne des MAGE
+    journaliers. Retourne un dictionnaire, ou None si la période est vide.
+    """
+    days = daily
+    if start is not None:
+        days = days[days['Jour'] >= str(start)]
+    if end is not None:
+        days = days[days['Jour'] <= str(end)]
+    if days.empty or days['Mesures'].sum() == 0:
+        return None
+    totals = days[['Mesures', 'Somme', 'SommeCarres', 'Dessous', 'Dessus']].sum().to_frame().T
+    totals['MAGE'] = days['MAGE'].mean()
+    totals['Jour'] = None
+    totals['Derniere'] = days['Derniere'].max()
+    summary = _add_derived(totals).iloc[0].to_dict()
+    summary['Jours'] = len(days)
+    return summary
+
+
+# --- Cache journalier ---
+
+def create_daily_table(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+            Jour TEXT PRIMARY KEY,
+            Mesures INTEGER,
+            Somme REAL,
+            SommeCarres REAL,
+            Dessous INTEGER,
+            Dessus INTEGER,
+            Derniere TEXT,
+            Moyenne REAL,
+            EcartType REAL,
+            CV REAL,
+            TIR REAL,
+            TBR REAL,
+            TAR REAL,
+            GMI REAL,
+            MAGE REAL,
+            Calcul INTEGER
+        )
+    ''')
+    if 'Calcul' not in health_data.table_columns(conn, DAILY_TABLE):
+        # Jours calculés avant le suivi des versions : ils seront recalculés
+        conn.execute(f"ALTER TABLE {DAILY_TABLE} ADD COLUMN Calcul INTEGER")
+
+
+def refresh_daily_stats(start=None, end=None):
+    """
+    Met à jour `glycemie_jour` et retourne le tableau journalier complet.
+
+    Une empreinte par jour (nombre de mesures, somme, dernière heure) calculée
+    en SQL est comparée à celle stockée : seuls les jours différents sont
+    recalculés, de même que ceux calculés par une version antérieure des
+    indicateurs ; les jours disparus sont supprimés. Avec `start` et `end`
+    (période modifiée connue), seuls les jours de cette période sont comparés.
+    """
+    readings_range, days_range, args = "", "", ()
+    if start is not None:
+        readings_range, days_range = "WHERE DateHeure >= ? AND DateHeure < ?", "WHERE Jour >= ? AND Jour < ?"
+        args = (pd.Timestamp(start).strftime('%Y-%m-%d'),
+                (pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+    conn = health_data.get_db_connection()
+    try:
+        create_daily_table(conn)
+        current = pd.read_sql_query(
+            "SELECT substr(DateHeure, 1, 10) AS Jour, COUNT(Valeur) AS Mesures, TOTAL(Valeur) AS Somme, "
+            "MAX(CASE WHEN Valeur IS NOT NULL THEN DateHeure END) AS Derniere "
+            f"FROM glycemie {readings_range} GROUP BY Jour", conn, params=args
+        )
+        current = current[current['Mesures'] > 0]
+        stored = pd.read_sql_query(f"SELECT Jour, Mesures, Somme, Derniere, Calcul FROM {DAILY_TABLE} "
+                                   f"{days_range}", conn, params=args)
+
+        merged = current.merge(stored, on='Jour', how='outer', suffixes=('', '_stocke'), indicator=True)
+        unchanged = (
+            (merged['_merge'] == 'both')
+            & (merged['Mesures'] == merged['Mesures_stocke'])
+            & np.isclose(merged['Somme'].astype(float), merged['Somme_stocke'].astype(float))
+            & (merged['Derniere'] == merged['Derniere_stocke'])
+            & (merged['Calcul'] == STATS_VERSION)
+        )
+        dirty_days = merged.loc[(merged['_merge'] != 'right_only') & ~unchanged, 'Jour'].tolist()
+        removed_days = merged.loc[merged['_merge'] == 'right_only', 'Jour'].tolist()
+
+        if dirty_days or removed_days:
+            if dirty_days:
+                # Lecture limitée (index de DateHeure) à l'intervalle des jours à recalculer
+                dirty = np.array(sorted(dirty_days), dtype='datetime64[D]')
+                cursor = conn.execute(
+                    "SELECT DateHeure, Valeur FROM glycemie WHERE DateHeure >= ? AND DateHeure < ? AND Valeur IS NOT NULL",
+                    (str(dirty[0]), str(dirty[-1] + 1))
+                )
+                rows = cursor.fetchall()
+                dates = pd.to_datetime([row[0] for row in rows], format='ISO8601').to_numpy()
+                values = np.array([row[1] for row in rows], dtype=float)
+                keep = np.isin(dates.astype('datetime64[D]'), dirty)
+                recomputed = daily_stats(dates[keep], values[keep])
+            else:
+                recomputed = pd.DataFrame(columns=DAILY_COLUMNS)
+            with conn:
+                conn.executemany(f"DELETE FROM {DAILY_TABLE} WHERE Jour = ?", [(day,) for day in removed_days])
+                placeholders = ", ".join("?" for _ in DAILY_COLUMNS)
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {DAILY_TABLE} ({', '.join(DAILY_COLUMNS)}, Calcul) "
+                    f"VALUES ({placeholders}, {STATS_VERSION})",
+                    recomputed.astype(object).where(recomputed.notna(), None).itertuples(index=False, name=None)
+                )
+            health_data.notify_write(DAILY_TABLE, conn=conn)
+
+        return pd.read_sql_query(f"SELECT {', '.join(DAILY_COLUMNS)} FROM {DAILY_TABLE} ORDER BY Jour", conn)
+    finally:
+        conn.close()
+
+
+# Tableau journalier par version de la table glycemie (partagé entre les sessions)
+_daily_cache = {}
+
+
+def load_daily_stats():
+    """Tableau journalier à jour, lu depuis le cache partagé si rien n'a changé."""
+    version = health_data.table_version('glycemie')
+    cached = _daily_cache.get('glycemie')
+    if cached is not None and cached[0] == version:
+        return cached[1].copy()
+    try:
+        daily = refresh_daily_stats()
+    except (sqlite3.Error, pd.io.sql.DatabaseError):
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+    _daily_cache['glycemie'] = (version, daily)
+    return daily.copy()
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+API HTTP/JSON locale en lecture seule sur les mesures de santé.
+
+Destinée aux outils externes (rapport nocturne, affichage domestique) qui
+lisaient directement `mesures_sante.db`. Elle s'appuie sur la même couche de
+données que les pages (`health_data`) :
+
+    GET /metrics
+    GET /metrics/<mesure>?start=AAAA-MM-JJ&end=AAAA-MM-JJ&resolution=day&format=ndjson
+
+`resolution` vaut raw, hour, day, week ou month ; les agrégats sont calculés
+en SQL. `format=ndjson` (ou l'en-tête Accept: application/x-ndjson) diffuse
+une ligne JSON par point. Chaque réponse porte un ETag dérivé de la version
+de la table : un client qui renvoie If-None-Match reçoit un 304 sans requête.
+
+Lancement : python health_api.py --port 8765
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import health_data
+import metrics
+
+# Mesures exposées (registre `metrics`) : nom -> (table, colonne, unité)
+METRICS = metrics.api_series()
+
+# Regroupement temporel SQL pour chaque résolution
+RESOLUTIONS = {
+    'raw': None,
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+}
+
+# Nombre de lignes lues puis envoyées par morceau de réponse
+FETCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+# Identifiant de l'instance : les versions de table repartent de zéro au redémarrage
+_INSTANCE_ID = uuid.uuid4().hex[:8]
+
+
+class ApiError(Exception):
+    """Erreur de requête renvoyée au client avec un code HTTP."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- Connexions en lecture ---
+
+class ReadConnectionPool:
+    """Réserve de connexions SQLite en lecture seule partagées entre les requêtes."""
+
+    def __init__(self, size=4):
+        self._pool = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(None)
+
+    def _open(self):
+        conn = health_data.get_db_connection(read_only=True, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            if conn is None:
+                conn = self._open()
+            yield conn
+        except sqlite3.Error:
+            # Connexion éventuellement inutilisable : elle sera rouverte
+            if conn is not None:
+                conn.close()
+            conn = None
+            raise
+        finally:
+            self._pool.put(conn)
+
+
+# --- Requêtes ---
+
+def parse_query(metric, params):
+    """Valide les paramètres d'une requête de série et retourne (table, colonne, début, fin, résolution)."""
+    if metric not in METRICS:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"Mesure inconnue : {metric}")
+    table, column, _ = METRICS[metric]
+
+    resolution = params.get('resolution', 'raw')
+    if resolution not in RESOLUTIONS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Résolution invalide : {resolution}")
+    try:
+        start = date.fromisoformat(params['start']) if params.get('start') else None
+        end = date.fromisoformat(params['end']) if params.get('end') else None
+    except ValueError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Date invalide : {e}")
+    return table, column, start, end, resolution
+
+
+def build_sql(source, column, start, end, resolution):
+    """
+    Construit la requête SQL (filtrage sur l'index de DateHeure, agrégation éventuelle).
+
+    `source` est la table ou l'union table/archive retournée par `health_data.table_source`.
+    """
+    conditions = [f"{column} IS NOT NULL"]
+    args = []
+    if start is not None:
+        conditions.append("DateHeure >= ?")
+        args.append(start.isoformat())
+    if end is not None:
+        # Fin incluse : toute la journée de `end`
+        conditions.append("DateHeure < ?")
+        args.append((end + timedelta(days=1)).isoformat())
+    where = " AND ".join(conditions)
+
+    bucket = RESOLUTIONS[resolution]
+    if bucket is None:
+        sql = f"SELECT DateHeure, {column} FROM {source} WHERE {where} ORDER BY DateHeure"
+    else:
+        sql = (
+            f"SELECT strftime('{bucket}', DateHeure) AS periode, AVG({column}), MIN({column}), "
+            f"MAX({column}), COUNT(*) FROM {source} WHERE {where} GROUP BY periode ORDER BY periode"
+        )
+    return sql, args
+
+
+def format_row(row, resolution):
+    if resolution == 'raw':
+        return {'DateHeure': row[0], 'valeur': row[1]}
+    return {'periode': row[0], 'moyenne': row[1], 'min': row[2], 'max': row[3], 'n': row[4]}
+
+
+def make_etag(table, path, query):
+    """ETag dérivé de la version de la table et des paramètres de la requête."""
+    epoch, counter = health_data.table_version(table)
+    digest = hashlib.sha1(f"{path}?{query}".encode('utf-8')).hexdigest()[:12]
+    return f'"{_INSTANCE_ID}-{epoch}-{counter}-{digest}"'
+
+
+def etag_matches(header, etag):
+    """Vrai si l'en-tête If-None-Match désigne `etag` (comparaison faible, `*` désigne toute version)."""
+    tags = [tag.strip() for tag in (header or '').split(',')]
+    return any(tag == '*' or tag.removeprefix('W/') == etag for tag in tags)
+
+
+# --- Serveur HTTP ---
+
+class HealthApiHandler(BaseHTTPRequestHandler):
+    server_version = "MyHealthAPI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            if parts == ['metrics']:
+                self._send_json({
+                    name: {'table': table, 'colonne': column, 'unite': unit}
+                    for name, (table, column, unit) in METRICS.items()
+                })
+            elif len(parts) == 2 and parts[0] == 'metrics':
+                self._send_series(parts[1], params, url)
+            else:
+                raise ApiError(HTTPStatus.NOT_FOUND, "Ressource introuvable")
+        except ApiError as e:
+            self._send_json({'erreur': e.message}, status=e.status)
+        except sqlite3.Error as e:
+            # Erreur survenue avant l'envoi des en-têtes (voir `_send_series`)
+            self._send_json({'erreur': f"Erreur de base de données : {e}"}, status=HTTPStatus.SERVICE_UNAVAILABLE)
+
+    def _send_series(self, metric, params, url):
+        table, column, start, end, resolution = parse_query(metric, params)
+        etag = make_etag(table, url.path, url.query)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        ndjson = params.get('format') == 'ndjson' or 'application/x-ndjson' in (self.headers.get('Accept') or '')
+        streaming = False
+        try:
+            with self.server.pool.connection() as conn:
+                source = health_data.table_source(conn, table, read_only=True)
+                sql, args = build_sql(source, column, start, end, resolution)
+                cursor = conn.execute(sql, args)
+                self.send_response(HTTPStatus.OK)
+                self.send_header('Content-Type',
+                                 'application/x-ndjson' if ndjson else 'application/json; charset=utf-8')
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Vary', 'Accept')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                streaming = True
+                self._stream_rows(cursor, metric, resolution, ndjson)
+                self._write_chunk('')
+        except sqlite3.Error:
+            if not streaming:
+                raise
+            # En-têtes déjà envoyés : la réponse est interrompue sans morceau final,
+            # le client la voit incomplète
+            logger.exception("Lecture de %s interrompue pendant l'envoi", metric)
+            self.close_connection = True
+
+    def _stream_rows(self, cursor, metric, resolution, ndjson):
+        if ndjson:
+            for rows in iter(lambda: cursor.fetchmany(FETCH_SIZE), []):
+                self._write_chunk(''.join(json.dumps(format_row(row, resolution)) + '\n' for row in rows))
+        else:
+            header = json.dumps({'mesure': metric, 'resolution': resolution,
+                                 'unite': METRICS[metric][2]})[:-1]
+            self._write_chunk(header + ', "points": [')
+            first = True
+            for rows in iter(lambda: cursor.fetchmany(FETCH_SIZE), []):
+                body = ', '.join(json.dumps(format_row(row, resolution)) for row in rows)
+                self._write_chunk(body if first else ', ' + body)
+                first = False
+            self._write_chunk(']}')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+
+    def _send_json(self, payload, status=HTTPStatus.OK):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(host='127.0.0.1', port=8765, pool_size=4):
+    """Crée le serveur HTTP de l'API (sans le démarrer)."""
+    # En mode WAL, les lectures de l'API ne bloquent pas les imports des pages
+    health_data.enable_wal()
+    server = ThreadingHTTPServer((host, port), HealthApiHandler)
+    server.daemon_threads = True
+    server.pool = ReadConnectionPool(pool_size)
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="API locale de lecture des mesures de santé.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    httpd = create_server(args.host, args.port, args.pool_size)
+    print(f"API disponible sur http://{args.host}:{args.port}/metrics")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
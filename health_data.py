@@ -0,0 +1,592 @@
+# -*- coding: utf-8 -*-
+"""
+Couche d'accès aux données partagée par les pages de l'application.
+
+Les tables sont relues en DataFrames compacts : `DateHeure` en datetime64,
+colonnes numériques réduites (int16 / float32) et notes catégorielles.
+
+Un cache partagé par toutes les sessions du processus conserve le contenu de
+chaque table. Il est invalidé table par table :
+- par les écritures de l'application, signalées avec `notify_write` ;
+- par les écritures externes, détectées avec `PRAGMA data_version` : la
+  table touchée n'étant pas connue, tout le cache est alors invalidé.
+Les écritures sont aussi diffusées aux abonnés (voir `change_notifier`).
+
+Les mesures brutes anciennes peuvent être déplacées dans une base d'archive
+attachée (voir `archive`) ; la lecture des tables concernées reste transparente.
+
+Chaque import reçoit un numéro de lot, écrit dans la colonne `Lot` des lignes
+qu'il ajoute et consigné dans le journal `lots_import` (voir `batches`).
+
+L'emplacement de la base se règle avec la variable d'environnement
+`MYHEALTH_DB_PATH` ou `configure`. La valeur ':memory:' donne une base en
+mémoire partagée par toutes les connexions du processus (tests, bancs
+d'essai), que `fixtures` peut remplir à partir d'un instantané.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+MEMORY = ':memory:'
+DB_PATH = os.environ.get('MYHEALTH_DB_PATH', 'mesures_sante.db')
+# Par défaut, l'archive est placée à côté de la base (ou en mémoire avec elle)
+ARCHIVE_PATH = os.environ.get(
+    'MYHEALTH_ARCHIVE_PATH', MEMORY if DB_PATH == MEMORY else f"{os.path.splitext(DB_PATH)[0]}_archive.db"
+)
+
+# Colonnes de type texte converties en catégories (valeurs très répétitives)
+NOTE_COLUMNS = ('Note1', 'Note2')
+
+# Numéro de lot d'import des mesures, et journal des lots (import, détail par table,
+# puis version d'avant le lot des lignes qu'il a remplacées ou modifiées)
+BATCH_COLUMN = 'Lot'
+BATCH_LOG = 'lots_import'
+BATCH_LOG_TABLES = 'lots_import_tables'
+BATCH_PREIMAGES = 'lots_import_preimage'
+
+# Tables de fonctionnement (journaux, tables d'attente), absentes de la liste des tables
+# de données ; les autres modules y ajoutent les leurs
+INTERNAL_TABLES = {BATCH_LOG, BATCH_LOG_TABLES, BATCH_PREIMAGES}
+
+
+# --- Connexion ---
+
+# Bases en mémoire : une connexion reste ouverte pour chacune, sans quoi
+# SQLite libère la base à la fermeture de la dernière connexion
+_memory_generation = 0
+_keep_alive = {}
+
+
+def in_memory():
+    return DB_PATH == MEMORY
+
+
+def _memory_uri(name, read_only=False):
+    """
+    URI d'une base en mémoire partagée dans le processus.
+
+    Le VFS `memdb` est préféré au cache partagé (`mode=memory&cache=shared`),
+    dont le verrouillage par table fait échouer les écritures concurrentes
+    (« database table is locked ») au lieu d'attendre, et qui ne fait pas
+    évoluer PRAGMA data_version pour les autres connexions.
+    """
+    uri = f"file:/{name}_{_memory_generation}?vfs=memdb"
+    if name not in _keep_alive:
+        _keep_alive[name] = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    return uri + ("&mode=ro" if read_only else "")
+
+
+class _Connection(sqlite3.Connection):
+    """Connexion de l'application : retient son PRAGMA data_version à sa dernière écriture signalée."""
+    seen_version = None
+
+
+def _connect(read_only=False, check_same_thread=True):
+    if in_memory():
+        return sqlite3.connect(_memory_uri('mesures_sante', read_only), uri=True,
+                               check_same_thread=check_same_thread, factory=_Connection)
+    if read_only:
+        return sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=check_same_thread,
+                               factory=_Connection)
+    return sqlite3.connect(DB_PATH, check_same_thread=check_same_thread, factory=_Connection)
+
+
+def get_db_connection(read_only=False, check_same_thread=True):
+    """Établit une connexion à la base de données SQLite."""
+    conn = _connect(read_only, check_same_thread)
+    if not read_only:
+        # Lu avant de traiter les écritures externes en attente : celles qui
+        # surviennent ensuite changeront data_version pour cette connexion
+        conn.seen_version = _data_version(conn)
+        check_external_writes()
+    return conn
+
+
+def get_archive_connection():
+    """Connexion directe à la base d'archive, créée si besoin (restauration d'instantanés)."""
+    if ARCHIVE_PATH == MEMORY:
+        return sqlite3.connect(_memory_uri('archive'), uri=True)
+    return sqlite3.connect(ARCHIVE_PATH)
+
+
+def configure(db_path, archive_path=None):
+    """
+    Change l'emplacement de la base pour tout le processus (tests, bancs d'essai).
+
+    Avec ':memory:', la base et l'archive sont de nouvelles bases vides en
+    mémoire. Le cache partagé et la connexion de surveillance sont réinitialisés.
+    """
+    global DB_PATH, ARCHIVE_PATH, _memory_generation, _monitor_conn, _last_data_version
+    with _cache_lock:
+        if _monitor_conn is not None:
+            _monitor_conn.close()
+            _monitor_conn = None
+        for conn in _keep_alive.values():
+            conn.close()
+        _keep_alive.clear()
+        _memory_generation += 1
+        DB_PATH = db_path
+        ARCHIVE_PATH = archive_path or (MEMORY if db_path == MEMORY else f"{os.path.splitext(db_path)[0]}_archive.db")
+        _last_data_version = None
+        _write_counters.clear()
+    clear_cache()
+
+
+def enable_wal():
+    """Passe la base en journal WAL : les lecteurs ne bloquent plus les écritures."""
+    conn = get_db_connection()
+    try:
+        return conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def attach_archive(conn, create=False, read_only=False):
+    """
+    Attache la base d'archive à la connexion sous le nom `archive`.
+
+    Retourne False si l'archive n'existe pas et que `create` est faux. Une
+    archive créée ici l'est en auto_vacuum=INCREMENTAL.
+    """
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if 'archive' in attached:
+        return True
+    if ARCHIVE_PATH == MEMORY:
+        if not create and 'archive' not in _keep_alive:
+            return False
+        conn.execute("ATTACH DATABASE ? AS archive", (_memory_uri('archive', read_only),))
+    else:
+        if not create and not os.path.exists(ARCHIVE_PATH):
+            return False
+        # Le mode lecture seule passe par une URI (connexion ouverte avec uri=True)
+        target = f"file:{ARCHIVE_PATH}?mode=ro" if read_only else ARCHIVE_PATH
+        conn.execute("ATTACH DATABASE ? AS archive", (target,))
+    if create and not read_only and conn.execute("PRAGMA archive.page_count").fetchone()[0] == 0:
+        # Archive neuve : le mode est fixé avant sa première table, sans VACUUM complet
+        conn.execute("PRAGMA archive.auto_vacuum = INCREMENTAL")
+    return True
+
+
+def table_columns(conn, table_name, schema='main'):
+    """Liste les colonnes d'une table (vide si la table n'existe pas)."""
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table_name})")]
+
+
+def table_source(conn, table_name, read_only=False):
+    """
+    Expression SQL à utiliser dans un FROM pour lire une table.
+
+    Pour une table présente dans la base d'archive (tables archivées du
+    registre `metrics`), il s'agit de l'union des parties chaude et archivée ;
+    les colonnes absentes de l'archive valent NULL. Une mesure réimportée
+    après archivage est lue depuis la partie chaude uniquement.
+    """
+    if not attach_archive(conn, read_only=read_only):
+        return table_name
+    archive_columns = set(table_columns(conn, table_name, 'archive'))
+    if not archive_columns:
+        return table_name
+    columns = table_columns(conn, table_name)
+    archived = ", ".join(column if column in archive_columns else f"NULL AS {column}" for column in columns)
+    return (f"(SELECT {', '.join(columns)} FROM main.{table_name} "
+            f"UNION ALL SELECT {archived} FROM archive.{table_name} "
+            f"WHERE DateHeure NOT IN (SELECT DateHeure FROM main.{table_name}))")
+
+
+def read_table(table_name, conn=None):
+    """Lit une table (archive comprise), triée par date si la colonne existe."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        columns = table_columns(conn, table_name)
+        order_by = " ORDER BY DateHeure" if 'DateHeure' in columns else ""
+        source = table_source(conn, table_name)
+        return pd.read_sql_query(f"SELECT * FROM {source}{order_by}", conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+# --- Représentation compacte ---
+
+def _downcast_integer(series):
+    """Réduit une série à valeurs entières au plus petit type entier possible."""
+    values = series.dropna()
+    if values.empty:
+        return series.astype('Int16')
+    low, high = values.min(), values.max()
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            break
+    else:
+        dtype = np.int64
+    if series.isna().any():
+        # Type entier « nullable » pour conserver les valeurs manquantes
+        return series.astype(pd.api.types.pandas_dtype(dtype).name.capitalize())
+    return series.astype(dtype)
+
+
+def integer_columns(conn, table_name):
+    """Colonnes déclarées entières d'une table (affinité INTEGER de SQLite : type contenant « INT »)."""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})") if 'INT' in (row[2] or '').upper()}
+
+
+def compact_frame(df, integers=()):
+    """
+    Convertit un DataFrame lu depuis SQLite vers une représentation compacte.
+
+    - `DateHeure` (et toute colonne de date texte) devient datetime64 ;
+    - les colonnes déclarées entières (`integers`, voir `integer_columns`) sont
+      réduites (ex. int16 pour la pression) ;
+    - les autres colonnes numériques passent en float32, même si leurs valeurs
+      sont entières, pour que leur type ne dépende pas du contenu ;
+    - les notes et autres textes répétitifs deviennent catégoriels.
+    """
+    df = df.copy()
+    for column in df.columns:
+        series = df[column]
+        if column == 'DateHeure' or column.startswith('DateHeure_'):
+            df[column] = pd.to_datetime(series, errors='coerce').astype('datetime64[ns]')
+        elif pd.api.types.is_bool_dtype(series):
+            continue
+        elif pd.api.types.is_numeric_dtype(series):
+            numeric = series.dropna()
+            if column in integers and (numeric.empty or np.all(np.mod(numeric, 1) == 0)):
+                df[column] = _downcast_integer(series)
+            else:
+                df[column] = series.astype(np.float32)
+        elif column in NOTE_COLUMNS or series.nunique(dropna=True) <= len(series) // 2:
+            df[column] = series.astype('category')
+    return df
+
+
+def load_compact_table(table_name, conn=None):
+    """Lit une table et la retourne sous forme compacte."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        return compact_frame(read_table(table_name, conn), integer_columns(conn, table_name))
+    finally:
+        if own_conn:
+            conn.close()
+
+
+# --- Cache partagé entre les sessions ---
+
+_cache_lock = threading.RLock()
+_table_cache = {}       # table -> (version, DataFrame compact)
+_write_counters = {}    # table -> nombre d'écritures signalées
+_external_epoch = 0     # incrémenté à chaque écriture externe non attribuable
+_monitor_conn = None    # connexion dédiée à la lecture de PRAGMA data_version
+_last_data_version = None
+_write_listeners = []   # fonctions appelées avec (table, début, fin) à chaque écriture
+
+
+def _table_key(table_name):
+    # Les noms de tables SQLite ne sont pas sensibles à la casse
+    return table_name.lower()
+
+
+def _get_monitor_connection():
+    """Connexion de surveillance partagée (utilisée sous `_cache_lock`)."""
+    global _monitor_conn
+    if _monitor_conn is None:
+        _monitor_conn = _connect(check_same_thread=False)
+    return _monitor_conn
+
+
+def _data_version(conn):
+    """PRAGMA data_version : change quand une autre connexion que `conn` a écrit."""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _read_data_version():
+    """Lit PRAGMA data_version sur la connexion de surveillance."""
+    return _data_version(_get_monitor_connection())
+
+
+def add_write_listener(callback):
+    """Enregistre une fonction appelée avec (table, début, fin) à chaque écriture détectée."""
+    with _cache_lock:
+        if callback not in _write_listeners:
+            _write_listeners.append(callback)
+
+
+def _notify_listeners(changes):
+    for callback in list(_write_listeners):
+        for table_name, start, end in changes:
+            callback(table_name, start, end)
+
+
+def _detect_external_writes():
+    """Partie de `check_external_writes` exécutée sous `_cache_lock`."""
+    global _last_data_version, _external_epoch
+    version = _read_data_version()
+    changed = _last_data_version is not None and version != _last_data_version
+    _last_data_version = version
+    if not changed:
+        return []
+    # Une écriture peut toucher n'importe quelle table, y compris sur place
+    # (sans changer le nombre de lignes ni les dates) : toutes sont invalidées
+    _external_epoch += 1
+    _table_cache.clear()
+    return [(None, None, None)]
+
+
+def check_external_writes():
+    """
+    Détecte les écritures faites par une autre connexion sans `notify_write`.
+
+    La table touchée n'étant pas connue, tout le cache est invalidé et le
+    changement est signalé avec la table None.
+    Retourne la liste des changements (table, début, fin).
+    """
+    with _cache_lock:
+        changes = _detect_external_writes()
+    _notify_listeners(changes)
+    return changes
+
+
+def table_version(table_name):
+    """Retourne le jeton de version courant d'une table."""
+    check_external_writes()
+    with _cache_lock:
+        return (_external_epoch, _write_counters.get(_table_key(table_name), 0))
+
+
+def notify_write(*table_names, start=None, end=None, conn=None):
+    """
+    Signale que des tables viennent d'être modifiées (après le commit).
+
+    Seules ces tables seront relues au prochain accès ; les autres restent en cache.
+    `start` et `end` bornent la période modifiée lorsqu'elle est connue.
+    `conn` est la connexion qui a écrit (ouverte par `get_db_connection`) :
+    si une autre connexion a aussi écrit depuis sa précédente écriture
+    signalée, ces écritures sont traitées comme externes au lieu d'être
+    confondues avec la sienne.
+    """
+    global _last_data_version
+    changes = []
+    with _cache_lock:
+        # La surveillance est lue avant l'écrivain : une écriture externe
+        # survenue entre les deux lectures est vue par ce dernier
+        version = _read_data_version()
+        seen = getattr(conn, 'seen_version', None)
+        if seen is not None:
+            conn.seen_version = _data_version(conn)
+            if conn.seen_version != seen:
+                changes = _detect_external_writes()
+        for table_name in table_names:
+            key = _table_key(table_name)
+            _write_counters[key] = _write_counters.get(key, 0) + 1
+            _table_cache.pop(key, None)
+        if not changes:
+            # Notre propre écriture a changé data_version : ce n'est pas une écriture externe
+            _last_data_version = version
+    _notify_listeners(changes + [(_table_key(name), start, end) for name in table_names])
+
+
+def load_table(table_name):
+    """
+    Retourne le contenu compact d'une table depuis le cache partagé.
+
+    La table n'est relue que si sa version a changé depuis le dernier chargement,
+    quelle que soit la session qui l'a chargée. Une copie est retournée pour que
+    les pages puissent modifier leur DataFrame sans altérer le cache.
+    """
+    key = _table_key(table_name)
+    version = table_version(table_name)
+    with _cache_lock:
+        entry = _table_cache.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1].copy()
+
+    df = load_compact_table(table_name)
+    with _cache_lock:
+        # Une écriture pendant la lecture rend ce résultat déjà périmé
+        if version == (_external_epoch, _write_counters.get(key, 0)):
+            _table_cache[key] = (version, df)
+    return df.copy()
+
+
+def clear_cache():
+    """Vide entièrement le cache partagé."""
+    with _cache_lock:
+        _table_cache.clear()
+
+
+# --- Import en lot ---
+
+def ensure_batch_column(conn, table_name, schema='main'):
+    """
+    Ajoute la colonne `Lot` à une table de mesures si elle manque, et son index.
+
+    L'index est partiel : les mesures écrites avant les numéros de lot
+    (NULL) n'y figurent pas.
+    """
+    columns = table_columns(conn, table_name, schema)
+    if not columns:
+        return
+    if BATCH_COLUMN not in columns:
+        conn.execute(f"ALTER TABLE {schema}.{table_name} ADD COLUMN {BATCH_COLUMN} INTEGER")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_{table_name.lower()}_lot "
+                 f"ON {table_name} ({BATCH_COLUMN}) WHERE {BATCH_COLUMN} IS NOT NULL")
+
+
+def create_batch_log(conn):
+    # AUTOINCREMENT : un numéro n'est jamais réattribué, même si le journal est vidé
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {BATCH_LOG} (Lot INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "Source TEXT, ImporteLe TEXT, AnnuleLe TEXT)")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {BATCH_LOG_TABLES} (Lot INTEGER, NomTable TEXT, Lignes INTEGER, "
+                 "Premiere TEXT, Derniere TEXT, PRIMARY KEY (Lot, NomTable))")
+    # Ligne : la ligne d'origine en objet JSON {colonne: valeur}, quel que soit le schéma de la table
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {BATCH_PREIMAGES} (Lot INTEGER, NomTable TEXT, DateHeure TEXT, "
+                 "Ligne TEXT, PRIMARY KEY (Lot, NomTable, DateHeure))")
+
+
+def start_batch(conn, source):
+    """Ouvre un lot d'import dans le journal et retourne son numéro."""
+    with conn:
+        create_batch_log(conn)
+        cursor = conn.execute(f"INSERT INTO {BATCH_LOG} (Source, ImporteLe) VALUES (?, datetime('now', 'localtime'))",
+                              (source,))
+    return cursor.lastrowid
+
+
+def save_preimages(conn, batch, table_name, where, args=()):
+    """
+    Conserve la version actuelle des lignes de `table_name` vérifiant `where`, avant leur modification par le lot.
+
+    Seule la première version est gardée (celle d'avant le lot) ; les lignes
+    écrites par le lot lui-même sont ignorées. À appeler dans la transaction
+    qui les modifie.
+    """
+    row = ", ".join(f"'{column}', {column}" for column in table_columns(conn, table_name))
+    conn.execute(
+        f"INSERT OR IGNORE INTO {BATCH_PREIMAGES} (Lot, NomTable, DateHeure, Ligne) "
+        f"SELECT {int(batch)}, '{table_name}', DateHeure, json_object({row}) FROM {table_name} "
+        f"WHERE ({where}) AND {BATCH_COLUMN} IS NOT {int(batch)}", args
+    )
+
+
+def record_batch(conn, batch, tables):
+    """Consigne pour chaque table le nombre de lignes du lot et la période qu'elles couvrent (requêtes indexées)."""
+    with conn:
+        for table_name in tables:
+            count, first, last = conn.execute(
+                f"SELECT COUNT(*), MIN(DateHeure), MAX(DateHeure) FROM {table_name} WHERE {BATCH_COLUMN} = ?", (batch,)
+            ).fetchone()
+            conn.execute(f"INSERT OR REPLACE INTO {BATCH_LOG_TABLES} (Lot, NomTable, Lignes, Premiere, Derniere) "
+                         "VALUES (?, ?, ?, ?, ?)", (batch, table_name, count, first, last))
+
+
+def ingest_rows(conn, table_name, columns, rows, replace=False, batch=None):
+    """
+    Insère un lot de lignes en une transaction (INSERT OR IGNORE sur DateHeure).
+
+    Les mesures déjà présentes sont conservées, ou remplacées si `replace`
+    est vrai ; sans `replace`, une mesure déjà archivée n'est pas non plus
+    réinsérée dans la partie chaude. Avec `batch`, les lignes écrites portent ce numéro de lot et
+    les mesures remplacées sont conservées pour l'annulation du lot.
+    Retourne le nombre de lignes ajoutées (ou remplacées). Les abonnés ne
+    sont pas prévenus à chaque lot : l'appelant signale la période importée
+    avec `notify_write` à la fin de l'import.
+    """
+    placeholders = ", ".join("?" for _ in columns)
+    if not replace and 'DateHeure' in columns and attach_archive(conn) and table_columns(conn, table_name, 'archive'):
+        rows = list(rows)
+        position = list(columns).index('DateHeure')
+        archived = {row[0] for row in conn.execute(
+            f"SELECT DateHeure FROM archive.{table_name} WHERE DateHeure IN (SELECT value FROM json_each(?))",
+            (json.dumps([row[position] for row in rows], default=str),)
+        )}
+        if archived:
+            rows = [row for row in rows if str(row[position]) not in archived]
+    preimages = None
+    if replace and batch is not None:
+        rows = list(rows)
+        position = list(columns).index('DateHeure')
+        preimages = json.dumps([row[position] for row in rows], default=str)
+    if batch is not None:
+        # Numéro écrit en constante dans la requête : les lignes n'ont pas à être recopiées
+        columns = list(columns) + [BATCH_COLUMN]
+        placeholders += f", {int(batch)}"
+    conflict = "REPLACE" if replace else "IGNORE"
+    with conn:
+        if preimages is not None:
+            save_preimages(conn, batch, table_name, "DateHeure IN (SELECT value FROM json_each(?))", (preimages,))
+        cursor = conn.executemany(
+            f"INSERT OR {conflict} INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})", rows
+        )
+    return max(cursor.rowcount, 0)
+
+
+# --- Rapport mémoire ---
+
+def get_table_list(conn=None, internal=False):
+    """
+    Liste les tables de données de la base.
+
+    Les tables système, les tables virtuelles (index de recherche) et leurs
+    tables internes (`<table virtuelle>_...`) sont exclues, ainsi que les
+    tables de fonctionnement (`INTERNAL_TABLES`) sauf avec `internal`.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT name FROM sqlite_master AS m WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+            "AND sql NOT LIKE 'CREATE VIRTUAL TABLE%' "
+            "AND NOT EXISTS (SELECT 1 FROM sqlite_master AS v WHERE v.type='table' "
+            "AND v.sql LIKE 'CREATE VIRTUAL TABLE%' AND m.name LIKE v.name || '\\_%' ESCAPE '\\')"
+        )
+        hidden = set() if internal else {name.lower() for name in INTERNAL_TABLES}
+        # Les tables d'attente propres à un import portent le nom déclaré suivi du numéro de lot
+        return [row[0] for row in cursor.fetchall() if re.sub(r'_\d+$', '', row[0].lower()) not in hidden
+                and row[0].lower() not in hidden]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def memory_report(tables=None):
+    """
+    Compare l'empreinte mémoire de chaque table avant et après compaction.
+
+    Retourne un DataFrame avec une ligne par table et une ligne de total.
+    """
+    conn = get_db_connection()
+    try:
+        if tables is None:
+            tables = get_table_list(conn)
+        rows = []
+        for table_name in tables:
+            raw = read_table(table_name, conn)
+            compact = compact_frame(raw, integer_columns(conn, table_name))
+            rows.append({
+                'Table': table_name,
+                'Lignes': len(raw),
+                'Octets avant': int(raw.memory_usage(deep=True).sum()),
+                'Octets après': int(compact.memory_usage(deep=True).sum()),
+            })
+    finally:
+        conn.close()
+
+    report = pd.DataFrame(rows, columns=['Table', 'Lignes', 'Octets avant', 'Octets après'])
+    if not report.empty:
+        total = report[['Lignes', 'Octets avant', 'Octets après']].sum()
+        report.loc[len(report)] = ['Total', *total.tolist()]
+        report['Gain (%)'] = (
+            100 * (1 - report['Octets après'] / report['Octets avant'].where(report['Octets avant'] > 0))
+        ).round(1)
+    return report
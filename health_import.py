@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+"""
+Import des exports de santé des téléphones (Apple Santé, Google Fit).
+
+L'export Apple Santé (`export.xml`, souvent plus de 1 Go, éventuellement dans
+`export.zip`) est lu avec `iterparse` : chaque enregistrement est traité puis
+effacé, la mémoire reste constante quelle que soit la taille du fichier.
+Les mesures retenues sont converties dans les unités de la base, validées
+par le registre `metrics` (bornes de chaque mesure) puis insérées par lots
+(`health_data.ingest_rows`), sous un même numéro de lot d'import qui permet
+d'annuler l'import (`batches`) :
+
+- pression artérielle (corrélations systolique/diastolique) -> PressionBrut ;
+- fréquence cardiaque -> Pouls de la mesure de pression de la même minute ;
+- glycémie (mg/dL converties en mmol/L) -> glycemie ;
+- masse corporelle (kg et lbs) -> poids.
+
+Les exports Google Fit (Takeout, dossier `Fit/All data`) sont lus fichier
+par fichier : chaque fichier JSON ne contient qu'une source de données.
+
+Exemple : python health_import.py ~/Téléchargements/export.zip
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import glucose_analytics
+import health_data
+import metrics
+
+# Lignes insérées par transaction
+BATCH_SIZE = 5000
+LBS_PER_KG = 2.20462
+
+# Types d'enregistrements Apple Santé
+BP_CORRELATION = 'HKCorrelationTypeIdentifierBloodPressure'
+SYSTOLIC = 'HKQuantityTypeIdentifierBloodPressureSystolic'
+DIASTOLIC = 'HKQuantityTypeIdentifierBloodPressureDiastolic'
+HEART_RATE = 'HKQuantityTypeIdentifierHeartRate'
+BLOOD_GLUCOSE = 'HKQuantityTypeIdentifierBloodGlucose'
+BODY_MASS = 'HKQuantityTypeIdentifierBodyMass'
+
+# Moment du repas (HKBloodGlucoseMealTime, temporal_relation_to_meal) -> note de la mesure
+APPLE_MEAL_NOTES = {'1': 'Avant le repas', '2': 'Après le repas'}
+GOOGLE_FIT_MEAL_NOTES = {3: 'Avant le repas', 4: 'Après le repas'}
+
+# Fréquences cardiaques en attente de rattachement (table temporaire, clé : minute)
+PULSE_TABLE = 'temp.import_pouls'
+
+# Colonnes alimentées par table (registre `metrics`) ; 'pouls' désigne la table d'attente des fréquences cardiaques
+TABLE_COLUMNS = {metric.table: metric.columns for metric in metrics.METRICS.values()}
+TABLE_COLUMNS['pouls'] = ('Minute', 'Pouls')
+# Mesures du registre qui valident les lignes de chaque table
+TABLE_METRICS = {metric.table: metric for metric in metrics.METRICS.values()}
+TABLE_METRICS['pouls'] = metrics.METRICS['pression']
+
+
+@dataclass
+class ImportReport:
+    """Bilan d'un import : volumes lus, retenus et ajoutés, débit."""
+    source: str
+    records: int = 0                               # enregistrements lus dans l'export
+    rows: dict = field(default_factory=dict)       # lignes retenues par table
+    inserted: dict = field(default_factory=dict)   # lignes ajoutées par table
+    periods: dict = field(default_factory=dict)    # table -> [première, dernière DateHeure]
+    pulses: int = 0                                # pouls rattachés à une mesure de pression
+    rejected: int = 0                              # enregistrements illisibles ou hors bornes ignorés
+    seconds: float = 0.0
+    batch: int = None                              # numéro de lot des lignes ajoutées
+
+    @property
+    def records_per_second(self):
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def merge(self, other):
+        """Ajoute le bilan d'un autre import (fichier traité en parallèle)."""
+        self.records += other.records
+        self.rejected += other.rejected
+        self.pulses += other.pulses
+        for table, count in other.rows.items():
+            self.rows[table] = self.rows.get(table, 0) + count
+        for table, count in other.inserted.items():
+            self.inserted[table] = self.inserted.get(table, 0) + count
+        for table, (first, last) in other.periods.items():
+            period = self.periods.setdefault(table, [first, last])
+            period[0], period[1] = min(period[0], first), max(period[1], last)
+
+    def summary(self):
+        added = ", ".join(f"{table} : {count}" for table, count in self.inserted.items()) or "aucune mesure"
+        text = (f"{self.records:_} enregistrements lus en {self.seconds:.1f} s "
+                f"({self.records_per_second:_.0f} enregistrements/s). Ajouts : {added} ; "
+                f"pouls rattachés : {self.pulses}.")
+        if self.rejected:
+            text += f" {self.rejected:_} enregistrements illisibles ou hors bornes ignorés."
+        if self.batch is not None:
+            text += f" Lot n° {self.batch}."
+        return text.replace('_', ' ')
+
+
+# --- Lecture des exports ---
+
+def _local_time(text):
+    """'2024-03-01 08:15:00 +0100' -> '2024-03-01 08:15:00' (heure locale de la mesure)."""
+    return text[:19] if text and len(text) >= 19 else None
+
+
+def _glucose_mmol(value, unit):
+    if unit == 'mg/dL':
+        return round(value / glucose_analytics.MMOL_TO_MGDL, 1)
+    if unit.startswith('mmol'):   # Apple écrit « mmol<180.1558800000541>/L »
+        return round(value, 1)
+    return None
+
+
+def _weight_kg(value, unit):
+    factors = {'kg': 1.0, 'lb': 1 / LBS_PER_KG, 'g': 0.001}
+    return value * factors[unit] if unit in factors else None
+
+
+def weight_record(when, kg):
+    """Enregistrement de la table poids (kg et lbs) d'une masse en kilogrammes."""
+    return ('poids', {'DateHeure': when, 'Poids_kg': round(kg, 2), 'Poids_lbs': round(kg * LBS_PER_KG, 2)})
+
+
+def _apple_record(elem):
+    """Convertit un <Record> Apple en (table, enregistrement), ou None s'il n'est pas retenu."""
+    kind = elem.get('type')
+    if kind not in (HEART_RATE, BLOOD_GLUCOSE, BODY_MASS):
+        return None
+    when = _local_time(elem.get('startDate'))
+    try:
+        value = float(elem.get('value'))
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    unit = elem.get('unit') or ''
+
+    if kind == HEART_RATE:
+        return ('pouls', {'Minute': when[:16], 'Pouls': value})
+    if kind == BLOOD_GLUCOSE:
+        mmol = _glucose_mmol(value, unit)
+        if mmol is None:
+            return None
+        meal = None
+        for entry in elem.iter('MetadataEntry'):
+            if entry.get('key') == 'HKBloodGlucoseMealTime':
+                meal = APPLE_MEAL_NOTES.get(entry.get('value'))
+        return ('glycemie', {'DateHeure': when, 'Valeur': mmol, 'Note1': meal})
+    kg = _weight_kg(value, unit)
+    return weight_record(when, kg) if kg is not None else None
+
+
+def _apple_blood_pressure(elem):
+    """Convertit une <Correlation> de pression artérielle en enregistrement de PressionBrut."""
+    values = {record.get('type'): record.get('value') for record in elem.iter('Record')}
+    when = _local_time(elem.get('startDate'))
+    try:
+        systolic, diastolic = float(values[SYSTOLIC]), float(values[DIASTOLIC])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return ('PressionBrut', {'DateHeure': when, 'Systolique': systolic, 'Diastolique': diastolic})
+
+
+def iter_apple_health(stream, report=None):
+    """
+    Parcourt un export Apple Santé et produit des couples (table, enregistrement).
+
+    Seuls les éléments de premier niveau sont traités ; la racine est vidée
+    après chacun d'eux, si bien que l'arbre en mémoire ne dépasse jamais un
+    enregistrement. Les mesures de pression sont lues dans les corrélations
+    (les enregistrements systolique/diastolique isolés en sont des copies).
+    """
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            # Élément imbriqué (traité avec son parent) ou fin du document
+            continue
+        if report is not None:
+            report.records += 1
+        if elem.tag == 'Record':
+            record = _apple_record(elem)
+        elif elem.tag == 'Correlation' and elem.get('type') == BP_CORRELATION:
+            record = _apple_blood_pressure(elem)
+        else:
+            record = None
+        root.clear()
+        if record is not None:
+            yield record
+
+
+def _from_nanos(nanos):
+    return datetime.fromtimestamp(int(nanos) / 1e9).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _fit_values(point):
+    """Valeurs d'un point Google Fit (fpVal ou intVal, None si absente)."""
+    values = []
+    for item in point.get('fitValue', []):
+        value = item.get('value', {})
+        values.append(value.get('fpVal', value.get('intVal')))
+    return values
+
+
+def iter_google_fit(documents, report=None):
+    """Parcourt des documents JSON Google Fit (« Data Points ») et produit des couples (table, enregistrement)."""
+    for document in documents:
+        for point in document.get('Data Points', []):
+            if report is not None:
+                report.records += 1
+            kind = point.get('dataTypeName')
+            values = _fit_values(point)
+            if not values or values[0] is None or 'startTimeNanos' not in point:
+                continue
+            when = _from_nanos(point['startTimeNanos'])
+            if kind == 'com.google.blood_pressure' and len(values) > 1 and values[1] is not None:
+                yield ('PressionBrut', {'DateHeure': when, 'Systolique': values[0], 'Diastolique': values[1]})
+            elif kind == 'com.google.heart_rate.bpm':
+                yield ('pouls', {'Minute': when[:16], 'Pouls': values[0]})
+            elif kind == 'com.google.blood_glucose':
+                meal = GOOGLE_FIT_MEAL_NOTES.get(values[1]) if len(values) > 1 else None
+                yield ('glycemie', {'DateHeure': when, 'Valeur': round(values[0], 1), 'Note1': meal})
+            elif kind == 'com.google.weight':
+                yield weight_record(when, values[0])
+
+
+class _CountingReader:
+    """Enveloppe d'un flux binaire qui compte les octets lus et signale l'avancement."""
+
+    # Intervalle (octets) entre deux appels de `on_progress`
+    PROGRESS_STEP = 8 * 1024 * 1024
+
+    def __init__(self, raw, total, owned=False):
+        self.raw = raw
+        self.total = total
+        self.owned = owned
+        self.position = 0
+        self.on_progress = None
+        self._next_step = self.PROGRESS_STEP
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.position += len(data)
+        if self.on_progress is not None and self.position >= self._next_step:
+            self._next_step = self.position + self.PROGRESS_STEP
+            self.on_progress(self.fraction())
+        return data
+
+    def fraction(self):
+        return min(self.position / self.total, 1.0) if self.total else 0.0
+
+    def close(self):
+        if self.owned:
+            self.raw.close()
+
+
+def _stream_size(fileobj):
+    try:
+        current = fileobj.tell()
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(current)
+        return size
+    except (AttributeError, OSError):
+        return 0
+
+
+def _open_source(source, name):
+    """
+    Détecte le format d'un export et retourne ('apple', flux) ou ('google_fit', documents).
+
+    `source` est un chemin (fichier ou dossier) ou un fichier binaire ouvert.
+    Les documents Google Fit sont des chemins, des fichiers ou des (zip, membre).
+    """
+    name = (name or (source if isinstance(source, str) else '')).lower()
+    if isinstance(source, str) and os.path.isdir(source):
+        return 'google_fit', sorted(glob.glob(os.path.join(source, '**', '*.json'), recursive=True))
+    if name.endswith('.zip'):
+        archive = zipfile.ZipFile(source)
+        members = archive.namelist()
+        xml_members = [m for m in members if m.endswith('export.xml')]
+        if xml_members:
+            info = archive.getinfo(xml_members[0])
+            return 'apple', _CountingReader(archive.open(info), info.file_size, owned=True)
+        return 'google_fit', [(archive, m) for m in members if m.endswith('.json') and '/Fit/' in f"/{m}"]
+    if name.endswith('.json'):
+        return 'google_fit', [source]
+    if isinstance(source, str):
+        return 'apple', _CountingReader(open(source, 'rb'), os.path.getsize(source), owned=True)
+    return 'apple', _CountingReader(source, _stream_size(source))
+
+
+def _load_json(item):
+    if isinstance(item, tuple):
+        archive, member = item
+        with archive.open(member) as f:
+            return json.load(f)
+    if isinstance(item, str):
+        with open(item, 'rb') as f:
+            return json.load(f)
+    return json.load(item)
+
+
+# --- Écriture ---
+
+def create_tables(conn, pulse_table=PULSE_TABLE):
+    """Crée les tables de mesures manquantes (schémas du registre `metrics`) et la table d'attente des pouls."""
+    metrics.create_tables(conn)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {pulse_table} (Minute TEXT PRIMARY KEY, Pouls INTEGER)")
+
+
+class BatchWriter:
+    """
+    Regroupe les enregistrements par table et les insère par lots de `batch_size`.
+
+    Chaque lot est d'abord validé par le registre (`metrics.validate_records`) :
+    les enregistrements hors bornes sont comptés dans `report.rejected`. Les
+    lignes 'pouls' vont dans la table d'attente `pulse_table` ; les autres
+    portent le numéro de lot d'import `batch`.
+    """
+
+    def __init__(self, conn, report, batch_size=BATCH_SIZE, pulse_table=PULSE_TABLE, batch=None):
+        self.conn = conn
+        self.report = report
+        self.batch_size = batch_size
+        self.pulse_table = pulse_table
+        self.batch = batch
+        self.buffers = {}
+
+    def add(self, table, record):
+        buffer = self.buffers.setdefault(table, [])
+        buffer.append(record)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in ([table] if table else list(self.buffers)):
+            records = self.buffers.pop(name, [])
+            rows, rejected = metrics.validate_records(TABLE_METRICS[name], records, TABLE_COLUMNS[name])
+            self.report.rejected += rejected
+            if not rows:
+                continue
+            if name == 'pouls':
+                inserted = health_data.ingest_rows(self.conn, self.pulse_table, TABLE_COLUMNS[name], rows)
+            else:
+                inserted = health_data.ingest_rows(self.conn, name, TABLE_COLUMNS[name], rows, batch=self.batch)
+            self.report.rows[name] = self.report.rows.get(name, 0) + len(rows)
+            if name != 'pouls':
+                self.report.inserted[name] = self.report.inserted.get(name, 0) + inserted
+                dates = [row[0] for row in rows]
+                period = self.report.periods.setdefault(name, [min(dates), max(dates)])
+                period[0], period[1] = min(period[0], min(dates)), max(period[1], max(dates))
+
+
+def match_pulses(conn, report, pulse_table=PULSE_TABLE):
+    """Renseigne le pouls des mesures de pression importées à partir des fréquences cardiaques de la même minute."""
+    period = report.periods.get('PressionBrut')
+    if period is None or not report.rows.get('pouls'):
+        return 0
+    where = ("Pouls IS NULL AND DateHeure BETWEEN ? AND ? "
+             f"AND substr(DateHeure, 1, 16) IN (SELECT Minute FROM {pulse_table})")
+    with conn:
+        if report.batch is not None:
+            # Les mesures complétées retrouvent leur pouls vide si l'import est annulé
+            health_data.save_preimages(conn, report.batch, 'PressionBrut', where, period)
+        cursor = conn.execute(f'''
+            UPDATE PressionBrut
+            SET Pouls = (SELECT p.Pouls FROM {pulse_table} AS p WHERE p.Minute = substr(PressionBrut.DateHeure, 1, 16))
+            WHERE {where}
+        ''', period)
+    return cursor.rowcount
+
+
+def import_export(source, name=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Importe un export Apple Santé ou Google Fit et retourne son `ImportReport`.
+
+    `source` : chemin d'un export (.xml, .zip, .json ou dossier Takeout) ou
+    fichier binaire ouvert, dont `name` donne alors le nom. `progress` est
+    appelée régulièrement avec (fraction lue, bilan en cours).
+    """
+    kind, data = _open_source(source, name)
+    report = ImportReport(source=name or str(source))
+    notify = (lambda fraction: progress(fraction, report)) if progress else None
+
+    if kind == 'apple':
+        data.on_progress = notify
+        records = iter_apple_health(data, report)
+    else:
+        def documents():
+            for i, item in enumerate(data, start=1):
+                yield _load_json(item)
+                if notify is not None:
+                    notify(i / len(data))
+
+        records = iter_google_fit(documents(), report)
+
+    started = time.perf_counter()
+    conn = health_data.get_db_connection()
+    try:
+        create_tables(conn)
+        report.batch = health_data.start_batch(conn, report.source)
+        writer = BatchWriter(conn, report, batch_size, batch=report.batch)
+        try:
+            for table, record in records:
+                writer.add(table, record)
+            writer.flush()
+            report.pulses = match_pulses(conn, report)
+        finally:
+            # Journal du lot, même pour un import interrompu : ses lignes déjà écrites peuvent être annulées
+            health_data.record_batch(conn, report.batch, report.periods)
+        report.seconds = time.perf_counter() - started
+        notify_import(report, conn)
+    finally:
+        conn.close()
+        if kind == 'apple':
+            data.close()
+    if notify is not None:
+        notify(1.0)
+    return report
+
+
+def notify_import(report, conn):
+    """
+    Signale aux sessions ouvertes les tables modifiées par un import, avec la période importée.
+
+    `conn` est la connexion qui a écrit les lignes. Les valeurs aberrantes des
+    mesures importées sont détectées au passage ; la période signalée couvre
+    aussi leurs voisines recalculées.
+    """
+    tables = {metric.table: metric for metric in metrics.METRICS.values()}
+    for table, count in report.inserted.items():
+        if count or (table == 'PressionBrut' and report.pulses):
+            start, end = report.periods[table]
+            period, _ = metrics.refresh_outliers(tables[table], conn)
+            if period is not None:
+                start, end = min(start, period[0]), max(end, period[1])
+            health_data.notify_write(table, start=start, end=end, conn=conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Importe un export Apple Santé ou Google Fit.")
+    parser.add_argument('sources', nargs='+', help="export.xml, export.zip, fichier JSON ou dossier Takeout.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    for path in args.sources:
+        result = import_export(path, batch_size=args.batch_size)
+        print(f"{path} : {result.summary()}")
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Test de charge des pages Streamlit avec des sessions concurrentes.
+
+Chaque session virtuelle (un fil d'exécution) ouvre les pages avec
+`streamlit.testing.v1.AppTest` et rejoue un scénario d'interactions
+(changement de date, d'unité, de période, import de mesures) sur une base
+de travail en mémoire, remplie de données synthétiques ou d'un instantané
+(`fixtures`) : la base réelle n'est jamais touchée et rien n'est écrit sur
+disque hormis le rapport. Les latences de réexécution (p50/p95/p99) et le
+débit sont écrits dans un rapport JSON.
+
+Exemple : python load_test.py --sessions 8 --iterations 3 --days 90
+          python load_test.py --snapshot instantane.zip
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGES = ['main.py', 'page2.py', 'page3.py', 'page4.py', 'adminDB.py']
+
+
+# --- Base de travail ---
+
+def seed_database(conn, days=365, seed=0):
+    """Remplit une base vide (connexion `conn`) avec `days` jours de mesures synthétiques."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(date.today())
+    start = end - pd.Timedelta(days=days)
+    import metrics
+
+    metrics.create_tables(conn)
+
+    # Pression : 4 mesures par jour
+    times = start + pd.to_timedelta(np.arange(days * 4) * 6, unit='h') + pd.to_timedelta(
+        rng.integers(0, 3600, days * 4), unit='s')
+    systolic = rng.normal(130, 10, times.size).round().astype(int)
+    diastolic = (systolic * 0.65 + rng.normal(0, 4, times.size)).round().astype(int)
+    pulse = rng.normal(70, 8, times.size).round().astype(int)
+    notes = rng.choice(['-', 'après repas', 'stress', 'médicament oublié'], times.size)
+    rows = list(zip(times.strftime('%Y-%m-%d %H:%M:%S'), systolic.tolist(), diastolic.tolist(),
+                    pulse.tolist(), notes.tolist(), ['-'] * times.size))
+    conn.executemany("INSERT INTO PressionBrut (DateHeure, Systolique, Diastolique, Pouls, Note1, Note2) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT INTO PressionSynthese (DateHeure, Systolique, Diastolique, Pouls, Note1, Note2) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows[::2])
+
+    # Glycémie : capteur CGM, une mesure toutes les 5 minutes
+    times = start + pd.to_timedelta(np.arange(days * 288) * 5, unit='min')
+    glucose = np.round(7 + 2.5 * np.sin(np.arange(times.size) / 40) + rng.normal(0, 0.8, times.size), 1)
+    conn.executemany("INSERT INTO glycemie (DateHeure, Valeur, Note1, Note2) VALUES (?, ?, ?, ?)",
+                     zip(times.strftime('%Y-%m-%d %H:%M:%S'), glucose.tolist(),
+                         rng.choice(['', 'Avant le repas', 'Après le repas'], times.size).tolist(),
+                         [''] * times.size))
+
+    # Poids : une mesure par jour
+    times = start + pd.to_timedelta(np.arange(days), unit='D') + pd.Timedelta(hours=7)
+    weight = np.round(80 + np.cumsum(rng.normal(0, 0.15, times.size)), 2)
+    conn.executemany("INSERT INTO poids (DateHeure, Poids_kg, Poids_lbs) VALUES (?, ?, ?)",
+                     zip(times.strftime('%Y-%m-%d %H:%M:%S'), weight.tolist(), (weight * 2.20462).tolist()))
+    conn.commit()
+
+
+def import_readings(count=50):
+    """Simule un import de glycémie par une autre session (chemin d'écriture de l'application)."""
+    import sqlite3
+
+    import health_data
+    import metrics
+
+    now = pd.Timestamp.now().floor('s')
+    readings = pd.DataFrame({'DateHeure': now - pd.to_timedelta(np.arange(count), unit='s'), 'Valeur': '6.5'})
+    metric = metrics.METRICS['glycemie']
+    conn = health_data.get_db_connection()
+    try:
+        conn.execute("PRAGMA busy_timeout = 10000")
+        frame, _ = metrics.prepare_frame(metric, readings, {'DateHeure': 'DateHeure', 'Valeur': 'Valeur'})
+        metrics.ingest(metric, frame, conn)
+    except sqlite3.Error:
+        return
+    finally:
+        conn.close()
+
+
+# --- Scénarios ---
+
+def _scenario(page):
+    """Interactions rejouées après le premier affichage d'une page : liste de (nom, action)."""
+    if page == 'main.py':
+        return [
+            ('date', lambda at: at.date_input[0].set_value(date.today() - timedelta(days=90))),
+            ('unite', lambda at: at.radio(key='poids_unit').set_value('lbs')),
+            ('unite', lambda at: at.radio(key='poids_unit').set_value('kg')),
+            ('profil', lambda at: at.radio(key='profil_mesure').set_value('Glycémie')),
+        ]
+    if page == 'page3.py':
+        return [('periode', lambda at: at.date_input(key='variability_period').set_value(
+            (date.today() - timedelta(days=30), date.today())))]
+    if page == 'page4.py':
+        return [('unite', lambda at: at.radio[0].set_value('lbs'))]
+    return []
+
+
+class SessionResult:
+    def __init__(self):
+        self.samples = []   # (page, interaction, durée en secondes)
+        self.errors = []
+
+
+def run_session(session_id, iterations, result, import_every=2, timeout=120):
+    """Exécute le scénario complet d'une session virtuelle."""
+    from streamlit.testing.v1 import AppTest
+
+    for iteration in range(iterations):
+        for page in PAGES:
+            try:
+                at = AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=timeout)
+                started = time.perf_counter()
+                at.run()
+                result.samples.append((page, 'affichage', time.perf_counter() - started))
+                for name, action in _scenario(page):
+                    action(at)
+                    started = time.perf_counter()
+                    at.run()
+                    result.samples.append((page, name, time.perf_counter() - started))
+                if at.exception:
+                    result.errors.append(f"{page}: {at.exception[0].value}")
+            except Exception as e:
+                result.errors.append(f"{page}: {e}")
+        if import_every and iteration % import_every == session_id % import_every:
+            started = time.perf_counter()
+            import_readings()
+            result.samples.append(('import', 'glycemie', time.perf_counter() - started))
+
+
+def _percentiles(durations):
+    values = np.asarray(durations) * 1000
+    return {
+        'runs': int(values.size),
+        'p50_ms': round(float(np.percentile(values, 50)), 1),
+        'p95_ms': round(float(np.percentile(values, 95)), 1),
+        'p99_ms': round(float(np.percentile(values, 99)), 1),
+        'mean_ms': round(float(values.mean()), 1),
+    }
+
+
+def run_load_test(sessions=4, iterations=2, days=90, output='load_test_results.json', snapshot=None):
+    """
+    Lance le test de charge et retourne le rapport (également écrit en JSON).
+
+    La base de travail est en mémoire : instantané `snapshot` s'il est donné,
+    sinon `days` jours de mesures synthétiques.
+    """
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import fixtures
+    import health_data
+
+    previous = fixtures.use_memory_database(snapshot)
+    try:
+        if snapshot is None:
+            conn = health_data.get_db_connection()
+            try:
+                seed_database(conn, days=days)
+            finally:
+                conn.close()
+
+        results = [SessionResult() for _ in range(sessions)]
+        threads = [
+            threading.Thread(target=run_session, args=(i, iterations, results[i]), name=f"session-{i}")
+            for i in range(sessions)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        health_data.configure(*previous)
+
+    samples = pd.DataFrame([s for r in results for s in r.samples], columns=['page', 'interaction', 'duree'])
+    reruns = samples[samples['page'] != 'import']
+    report = {
+        'configuration': {'sessions': sessions, 'iterations': iterations,
+                          'donnees': snapshot or f"{days} jours synthétiques"},
+        'duree_totale_s': round(elapsed, 2),
+        'debit_reexecutions_par_s': round(len(reruns) / elapsed, 2) if elapsed else None,
+        'global': _percentiles(reruns['duree']) if not reruns.empty else None,
+        'pages': {page: _percentiles(group['duree']) for page, group in samples.groupby('page')},
+        'interactions': {f"{page}:{name}": _percentiles(group['duree'])
+                         for (page, name), group in samples.groupby(['page', 'interaction'])},
+        'erreurs': [error for r in results for error in r.errors],
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test de charge des pages de l'application.")
+    parser.add_argument('--sessions', type=int, default=4, help="Nombre de sessions simultanées.")
+    parser.add_argument('--iterations', type=int, default=2, help="Nombre de parcours par session.")
+    parser.add_argument('--days', type=int, default=90, help="Jours de données synthétiques.")
+    parser.add_argument('--snapshot', default=None, help="Instantané de base (fixtures.py) à la place des données synthétiques.")
+    parser.add_argument('--output', default='load_test_results.json')
+    args = parser.parse_args()
+
+    result = run_load_test(args.sessions, args.iterations, args.days, args.output, args.snapshot)
+    print(json.dumps({key: result[key] for key in ('duree_totale_s', 'debit_reexecutions_par_s', 'global')},
+                     indent=2, ensure_ascii=False))
+    if result['erreurs']:
+        print(f"{len(result['erreurs'])} erreur(s), voir {args.output}.")
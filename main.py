@@ -8,28 +8,23 @@ Created on Thu Aug 28 09:53:36 2025
 import streamlit as st
 import pandas as pd
 import sqlite3
-import plotly.graph_objects as go
-import statsmodels.api as sm
 from datetime import date
 
-# --- Fonctions de gestion de la base de données ---
-def get_db_connection():
-    """Établit une connexion à la base de données SQLite."""
-    try:
-        conn = sqlite3.connect('mesures_sante.db')
-        return conn
-    except sqlite3.Error as e:
-        st.error(f"Erreur de connexion à la base de données : {e}")
-        return None
+import change_notifier
+import charts
+import events
+import health_data
+import metrics
+import time_profiles
 
+# --- Fonctions de gestion de la base de données ---
 def read_data_from_db(table_name):
-    """Lit les données d'une table spécifiée."""
-    conn = get_db_connection()
-    if conn:
-        df = pd.read_sql_query(f"SELECT * FROM {table_name} ORDER BY DateHeure", conn)
-        conn.close()
-        return df
-    return pd.DataFrame()
+    """Lit les données d'une table spécifiée sous forme compacte."""
+    try:
+        return health_data.load_table(table_name)
+    except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+        st.error(f"Erreur de lecture de la table '{table_name}' : {e}")
+        return pd.DataFrame()
 
 # --- Configuration de la Page Streamlit ---
 st.set_page_config(page_title="Tableau de bord de santé", layout="wide")
@@ -43,148 +38,157 @@ start_date = st.date_input(
     value=date(2023, 1, 1), # Date par défaut
     help="Sélectionnez la date à partir de laquelle vous souhaitez voir les données."
 )
+hide_outliers = st.toggle(
+    "Masquer les valeurs aberrantes",
+    key="aberrants",
+    help="Les valeurs aberrantes (filtre de Hampel) sont exclues des tendances ; sinon elles restent marquées d'une croix."
+)
 st.markdown("---")
 
 # --- Fonctions de tracé de graphique ---
 
-def plot_blood_pressure(df, title, start_date):
-    """Génère et affiche un graphique pour les pressions systolique et diastolique."""
-    df_filtered = df[df['DateHeure'].dt.date >= start_date]
-
-    if df_filtered.empty or len(df_filtered) <= 1:
-        st.info(f"Pas assez de données pour le graphique '{title}' à partir de la date sélectionnée.")
-        return
-
-    st.subheader(f"Graphique : {title}")
-    fig = go.Figure()
-
-    data_columns = {
-        'Systolique': 'Systolique',
-        'Diastolique': 'Diastolique'
-    }
-
-    for column, name in data_columns.items():
-        fig.add_trace(go.Scatter(
-            x=df_filtered['DateHeure'],
-            y=df_filtered[column],
-            mode='lines+markers',
-            name=f'Mesures {name}'
-        ))
-
+def show_chart(title, fig, messages):
+    """Affiche un graphique préparé par le module `charts` et ses messages."""
+    if fig is not None:
+        st.subheader(f"Graphique : {title}")
+    for level, text in messages:
+        getattr(st, level)(text)
+    if fig is not None:
+        st.plotly_chart(fig, use_container_width=True)
+
+# --- Rafraîchissement des sections ---
+# Chaque section est un fragment : ses propres widgets (ex. l'unité du poids)
+# ne réexécutent qu'elle. Une section n'est recalculée que si l'une de ses
+# tables a changé dans la période affichée ; sinon ses graphiques précédents
+# sont réaffichés. Un fragment de surveillance, sans affichage, compare
+# périodiquement la version des tables à celle des graphiques affichés et ne
+# relance la page qu'en cas de changement : les graphiques ne sont pas
+# renvoyés au navigateur à chaque vérification.
+
+notifier = change_notifier.get_notifier()
+# Préfixe des clés d'état des sections (graphiques, versions et période affichées)
+SECTION_PREFIX = "section_"
+
+
+def refresh_section(key, tables, start_date, build, *args):
+    """Retourne les graphiques d'une section, recalculés seulement si nécessaire."""
+    cached = st.session_state.get(key)
+    seq = notifier.latest_seq()
+    # Versions lues avant le calcul : une écriture pendant celui-ci sera vue par la surveillance
+    versions = [health_data.table_version(table) for table in tables]
+    if cached is not None and cached['args'] == (start_date, *args):
+        changes = notifier.changes_since(cached['seq'], tables)
+        if not any(change.overlaps(start=start_date) for change in changes):
+            cached.update(seq=seq, versions=versions)
+            return cached['charts']
+    section_charts = build(start_date, *args)
+    st.session_state[key] = {'seq': seq, 'args': (start_date, *args), 'tables': tables, 'versions': versions,
+                             'start': start_date, 'charts': section_charts}
+    return section_charts
+
+
+def section_changed(section):
+    """Indique si une table de la section a changé dans sa période depuis son affichage."""
+    versions = [health_data.table_version(table) for table in section['tables']]
+    if versions == section['versions']:
+        return False
+    seq = notifier.latest_seq()
+    changes = notifier.changes_since(section['seq'], section['tables'])
+    if any(change.overlaps(start=section['start']) for change in changes):
+        return True
+    # Modifications hors de la période affichée : les graphiques restent valables
+    section.update(seq=seq, versions=versions)
+    return False
+
+
+@st.fragment(run_every=change_notifier.REFRESH_INTERVAL)
+def watch_sections():
+    sections = [value for key, value in st.session_state.items() if key.startswith(SECTION_PREFIX)]
+    if any(section_changed(section) for section in sections):
+        st.rerun()
+
+
+def show_section(section_charts):
+    for title, fig, messages in section_charts:
+        show_chart(title, fig, messages)
+
+
+def message(level, text):
+    """Élément de section sans graphique."""
+    return (None, None, [(level, text)])
+
+
+def with_events(chart, df, start_date):
+    """Ombre sur le graphique les événements qui recoupent la période affichée."""
+    title, fig, messages = chart
+    if fig is not None:
         try:
-            lowess = sm.nonparametric.lowess(
-                endog=df_filtered[column].dropna(),
-                exog=df_filtered[column].dropna().index,
-                frac=0.3
-            )
-            fig.add_trace(go.Scatter(
-                x=df_filtered['DateHeure'].iloc[lowess[:, 0].astype(int)],
-                y=lowess[:, 1],
-                mode='lines',
-                name=f'Tendance {name}',
-                line=dict(dash='dash')
-            ))
-        except Exception as e:
-            st.warning(f"Impossible de calculer la courbe de tendance pour '{name}'. Erreur: {e}")
-
-    fig.update_layout(
-        title=f"Évolution de {title} avec courbe de tendance",
-        xaxis_title="Date et Heure",
-        yaxis_title="Pression (mmHg)",
-        legend_title_text="Légende"
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-
-def plot_data(df, y_column, y_label, title, start_date):
-    """Génère et affiche un graphique pour une colonne de données donnée."""
-    df_filtered = df[df['DateHeure'].dt.date >= start_date].copy()
-    df_filtered[y_column] = pd.to_numeric(df_filtered[y_column], errors='coerce')
-    df_filtered.dropna(subset=[y_column], inplace=True)
-
-
-    if df_filtered.empty or len(df_filtered) <= 1:
-        st.info(f"Pas assez de données pour le graphique '{title}' à partir de la date sélectionnée.")
-        return
-
-    st.subheader(f"Graphique : {title}")
-    fig = go.Figure()
-
-    fig.add_trace(go.Scatter(
-        x=df_filtered['DateHeure'],
-        y=df_filtered[y_column],
-        mode='lines+markers',
-        name='Mesures'
-    ))
-
+            window = events.events_between(start_date, df['DateHeure'].max())
+            charts.add_event_overlays(fig, window, events.CATEGORIES)
+        except sqlite3.Error as e:
+            messages.append(('warning', f"Événements indisponibles : {e}"))
+    return chart
+
+# --- Lecture des données et préparation des graphiques ---
+
+def build_metric_charts(start_date, key, unit=None, hide_outliers=False):
+    """Graphiques d'une mesure du registre (un seul, dans l'unité choisie, s'ils sont exclusifs)."""
+    metric = metrics.METRICS[key]
+    df = read_data_from_db(metric.display_table)
+    if df.empty:
+        return [message('info', f"Aucune donnée de {metric.title} trouvée.")]
+    selected = [metric.chart(unit)] if metric.chart_choice else metric.charts
+    return [with_events((chart.title, *metrics.figure(metric, chart, df, start_date, hide_outliers=hide_outliers)),
+                        df, start_date)
+            for chart in selected]
+
+
+# Profils horaires : mesure -> (table, colonne, unité)
+PROFILE_METRICS = {
+    measure.label: (metric.table, measure.column, measure.unit)
+    for metric in metrics.METRICS.values() for measure in metric.measures if measure.profile
+}
+
+
+def build_profile_charts(start_date, metric):
+    """Carte de chaleur jour de la semaine × heure d'une mesure (moyennes calculées en SQL)."""
+    table, column, unit = PROFILE_METRICS[metric]
     try:
-        lowess = sm.nonparametric.lowess(
-            endog=df_filtered[y_column],
-            exog=df_filtered['DateHeure'].astype('int64'),
-            frac=0.3
-        )
-        fig.add_trace(go.Scatter(
-            x=pd.to_datetime(lowess[:, 0]),
-            y=lowess[:, 1],
-            mode='lines',
-            name='Tendance',
-            line=dict(dash='dash')
-        ))
-    except Exception as e:
-        st.warning(f"Impossible de calculer la courbe de tendance pour '{title}'. Erreur: {e}")
-
-    fig.update_layout(
-        title=f"Évolution de {title} avec courbe de tendance",
-        xaxis_title="Date et Heure",
-        yaxis_title=y_label,
-        legend_title_text="Légende"
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-# --- Lecture et affichage des données ---
-
-# Données de Pression et Pouls
-df_pression = read_data_from_db('PressionSynthese')
-if not df_pression.empty:
-    df_pression['DateHeure'] = pd.to_datetime(df_pression['DateHeure'])
-    
-    # Graphique Pression Artérielle
-    if 'Systolique' in df_pression.columns and 'Diastolique' in df_pression.columns:
-        df_pression['Systolique'] = pd.to_numeric(df_pression['Systolique'], errors='coerce')
-        df_pression['Diastolique'] = pd.to_numeric(df_pression['Diastolique'], errors='coerce')
-        plot_blood_pressure(df_pression, "Pression Artérielle (Systolique et Diastolique)", start_date)
-    else:
-        st.info("Colonnes 'Systolique' et/ou 'Diastolique' non trouvées pour le graphique de pression.")
-
-    # NOUVELLE SECTION : Graphique Pouls
-    if 'Pouls' in df_pression.columns:
-        plot_data(df_pression, 'Pouls', 'BPM (Battements par minute)', "Pouls", start_date)
-    else:
-        st.info("Aucune donnée de Pouls trouvée dans la table de pression.")
-
-else:
-    st.info("Aucune donnée de Pression Artérielle ou de Pouls trouvée.")
-st.markdown("---")
-
-# Données de Glycémie
-df_glycemie = read_data_from_db('glycemie')
-if not df_glycemie.empty:
-    df_glycemie['DateHeure'] = pd.to_datetime(df_glycemie['DateHeure'])
-    plot_data(df_glycemie, 'Valeur', 'mmol/L', "Glycémie", start_date)
-else:
-    st.info("Aucune donnée de Glycémie trouvée.")
-st.markdown("---")
-
-# Données de Poids
-df_poids = read_data_from_db('poids')
-if not df_poids.empty:
-    df_poids['DateHeure'] = pd.to_datetime(df_poids['DateHeure'])
-    unit = st.radio("Sélectionnez l'unité pour le graphique de poids :", ("kg", "lbs"), key="poids_unit")
-    y_column = "Poids_kg" if unit == "kg" else "Poids_lbs"
-    y_label = f"Poids ({unit})"
-    if y_column in df_poids.columns:
-        plot_data(df_poids, y_column, y_label, "Poids", start_date)
-    else:
-        st.warning(f"La colonne '{y_column}' n'a pas été trouvée dans les données de poids.")
-else:
-    st.info("Aucune donnée de Poids trouvée.")
+        profile = time_profiles.hourly_profile(table, start_date)
+    except sqlite3.Error as e:
+        return [message('error', f"Erreur de calcul du profil horaire : {e}")]
+    if profile.empty:
+        return [message('info', f"Aucune mesure de {metric} pour le profil horaire.")]
+    title = f"Profil horaire : {metric} moyenne par jour et par heure"
+    fig = charts.heatmap_figure(time_profiles.profile_matrix(profile, column), title, unit,
+                                time_profiles.count_matrix(profile, column))
+    return [(title, fig, [])]
+
+
+@st.fragment
+def metric_section(start_date, key, hide_outliers):
+    metric = metrics.METRICS[key]
+    unit = None
+    if metric.chart_choice:
+        unit = st.radio(metric.chart_choice, [chart.unit for chart in metric.charts], key=f"{key}_unit")
+    show_section(refresh_section(f"{SECTION_PREFIX}{key}", [metric.display_table, events.EVENTS_TABLE], start_date,
+                                 build_metric_charts, key, unit, hide_outliers))
+
+
+@st.fragment
+def profile_section(start_date):
+    metric = st.radio("Profil horaire de :", list(PROFILE_METRICS), horizontal=True, key="profil_mesure")
+    table = PROFILE_METRICS[metric][0]
+    show_section(refresh_section(f"{SECTION_PREFIX}profil", [table], start_date, build_profile_charts, metric))
+
+# --- Affichage des données ---
+
+# Une section par mesure du registre (pression et pouls, glycémie, poids...)
+for key in metrics.METRICS:
+    metric_section(start_date, key, hide_outliers)
+    st.markdown("---")
+
+# Profils matin / soir
+profile_section(start_date)
+
+watch_sections()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Éléments Streamlit communs aux pages de mesures (pression, glycémie, poids).
+
+Ils affichent la chaîne de `metrics` pour une mesure du registre : import
+d'un fichier avec association des colonnes, recherche dans les notes et
+graphiques avec événements. Les erreurs de base de données sont affichées
+dans la page.
+"""
+
+import sqlite3
+
+import pandas as pd
+import streamlit as st
+
+import charts
+import events
+import health_data
+import metrics
+import notes_search
+
+NO_COLUMN = "(aucune)"
+
+
+def ensure_tables(metric):
+    """
+    Crée les tables de la mesure et l'index des notes s'ils manquent.
+
+    Les valeurs aberrantes des mesures écrites par d'autres outils sont
+    détectées au passage (une requête indexée quand il n'y en a pas).
+    """
+    try:
+        conn = health_data.get_db_connection()
+        try:
+            metrics.create_tables(conn, [metric])
+            period, count = metrics.refresh_outliers(metric, conn)
+            if count:
+                health_data.notify_write(metric.table, start=period[0], end=period[1], conn=conn)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        st.error(f"Erreur de connexion à la base de données : {e}")
+        return
+    if metric.notes:
+        ensure_notes_index()
+
+
+def ensure_notes_index():
+    try:
+        notes_search.ensure_index()
+    except sqlite3.Error as e:
+        st.warning(f"Recherche dans les notes indisponible : {e}")
+
+
+def read_data(table_name):
+    """Contenu compact d'une table, vide (avec un message) si elle est illisible."""
+    try:
+        return health_data.load_table(table_name)
+    except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+        st.error(f"Erreur de lecture de la table '{table_name}' : {e}")
+        return pd.DataFrame()
+
+
+# --- Import ---
+
+def _read_upload(uploaded_file):
+    # Lecture en texte : la conversion des dates et des nombres est faite par `metrics.prepare_frame`
+    if uploaded_file.name.lower().endswith('.csv'):
+        return pd.read_csv(uploaded_file, dtype=str)
+    return pd.read_excel(uploaded_file, dtype=str)
+
+
+def _fields(metric):
+    """Champs à associer : (colonne de la table, libellé, obligatoire)."""
+    fields = [('DateHeure', "la date et l'heure", True)]
+    fields += [(measure.column, f"{measure.label} ({measure.unit})", measure.required) for measure in metric.measures]
+    if metric.notes:
+        fields += [(column, f"la note {column[-1]}", False) for column in health_data.NOTE_COLUMNS]
+    return fields
+
+
+def import_section(metric, file_types=("csv", "xlsx"), hint=None):
+    """
+    Import d'un fichier de mesures : aperçu, association des colonnes, enregistrement.
+
+    Retourne le nombre de lignes enregistrées, ou None si rien n'a été importé.
+    """
+    uploaded_file = st.file_uploader(
+        "Choisissez un fichier CSV ou Excel" if "xlsx" in file_types else "Choisissez un fichier CSV",
+        type=list(file_types),
+        key=f"upload_{metric.key}"
+    )
+    if uploaded_file is None:
+        return None
+    try:
+        df_input = _read_upload(uploaded_file)
+    except Exception as e:
+        st.error(f"Une erreur est survenue lors du chargement du fichier : {e}")
+        return None
+
+    st.write("Aperçu du fichier chargé :")
+    st.dataframe(df_input.head())
+    if hint:
+        st.info(hint)
+
+    available_columns = df_input.columns.tolist()
+    with st.form(f"mapping_{metric.key}"):
+        st.write("Veuillez faire correspondre les colonnes de votre fichier aux champs de la base de données.")
+        mapping = {}
+        for column, label, required in _fields(metric):
+            options = available_columns if required else [None] + available_columns
+            mapping[column] = st.selectbox(
+                f"Colonne pour {label} :",
+                options,
+                # Une colonne du fichier qui porte le nom du champ est proposée d'office
+                index=options.index(column) if column in options else 0,
+                format_func=lambda option: NO_COLUMN if option is None else option,
+                key=f"mapping_{metric.key}_{column}"
+            )
+        submitted = st.form_submit_button("Valider et Enregistrer les Données")
+    if not submitted:
+        return None
+
+    selected = [source for source in mapping.values() if source is not None]
+    if len(selected) != len(set(selected)):
+        st.error("⚠️ Une ou plusieurs colonnes ont été sélectionnées plusieurs fois. "
+                 "Veuillez vous assurer que chaque champ a une colonne unique.")
+        return None
+    if not any(mapping[measure.column] for measure in metric.measures):
+        st.error("⚠️ Veuillez sélectionner au moins une colonne de valeurs.")
+        return None
+
+    try:
+        frame, rejected = metrics.prepare_frame(metric, df_input, mapping)
+        count = metrics.ingest(metric, frame, source=f"{metric.title} : {uploaded_file.name}")
+    except sqlite3.Error as e:
+        st.error(f"Erreur d'écriture dans la base de données : {e}")
+        return None
+    except Exception as e:
+        st.error(f"Une erreur est survenue lors du traitement : {e}")
+        st.warning("Vérifiez le format de votre fichier et les colonnes sélectionnées.")
+        return None
+
+    st.success(f"✅ {count} nouvelles lignes ont été intégrées dans la base de données. "
+               "En cas d'erreur d'association, l'import peut être annulé depuis la page de gestion des données.")
+    ignored = len(df_input) - len(frame)
+    if rejected or ignored:
+        st.warning(f"{rejected} valeur(s) illisible(s) ou hors des bornes plausibles écartée(s) ; "
+                   f"{ignored} ligne(s) sans date valide, sans valeur ou en double ignorée(s).")
+    return count
+
+
+# --- Graphiques ---
+
+def hide_outliers_toggle(key):
+    """Choix d'affichage des valeurs aberrantes (toujours exclues des tendances)."""
+    return st.toggle("Masquer les valeurs aberrantes", key=f"aberrants_{key}",
+                     help="Les valeurs aberrantes (filtre de Hampel) sont exclues des tendances ; "
+                          "sinon elles restent marquées d'une croix.")
+
+
+def notes_search_box(table_name, key, label="Rechercher dans les notes :"):
+    """
+    Recherche dans les notes d'une table et choix de la mesure à centrer.
+
+    Retourne (mesures trouvées, index de la mesure choisie ou None).
+    """
+    query = st.text_input(label, key=f"notes_query_{key}")
+    try:
+        matches = notes_search.search_notes(query, tables=[table_name])
+    except sqlite3.Error as e:
+        st.warning(f"Recherche dans les notes indisponible : {e}")
+        return pd.DataFrame(), None
+    focus = None
+    if not matches.empty:
+        st.caption(f"{len(matches)} mesure(s) trouvée(s), marquées d'une étoile.")
+        focus = st.selectbox(
+            "Aller à la mesure :",
+            matches.index,
+            format_func=lambda i: f"{matches.at[i, 'DateHeure']:%d/%m/%Y %H:%M} — {matches.at[i, 'Extrait']}",
+            key=f"notes_focus_{key}"
+        )
+    elif query:
+        st.caption("Aucune note ne correspond à la recherche.")
+    return matches, focus
+
+
+def show_events(fig, df):
+    """Ombre sur le graphique les événements (traitement, maladie, voyage...) de la période affichée."""
+    try:
+        window = events.events_between(df['DateHeure'].min(), df['DateHeure'].max())
+    except sqlite3.Error as e:
+        st.warning(f"Événements indisponibles : {e}")
+        return fig
+    return charts.add_event_overlays(fig, window, events.CATEGORIES)
+
+
+def show_chart(metric, chart, df, trend=True, matches=None, focus=None, hide_outliers=False):
+    """Trace un graphique du registre avec les événements et, si une mesure est choisie, les notes trouvées."""
+    fig, messages = metrics.figure(metric, chart, df, trend=trend, hide_outliers=hide_outliers)
+    for level, text in messages:
+        getattr(st, level)(text)
+    if fig is None:
+        return None
+    if focus is not None:
+        charts.add_note_markers(fig, df, chart.columns[0], matches)
+        charts.focus_on(fig, matches.at[focus, 'DateHeure'])
+    show_events(fig, df)
+    st.plotly_chart(fig, use_container_width=True)
+    return fig
@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+Registre des mesures suivies et chaîne commune d'import, de stockage et de tracé.
+
+Chaque mesure (`Metric`) déclare sa table, ses colonnes de valeurs avec leur
+unité et leurs bornes plausibles (`Measure`), ses graphiques (`Chart`) et,
+le cas échéant, sa table de synthèse. Tout le reste en découle :
+
+- `create_tables` crée les tables déclarées ;
+- `prepare_frame` convertit un fichier importé (dates, nombres, bornes) en
+  opérations vectorisées ; `validate_records` applique les mêmes bornes aux
+  enregistrements des importeurs d'exports (téléphones, FHIR) ;
+- `ingest` insère le lot en une seule transaction (`executemany`), sous un
+  numéro de lot d'import qui permet de l'annuler (`batches`), et prévient
+  les sessions ouvertes de la période modifiée ;
+- `refresh_outliers` signale les valeurs aberrantes des nouvelles mesures
+  (`outliers`), que les tendances ignorent ;
+- `load` relit la table depuis le cache partagé de `health_data` ;
+- `figure` trace les colonnes avec leur tendance (`charts.series_figure`).
+
+Les pages, le tableau de bord, l'API, les rapports et les profils horaires
+lisent ce registre : une nouvelle mesure (SpO2, température...) s'ajoute
+avec `register` et bénéficie de la même chaîne.
+"""
+
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import charts
+import health_data
+import outliers
+
+# Mois abrégés des exports en français (ex. « 3 sept. 2025, 09 h 51 »)
+FRENCH_MONTHS = {
+    "janv.": "01", "févr.": "02", "mars": "03", "avr.": "04", "mai": "05", "juin": "06",
+    "juill.": "07", "août": "08", "sept.": "09", "oct.": "10", "nov.": "11", "déc.": "12",
+}
+_MONTH_PATTERN = "|".join(re.escape(month) for month in sorted(FRENCH_MONTHS, key=len, reverse=True))
+
+
+@dataclass(frozen=True)
+class Coding:
+    """Code LOINC d'une Observation FHIR exportée (fhir_bulk)."""
+    code: str
+    display: str
+    prefix: str                    # préfixe de l'identifiant des Observations
+    ucum: str = None               # code UCUM de l'unité de la valeur
+
+
+@dataclass(frozen=True)
+class Measure:
+    """Colonne de valeurs d'une mesure."""
+    column: str
+    label: str
+    unit: str
+    sql_type: str = 'REAL'
+    minimum: float = None          # bornes plausibles : une valeur hors bornes est rejetée
+    maximum: float = None
+    required: bool = True          # colonne à associer obligatoirement lors d'un import
+    api_name: str = None           # nom de la série dans l'API (health_api)
+    profile: bool = False          # profil horaire jour × heure (time_profiles)
+    outlier_floor: float = 0.0     # écart à la médiane locale en deçà duquel une valeur n'est jamais aberrante
+    fhir: Coding = None            # Observation FHIR de la mesure (ou composant du panel de sa mesure)
+
+    @property
+    def integer(self):
+        return self.sql_type == 'INTEGER'
+
+    def in_bounds(self, values):
+        """Indique (valeur ou Series) si les valeurs sont dans les bornes plausibles ; jamais pour NaN."""
+        low = -np.inf if self.minimum is None else self.minimum
+        high = np.inf if self.maximum is None else self.maximum
+        return (values >= low) & (values <= high)
+
+
+@dataclass(frozen=True)
+class Chart:
+    """Graphique d'une mesure : colonnes tracées ensemble sur un même axe."""
+    name: str
+    title: str
+    columns: tuple
+    y_label: str
+    unit: str = None
+
+
+@dataclass(frozen=True)
+class Synthesis:
+    """Table de synthèse : une mesure par tranche de `minutes`, celle où `column` est minimale."""
+    table: str
+    column: str
+    minutes: int = 30
+
+
+@dataclass(frozen=True)
+class Panel:
+    """Observation FHIR dont les composants sont plusieurs colonnes de la mesure (pression artérielle)."""
+    fhir: Coding
+    columns: tuple
+
+
+@dataclass(frozen=True)
+class Metric:
+    """Mesure suivie : table, colonnes de valeurs, graphiques et règles d'import."""
+    key: str
+    table: str
+    title: str
+    measures: tuple
+    charts: tuple
+    notes: bool = False
+    replace: bool = False          # une mesure réimportée remplace l'ancienne (sinon elle est ignorée)
+    date_format: str = None        # format des dates importées, mois français remplacés par leur numéro
+    chart_choice: str = None       # graphiques exclusifs : libellé du choix de l'unité affichée
+    synthesis: Synthesis = None
+    outlier_window: int = outliers.HALF_WINDOW   # voisines de chaque côté pour le filtre de Hampel
+    archived: bool = False         # mesures brutes anciennes déplacées dans la base d'archive (archive)
+    fhir_panel: Panel = None
+    fhir_category: str = 'vital-signs'
+
+    @property
+    def tables(self):
+        """Table brute puis table de synthèse éventuelle."""
+        return (self.table,) + ((self.synthesis.table,) if self.synthesis else ())
+
+    @property
+    def value_columns(self):
+        return tuple(measure.column for measure in self.measures)
+
+    @property
+    def columns(self):
+        """Colonnes de la table, dans l'ordre du schéma."""
+        return ('DateHeure',) + self.value_columns + (health_data.NOTE_COLUMNS if self.notes else ())
+
+    @property
+    def stored_columns(self):
+        """Colonnes de la table, indicateurs d'aberrance compris."""
+        return self.columns + (outliers.FLAG_COLUMN,)
+
+    @property
+    def display_table(self):
+        """Table lue par les graphiques de synthèse (tableau de bord, rapports)."""
+        return self.synthesis.table if self.synthesis else self.table
+
+    @property
+    def fhir_codings(self):
+        """Codes FHIR exportés : panel puis mesures codées (vide si la mesure n'est pas exportée)."""
+        panel = (self.fhir_panel.fhir,) if self.fhir_panel else ()
+        return panel + tuple(measure.fhir for measure in self.measures if measure.fhir)
+
+    def measure(self, column):
+        return next(measure for measure in self.measures if measure.column == column)
+
+    def chart(self, unit=None):
+        """Graphique de l'unité choisie pour les mesures à graphiques exclusifs, sinon le premier."""
+        return next((chart for chart in self.charts if chart.unit == unit), self.charts[0])
+
+
+METRICS = {}
+
+
+def register(metric):
+    """Ajoute une mesure au registre (et la remplace si sa clé existe déjà)."""
+    METRICS[metric.key] = metric
+    return metric
+
+
+register(Metric(
+    key='pression',
+    table='PressionBrut',
+    title="Pression Artérielle et Pouls",
+    measures=(
+        Measure('Systolique', 'Systolique', 'mmHg', 'INTEGER', 50, 300, api_name='systolique', profile=True,
+                outlier_floor=30, fhir=Coding('8480-6', 'Systolic blood pressure', 'pa', 'mm[Hg]')),
+        Measure('Diastolique', 'Diastolique', 'mmHg', 'INTEGER', 30, 200, api_name='diastolique', profile=True,
+                outlier_floor=20, fhir=Coding('8462-4', 'Diastolic blood pressure', 'pa', 'mm[Hg]')),
+        Measure('Pouls', 'Pouls', 'bpm', 'INTEGER', 20, 250, required=False, api_name='pouls', outlier_floor=25,
+                fhir=Coding('8867-4', 'Heart rate', 'fc', '/min')),
+    ),
+    charts=(
+        Chart('pression', "Pression Artérielle (Systolique et Diastolique)", ('Systolique', 'Diastolique'),
+              "Pression (mmHg)"),
+        Chart('pouls', "Pouls", ('Pouls',), "BPM (Battements par minute)"),
+    ),
+    notes=True,
+    synthesis=Synthesis('PressionSynthese', 'Systolique'),
+    archived=True,
+    fhir_panel=Panel(Coding('85354-9', 'Blood pressure panel', 'pa'), ('Systolique', 'Diastolique')),
+))
+
+register(Metric(
+    key='glycemie',
+    table='glycemie',
+    title="Glycémie",
+    measures=(
+        Measure('Valeur', 'Glycémie', 'mmol/L', 'REAL', 1, 35, api_name='glycemie', profile=True,
+                outlier_floor=2.0, fhir=Coding('15074-8', 'Glucose [Moles/volume] in Blood', 'gly', 'mmol/L')),
+    ),
+    charts=(Chart('glycemie', "Glycémie", ('Valeur',), "mmol/L"),),
+    notes=True,
+    replace=True,
+    date_format='%d %m %Y, %H h %M',
+    # Capteur continu : ± 30 minutes autour de chaque mesure
+    outlier_window=6,
+    fhir_category='laboratory',
+))
+
+register(Metric(
+    key='poids',
+    table='poids',
+    title="Poids",
+    measures=(
+        Measure('Poids_kg', 'Poids', 'kg', 'REAL', 20, 400, required=False, api_name='poids_kg', outlier_floor=2.0,
+                fhir=Coding('29463-7', 'Body weight', 'poids', 'kg')),
+        Measure('Poids_lbs', 'Poids', 'lbs', 'REAL', 44, 880, required=False, api_name='poids_lbs', outlier_floor=4.4),
+    ),
+    charts=(
+        Chart('poids', "Poids", ('Poids_kg',), "Poids (kg)", unit='kg'),
+        Chart('poids_lbs', "Poids", ('Poids_lbs',), "Poids (lbs)", unit='lbs'),
+    ),
+    chart_choice="Sélectionnez l'unité pour le graphique de poids :",
+))
+
+
+def api_series():
+    """Séries exposées par l'API : nom -> (table, colonne, unité)."""
+    return {measure.api_name: (metric.table, measure.column, measure.unit)
+            for metric in METRICS.values() for measure in metric.measures if measure.api_name}
+
+
+def archived_tables():
+    """Tables brutes dont les mesures anciennes sont archivées."""
+    return tuple(metric.table for metric in METRICS.values() if metric.archived)
+
+
+def note_tables():
+    """Tables (brutes et de synthèse) portant des notes."""
+    return tuple(table for metric in METRICS.values() if metric.notes for table in metric.tables)
+
+
+def profile_columns():
+    """Colonnes des profils horaires par table brute."""
+    profiled = {metric.table: tuple(measure.column for measure in metric.measures if measure.profile)
+                for metric in METRICS.values()}
+    return {table: columns for table, columns in profiled.items() if columns}
+
+
+# --- Stockage ---
+
+def _table_definition(metric, raw=True):
+    columns = ["DateHeure TEXT PRIMARY KEY"] + [f"{measure.column} {measure.sql_type}" for measure in metric.measures]
+    columns += [f"{column} TEXT" for column in health_data.NOTE_COLUMNS] if metric.notes else []
+    columns.append(f"{outliers.FLAG_COLUMN} INTEGER")
+    # Seules les tables brutes reçoivent des imports
+    columns += [f"{health_data.BATCH_COLUMN} INTEGER"] if raw else []
+    return f"({', '.join(columns)})"
+
+
+def create_tables(conn=None, metrics=None):
+    """Crée les tables (brutes et de synthèse) des mesures qui n'existent pas encore."""
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        for metric in (metrics or METRICS.values()):
+            for table_name in metric.tables:
+                raw = table_name == metric.table
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} {_table_definition(metric, raw)}")
+                # Tables créées avant la détection des valeurs aberrantes ou les numéros de lot
+                outliers.ensure_column(conn, table_name, pending_index=raw)
+            health_data.ensure_batch_column(conn, metric.table)
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+
+# --- Import ---
+
+def parse_dates(values, date_format=None):
+    """
+    Convertit une colonne de dates importée en datetime64 (NaT si illisible).
+
+    Avec `date_format`, les mois français abrégés sont d'abord remplacés par
+    leur numéro ; les dates qui ne suivent pas ce format sont lues avec le
+    format déduit par pandas.
+    """
+    text = pd.Series(values, dtype='string').str.strip()
+    if date_format is None:
+        return pd.to_datetime(text, errors='coerce')
+    numbered = text.str.replace(_MONTH_PATTERN, lambda match: FRENCH_MONTHS[match.group(0)], regex=True)
+    dates = pd.to_datetime(numbered, format=date_format, errors='coerce')
+    missing = dates.isna() & text.notna()
+    if missing.any():
+        dates[missing] = pd.to_datetime(text[missing], errors='coerce')
+    return dates
+
+
+def prepare_frame(metric, df, mapping):
+    """
+    Prépare un fichier importé pour `ingest`.
+
+    `mapping` associe les colonnes de la table (DateHeure, valeurs, notes) aux
+    colonnes du fichier ; une colonne non associée reste vide. Les valeurs
+    illisibles ou hors des bornes de leur mesure sont écartées, puis les
+    lignes sans date ou sans aucune valeur. Retourne (DataFrame, nombre de
+    valeurs rejetées).
+    """
+    frame = pd.DataFrame(index=df.index)
+    frame['DateHeure'] = parse_dates(df[mapping['DateHeure']], metric.date_format)
+    rejected = 0
+    for measure in metric.measures:
+        source = mapping.get(measure.column)
+        if source is None:
+            frame[measure.column] = np.nan
+            continue
+        text = df[source].astype('string').str.strip()
+        # Virgule décimale des fichiers français (« 5,6 »)
+        values = pd.to_numeric(text.str.replace(',', '.', regex=False), errors='coerce').astype(float)
+        valid = measure.in_bounds(values)
+        rejected += int((text.fillna('') != '').sum() - valid.sum())
+        values = values.where(valid)
+        frame[measure.column] = values.round().astype('Int64') if measure.integer else values
+    if metric.notes:
+        for column in health_data.NOTE_COLUMNS:
+            source = mapping.get(column)
+            frame[column] = df[source].astype('string') if source is not None else pd.NA
+
+    frame = frame.dropna(subset=['DateHeure'])
+    frame = frame.dropna(subset=list(metric.value_columns), how='all')
+    # Plusieurs lignes pour un même instant : la dernière du fichier est retenue
+    frame = frame.drop_duplicates(subset='DateHeure', keep='last').sort_values('DateHeure')
+    return frame.reset_index(drop=True), rejected
+
+
+def validate_records(metric, records, columns=None):
+    """
+    Lignes prêtes pour `ingest_rows` à partir d'enregistrements {colonne: valeur}.
+
+    Les importeurs d'exports produisent ces enregistrements avec les noms de
+    colonnes du registre ; les valeurs hors des bornes de leur mesure sont
+    écartées comme dans `prepare_frame`, puis les enregistrements sans aucune
+    valeur. Les mesures entières sont arrondies. `columns` : colonnes des
+    lignes produites (par défaut celles de la table). Retourne (lignes,
+    nombre d'enregistrements ayant une valeur rejetée).
+    """
+    columns = tuple(columns or metric.columns)
+    measures = [metric.measure(column) if column in metric.value_columns else None for column in columns]
+    rows, rejected = [], 0
+    for record in records:
+        row, kept, invalid = [], False, False
+        for column, measure in zip(columns, measures):
+            value = record.get(column)
+            if measure is not None and value is not None:
+                if not measure.in_bounds(value):
+                    value, invalid = None, True
+                else:
+                    value, kept = (round(value) if measure.integer else value), True
+            row.append(value)
+        rejected += invalid
+        if kept:
+            rows.append(tuple(row))
+    return rows, rejected
+
+
+def _sql_rows(metric, frame):
+    """Lignes prêtes pour `executemany` (types Python, NULL pour les valeurs manquantes)."""
+    columns = [frame['DateHeure'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist()]
+    for column in metric.columns[1:]:
+        values = frame[column].astype(object)
+        columns.append(values.where(frame[column].notna(), None).tolist())
+    return list(zip(*columns))
+
+
+def ingest(metric, frame, conn=None, source=None):
+    """
+    Insère les lignes préparées par `prepare_frame` en une transaction.
+
+    Les lignes portent un nouveau numéro de lot, consigné dans le journal
+    des imports avec `source` (ex. le nom du fichier). Retourne le nombre de
+    lignes ajoutées (ou remplacées pour une mesure `replace`) et signale la
+    période importée aux sessions ouvertes.
+    """
+    if frame.empty:
+        return 0
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        create_tables(conn, [metric])
+        batch = health_data.start_batch(conn, source or metric.title)
+        try:
+            count = health_data.ingest_rows(conn, metric.table, metric.columns, _sql_rows(metric, frame),
+                                            replace=metric.replace, batch=batch)
+        finally:
+            health_data.record_batch(conn, batch, [metric.table])
+        period, _ = refresh_outliers(metric, conn)
+        # Les indicateurs des mesures voisines de l'import ont pu changer aussi
+        start, end = frame['DateHeure'].min(), frame['DateHeure'].max()
+        if period is not None:
+            start, end = min(start, pd.Timestamp(period[0])), max(end, pd.Timestamp(period[1]))
+        health_data.notify_write(metric.table, start=start, end=end, conn=conn)
+    finally:
+        if own_conn:
+            conn.close()
+    return count
+
+
+def refresh_outliers(metric, conn=None):
+    """
+    Calcule les indicateurs d'aberrance des mesures qui n'en ont pas encore.
+
+    Retourne (période recalculée ou None, nombre d'indicateurs modifiés) ;
+    l'appelant signale l'écriture avec `notify_write`.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        if not health_data.table_columns(conn, metric.table):
+            return None, 0
+        with conn:
+            outliers.ensure_column(conn, metric.table)
+            return outliers.update_flags(conn, metric.table, metric.value_columns, metric.outlier_window,
+                                         [measure.outlier_floor for measure in metric.measures])
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def refresh_all_outliers():
+    """Indicateurs d'aberrance de toutes les mesures (écritures externes, maintenance)."""
+    changed = {}
+    conn = health_data.get_db_connection()
+    try:
+        for metric in METRICS.values():
+            period, count = refresh_outliers(metric, conn)
+            if count:
+                health_data.notify_write(metric.table, start=period[0], end=period[1], conn=conn)
+                changed[metric.table] = count
+    finally:
+        conn.close()
+    return changed
+
+
+def synthesize(metric, start=None, end=None):
+    """
+    Recalcule la table de synthèse d'une mesure en SQL.
+
+    Pour chaque tranche de `minutes` (alignée sur l'epoch, comme `floor` de
+    pandas), la mesure dont la colonne de synthèse est la plus basse est
+    conservée, la plus ancienne en cas d'égalité ; une mesure aberrante
+    n'est retenue que si la tranche n'en a pas d'autre. Les mesures
+    archivées sont incluses.
+
+    Avec `start` et `end`, seules les tranches qui recoupent cette période
+    sont recalculées (ex. après l'annulation d'un import). Retourne le nombre
+    de lignes de synthèse écrites.
+    """
+    synthesis = metric.synthesis
+    columns = ", ".join(metric.stored_columns)
+    bit = 1 << metric.value_columns.index(synthesis.column)
+    conn = health_data.get_db_connection()
+    try:
+        period, count = refresh_outliers(metric, conn)
+        if count:
+            health_data.notify_write(metric.table, start=period[0], end=period[1], conn=conn)
+        # Ancienne synthèse écrite par pandas (sans clé primaire, colonne de regroupement en plus) : recalcul complet
+        existing = health_data.table_columns(conn, synthesis.table)
+        if existing not in ([], list(metric.stored_columns)):
+            conn.execute(f"DROP TABLE {synthesis.table}")
+        where, args = "", ()
+        if start is not None and existing == list(metric.stored_columns):
+            # Bornes alignées sur les tranches : chaque tranche est recalculée en entier
+            frequency = f"{synthesis.minutes}min"
+            low = pd.Timestamp(start).floor(frequency)
+            high = pd.Timestamp(end).floor(frequency) + pd.Timedelta(minutes=synthesis.minutes)
+            where = "WHERE DateHeure >= ? AND DateHeure < ?"
+            args = (low.strftime('%Y-%m-%d %H:%M:%S'), high.strftime('%Y-%m-%d %H:%M:%S'))
+        create_tables(conn, [metric])
+        source = health_data.table_source(conn, metric.table)
+        with conn:
+            conn.execute(f"DELETE FROM {synthesis.table} {where}", args)
+            cursor = conn.execute(f'''
+                INSERT INTO {synthesis.table} ({columns})
+                SELECT {columns} FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY CAST(strftime('%s', DateHeure) AS INTEGER) / {synthesis.minutes * 60}
+                        ORDER BY COALESCE({outliers.FLAG_COLUMN}, 0) & {bit} != 0, {synthesis.column} IS NULL,
+                                 {synthesis.column}, DateHeure
+                    ) AS rang
+                    FROM {source} {where}
+                )
+                WHERE rang = 1
+                ORDER BY DateHeure
+            ''', args)
+        health_data.notify_write(synthesis.table, start=args[0] if args else None, end=args[1] if args else None,
+                                 conn=conn)
+    finally:
+        conn.close()
+    return cursor.rowcount
+
+
+# --- Lecture et tracé ---
+
+def load(metric, synthesized=False):
+    """Contenu compact de la table brute (ou de synthèse), depuis le cache partagé."""
+    return health_data.load_table(metric.display_table if synthesized else metric.table)
+
+
+def outlier_masks(metric, df, columns=None):
+    """Lignes aberrantes de `df` pour chaque colonne de valeurs (booléens indexés comme `df`)."""
+    if outliers.FLAG_COLUMN not in df.columns:
+        return {}
+    return {column: pd.Series(outliers.column_mask(df[outliers.FLAG_COLUMN], metric.value_columns.index(column)),
+                              index=df.index)
+            for column in (columns or metric.value_columns)}
+
+
+def figure(metric, chart, df, start_date=None, end_date=None, trend=True, hide_outliers=False):
+    """
+    Graphique `chart` d'une mesure sur la période [start_date, end_date].
+
+    Les valeurs aberrantes sont exclues des tendances, et signalées sur le
+    graphique ou masquées (`hide_outliers`). Retourne (figure, messages)
+    comme les fonctions de `charts`.
+    """
+    missing = [column for column in chart.columns if column not in df.columns]
+    if missing:
+        return None, [('warning', f"Colonne(s) {', '.join(missing)} introuvable(s) pour le graphique '{chart.title}'.")]
+    labels = {column: metric.measure(column).label for column in chart.columns}
+    return charts.series_figure(df, labels, chart.y_label, chart.title, start_date, end_date, trend=trend,
+                                outliers=outlier_masks(metric, df, chart.columns), hide_outliers=hide_outliers)
@@ -1,12 +1,14 @@
 import sqlite3
 
+import health_data
+
 def create_database():
     """
-    Crée une base de données SQLite nommée 'mesures_sante.db'
+    Crée la base de données SQLite (health_data.DB_PATH, 'mesures_sante.db' par défaut)
     avec trois tables pour la pression sanguine, la glycémie et le poids.
     """
     try:
-        conn = sqlite3.connect('mesures_sante.db')
+        conn = health_data.get_db_connection()
         cursor = conn.cursor()
 
         # Crée la table pour la Pression sanguine
@@ -42,7 +44,7 @@ def create_database():
         ''')
 
         conn.commit()
-        print("La base de données 'mesures_sante.db' et ses tables ont été créées avec succès.")
+        print(f"La base de données '{health_data.DB_PATH}' et ses tables ont été créées avec succès.")
     except sqlite3.Error as e:
         print(f"Une erreur s'est produite : {e}")
     finally:
@@ -1,6 +1,8 @@
 import sqlite3
 
-def create_database(db_name="mesures_sante.db"):
+import health_data
+
+def create_database(db_name=health_data.DB_PATH):
     """
     Crée une base de données SQLite.
 
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Recherche plein texte dans les notes des mesures (index SQLite FTS5).
+
+Les colonnes `Note1`/`Note2` des tables de mesures à notes (registre
+`metrics`, tables brutes et de synthèse) sont indexées dans la table
+virtuelle `notes_index`. Des déclencheurs la tiennent à jour à chaque
+insertion, modification ou suppression ; une table recréée (la synthèse de
+pression est remplacée à chaque analyse) perd ses déclencheurs et est
+réindexée au prochain appel de `ensure_index`.
+
+Chaque entrée a pour rowid une clé dérivée de la table et de `DateHeure`
+(clé primaire des tables de mesures) : une mesure remplacée par
+INSERT OR REPLACE remplace aussi son entrée, sans balayage de l'index.
+Le code de chaque table dans cette clé est attribué à sa première
+indexation et conservé dans `notes_sources`.
+"""
+
+import re
+
+import pandas as pd
+
+import health_data
+import metrics
+
+INDEX_TABLE = 'notes_index'
+
+# Code de chaque table indexée : clé d'entrée = secondes epoch de DateHeure * SOURCE_CODES + code
+SOURCE_TABLE = 'notes_sources'
+SOURCE_CODES = 1024
+health_data.INTERNAL_TABLES.add(SOURCE_TABLE)
+
+# Nombre maximal de résultats retournés par défaut
+SEARCH_LIMIT = 200
+
+
+def _source_code(conn, table_name):
+    """Code de la table dans les clés d'entrée, attribué à sa première indexation."""
+    row = conn.execute(f"SELECT Code FROM main.{SOURCE_TABLE} WHERE Source = ?", (table_name,)).fetchone()
+    if row is not None:
+        return row[0]
+    code = conn.execute(f"SELECT COALESCE(MAX(Code), 0) + 1 FROM main.{SOURCE_TABLE}").fetchone()[0]
+    if code >= SOURCE_CODES:
+        raise ValueError(f"Trop de tables indexées (au plus {SOURCE_CODES - 1}).")
+    conn.execute(f"INSERT INTO main.{SOURCE_TABLE} (Source, Code) VALUES (?, ?)", (table_name, code))
+    return code
+
+
+def _entry_key(row, code):
+    """Expression SQL de la clé d'entrée d'une ligne (NEW, OLD ou alias de table) d'une table de code `code`."""
+    return f"(CAST(strftime('%s', {row}.DateHeure) AS INTEGER) * {SOURCE_CODES} + {code})"
+
+
+def _has_notes(row):
+    """Condition SQL : la ligne porte au moins une note renseignée ('-' compte comme vide)."""
+    return " OR ".join(f"COALESCE(TRIM({row}.{column}), '') NOT IN ('', '-')" for column in health_data.NOTE_COLUMNS)
+
+
+def _trigger_name(table_name, suffix):
+    return f"{INDEX_TABLE}_{table_name.lower()}_{suffix}"
+
+
+def _insert_entry(row, table_name, code):
+    return (
+        f"INSERT OR REPLACE INTO {INDEX_TABLE} (rowid, Source, DateHeure, Note1, Note2) "
+        f"SELECT {_entry_key(row, code)}, '{table_name}', {row}.DateHeure, {row}.Note1, {row}.Note2 "
+        f"WHERE strftime('%s', {row}.DateHeure) IS NOT NULL AND ({_has_notes(row)})"
+    )
+
+
+def _create_triggers(conn, table_name):
+    code = _source_code(conn, table_name)
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {_trigger_name(table_name, 'ai')} AFTER INSERT ON {table_name} BEGIN
+            DELETE FROM {INDEX_TABLE} WHERE rowid = {_entry_key('NEW', code)};
+            {_insert_entry('NEW', table_name, code)};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {_trigger_name(table_name, 'ad')} AFTER DELETE ON {table_name} BEGIN
+            DELETE FROM {INDEX_TABLE} WHERE rowid = {_entry_key('OLD', code)};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {_trigger_name(table_name, 'au')}
+        AFTER UPDATE OF DateHeure, Note1, Note2 ON {table_name} BEGIN
+            DELETE FROM {INDEX_TABLE} WHERE rowid = {_entry_key('OLD', code)};
+            DELETE FROM {INDEX_TABLE} WHERE rowid = {_entry_key('NEW', code)};
+            {_insert_entry('NEW', table_name, code)};
+        END
+    ''')
+
+
+def _indexable(conn, table_name):
+    columns = health_data.table_columns(conn, table_name)
+    return 'DateHeure' in columns and all(column in columns for column in health_data.NOTE_COLUMNS)
+
+
+def index_rows(conn, table_name, source=None, where="1", args=()):
+    """
+    Ajoute à l'index les lignes de `source` (par défaut la table et son archive) vérifiant `where`.
+
+    Utilisée pour la reconstruction d'une table et pour les lignes déplacées
+    dans l'archive, que le déclencheur de suppression a retirées de l'index.
+    """
+    source = source or health_data.table_source(conn, table_name)
+    conn.execute(
+        f"INSERT OR REPLACE INTO main.{INDEX_TABLE} (rowid, Source, DateHeure, Note1, Note2) "
+        f"SELECT {_entry_key('s', _source_code(conn, table_name))}, '{table_name}', s.DateHeure, s.Note1, s.Note2 "
+        f"FROM {source} AS s WHERE ({where}) AND strftime('%s', s.DateHeure) IS NOT NULL AND ({_has_notes('s')})",
+        args
+    )
+
+
+def remove_rows(conn, table_name, source, where, args=()):
+    """Retire de l'index les lignes de `source` vérifiant `where` (lignes archivées, sans déclencheur)."""
+    conn.execute(
+        f"DELETE FROM main.{INDEX_TABLE} WHERE rowid IN (SELECT {_entry_key('s', _source_code(conn, table_name))} "
+        f"FROM {source} AS s WHERE {where})", args
+    )
+
+
+def rebuild_table(conn, table_name):
+    """Reconstruit les entrées d'une table (après sa recréation ou sa suppression)."""
+    conn.execute(f"DELETE FROM {INDEX_TABLE} WHERE Source = ?", (table_name,))
+    if _indexable(conn, table_name):
+        index_rows(conn, table_name)
+
+
+def index_exists(conn):
+    return bool(health_data.table_columns(conn, INDEX_TABLE))
+
+
+def _drop_index(conn):
+    """Supprime l'index et ses déclencheurs (index créé avant la table des codes de tables)."""
+    triggers = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", (f"{INDEX_TABLE}_%",)
+    )]
+    with conn:
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute(f"DROP TABLE {INDEX_TABLE}")
+
+
+def ensure_index(conn=None):
+    """
+    Crée l'index et les déclencheurs manquants, puis réindexe les tables concernées.
+
+    Peu coûteux quand tout est en place (lecture de `sqlite_master`).
+    Retourne la liste des tables réindexées.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        if index_exists(conn) and not health_data.table_columns(conn, SOURCE_TABLE):
+            # Clés d'entrée de l'ancien format (codes de table fixes) : l'index est reconstruit
+            _drop_index(conn)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {SOURCE_TABLE} (Source TEXT PRIMARY KEY, Code INTEGER UNIQUE)")
+        # Index de préfixes jusqu'à 8 caractères : la recherche par début de mot
+        # reste une simple lecture d'index, même pour les notes très fréquentes
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "Source UNINDEXED, DateHeure UNINDEXED, Note1, Note2, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6 7 8')"
+        )
+        triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        rebuilt = []
+        for table_name in metrics.note_tables():
+            if _trigger_name(table_name, 'ai') in triggers or not _indexable(conn, table_name):
+                continue
+            with conn:
+                _create_triggers(conn, table_name)
+                rebuild_table(conn, table_name)
+            rebuilt.append(table_name)
+        conn.commit()
+        return rebuilt
+    finally:
+        if own_conn:
+            conn.close()
+
+
+# --- Recherche ---
+
+def match_expression(query):
+    """
+    Traduit une saisie libre en requête FTS5 : tous les mots, chacun en préfixe.
+
+    Les accents et la casse sont ignorés (« apres » trouve « Après »).
+    Retourne None si la saisie ne contient aucun mot.
+    """
+    words = re.findall(r"\w+", query or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_notes(query, tables=None, limit=SEARCH_LIMIT, marks=('**', '**'), conn=None):
+    """
+    Recherche les mesures dont les notes correspondent à `query`.
+
+    Retourne un DataFrame (Table, DateHeure, Note1, Note2, Extrait), de la
+    mesure la plus récente à la plus ancienne ; `Extrait` reprend les notes
+    avec les mots trouvés entourés de `marks`. Les notes étant courtes et
+    répétitives, l'ordre des clés (chronologique) remplace le classement par
+    pertinence : l'index est parcouru à rebours et s'arrête à `limit`.
+    Lève sqlite3.OperationalError si FTS5 est indisponible.
+    """
+    columns = ['Table', 'DateHeure', 'Note1', 'Note2', 'Extrait']
+    expression = match_expression(query)
+    if expression is None:
+        return pd.DataFrame(columns=columns)
+
+    own_conn = conn is None
+    if own_conn:
+        conn = health_data.get_db_connection()
+    try:
+        sql = (
+            f"SELECT Source, DateHeure, Note1, Note2, "
+            f"highlight({INDEX_TABLE}, 2, ?, ?), highlight({INDEX_TABLE}, 3, ?, ?) "
+            f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH ?"
+        )
+        args = [*marks, *marks, expression]
+        if tables:
+            sql += f" AND Source IN ({', '.join('?' for _ in tables)})"
+            args.extend(tables)
+        sql += " ORDER BY rowid DESC LIMIT ?"
+        args.append(limit)
+        rows = conn.execute(sql, args).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+
+    results = pd.DataFrame([
+        (source, when, note1, note2,
+         " / ".join(text for text in (extract1, extract2) if text and text.strip() not in ('', '-')))
+        for source, when, note1, note2, extract1, extract2 in rows
+    ], columns=columns)
+    results['DateHeure'] = pd.to_datetime(results['DateHeure'], format='ISO8601').astype('datetime64[ns]')
+    return results
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Détection des valeurs aberrantes (filtre de Hampel) avant l'ajustement des tendances.
+
+Une mesure est aberrante lorsqu'elle s'écarte de la médiane de ses voisines
+(les `half_window` mesures qui la précèdent et la suivent dans le temps) de
+plus de `N_SIGMAS` écarts-types robustes (MAD × 1,4826), et d'au moins le
+seuil propre à sa mesure : une série très régulière (MAD nulle) ne signale
+pas ainsi la moindre variation. Les médianes glissantes sont calculées sur
+des tableaux NumPy triés, sans boucle Python.
+
+Le résultat est conservé dans la colonne `Aberrant` de la table brute, un
+bit par colonne de valeurs (bit 0 pour la première) ; NULL signifie « pas
+encore calculé ». `update_flags` ne recalcule que les mesures en attente et
+leurs voisines, retrouvées par un index partiel sur ces lignes. Pour une
+table archivée, seule la partie chaude est lue : les mesures archivées
+gardent l'indicateur calculé avant leur déplacement.
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+FLAG_COLUMN = 'Aberrant'
+# Écart-type d'une loi normale estimé par la MAD
+MAD_SCALE = 1.4826
+N_SIGMAS = 3.0
+HALF_WINDOW = 5
+
+
+def _rolling_median(windows):
+    """Médiane de chaque ligne de `windows`, valeurs manquantes (NaN) ignorées."""
+    # np.sort place les NaN en fin de ligne : la médiane se lit aux rangs des valeurs présentes
+    ordered = np.sort(windows, axis=1)
+    counts = np.count_nonzero(~np.isnan(windows), axis=1)
+    low = np.take_along_axis(ordered, np.maximum(counts - 1, 0)[:, None] // 2, axis=1)[:, 0]
+    high = np.take_along_axis(ordered, (counts // 2)[:, None], axis=1)[:, 0]
+    return np.where(counts > 0, (low + high) / 2, np.nan)
+
+
+def hampel(values, half_window=HALF_WINDOW, n_sigmas=N_SIGMAS, floor=0.0):
+    """
+    Indicateurs d'aberrance d'une série triée par date (tableau de booléens).
+
+    Les fenêtres sont centrées sur chaque mesure et tronquées aux extrémités ;
+    une valeur manquante n'est jamais aberrante.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return np.zeros(0, dtype=bool)
+    padded = np.pad(values, half_window, constant_values=np.nan)
+    windows = sliding_window_view(padded, 2 * half_window + 1)
+    median = _rolling_median(windows)
+    mad = _rolling_median(np.abs(windows - median[:, None]))
+    threshold = np.maximum(n_sigmas * MAD_SCALE * mad, floor)
+    with np.errstate(invalid='ignore'):
+        return np.abs(values - median) > threshold
+
+
+def flag_bits(values, half_window=HALF_WINDOW, floors=None):
+    """Masque d'aberrance (un bit par colonne) des lignes d'un tableau 2D de valeurs."""
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    floors = floors or [0.0] * values.shape[1]
+    bits = np.zeros(values.shape[0], dtype=np.int64)
+    for i, floor in enumerate(floors):
+        bits |= hampel(values[:, i], half_window, floor=floor).astype(np.int64) << i
+    return bits
+
+
+def pending_index_name(table_name):
+    return f"idx_{table_name.lower()}_aberrant_a_calculer"
+
+
+def ensure_column(conn, table_name, pending_index=True):
+    """Ajoute la colonne `Aberrant` si elle manque, et l'index partiel des lignes à calculer."""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+    if columns and FLAG_COLUMN not in columns:
+        conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {FLAG_COLUMN} INTEGER")
+    if columns and pending_index:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {pending_index_name(table_name)} "
+                     f"ON {table_name} (DateHeure) WHERE {FLAG_COLUMN} IS NULL")
+
+
+def _neighbour(conn, table_name, when, count, before):
+    """Date de la `count`-ième mesure avant (ou après) `when`, ou la plus lointaine disponible."""
+    comparison, order, bound = ('<', 'DESC', 'MIN') if before else ('>', 'ASC', 'MAX')
+    row = conn.execute(
+        f"SELECT {bound}(DateHeure) FROM (SELECT DateHeure FROM {table_name} "
+        f"WHERE DateHeure {comparison} ? ORDER BY DateHeure {order} LIMIT ?)", (when, count)
+    ).fetchone()
+    return row[0] or when
+
+
+def update_flags(conn, table_name, columns, half_window=HALF_WINDOW, floors=None):
+    """
+    Calcule la colonne `Aberrant` des mesures en attente (NULL) d'une table.
+
+    L'ajout d'une mesure change la fenêtre de ses `half_window` voisines de
+    chaque côté : leurs indicateurs sont recalculés aussi, ce qui demande
+    `half_window` mesures de plus pour compléter leurs propres fenêtres. Seule
+    cette plage est lue. Retourne la période recalculée (première, dernière
+    DateHeure) et le nombre d'indicateurs modifiés, ou (None, 0) s'il n'y
+    avait rien à calculer. Le commit est laissé à l'appelant.
+    """
+    first, last = conn.execute(
+        f"SELECT MIN(DateHeure), MAX(DateHeure) FROM {table_name} WHERE {FLAG_COLUMN} IS NULL"
+    ).fetchone()
+    if first is None:
+        return None, 0
+    start = _neighbour(conn, table_name, first, 2 * half_window, before=True)
+    end = _neighbour(conn, table_name, last, 2 * half_window, before=False)
+    rows = conn.execute(
+        f"SELECT DateHeure, {FLAG_COLUMN}, {', '.join(columns)} FROM {table_name} "
+        "WHERE DateHeure BETWEEN ? AND ? ORDER BY DateHeure", (start, end)
+    ).fetchall()
+    dates = [row[0] for row in rows]
+    previous = [row[1] for row in rows]
+    bits = flag_bits([row[2:] for row in rows], half_window, floors)
+
+    # Mesures dont la fenêtre est complète dans la plage lue : en attente et voisines
+    lo = max(np.searchsorted(dates, first) - half_window, 0)
+    hi = min(np.searchsorted(dates, last, side='right') + half_window, len(dates))
+    # Les mesures en attente passent d'abord à 0 en une requête ; seules les
+    # aberrantes et les voisines dont l'indicateur change sont ensuite écrites une à une
+    cursor = conn.execute(f"UPDATE {table_name} SET {FLAG_COLUMN} = 0 WHERE {FLAG_COLUMN} IS NULL "
+                          "AND DateHeure BETWEEN ? AND ?", (dates[lo], dates[hi - 1]))
+    updates = [(int(bits[i]), dates[i]) for i in range(lo, hi) if (previous[i] or 0) != bits[i]]
+    conn.executemany(f"UPDATE {table_name} SET {FLAG_COLUMN} = ? WHERE DateHeure = ?", updates)
+    changed = sum(1 for i in range(lo, hi) if previous[i] is not None and previous[i] != bits[i])
+    return (dates[lo], dates[hi - 1]), cursor.rowcount + changed
+
+
+def invalidate(conn, table_name, start, end, half_window=HALF_WINDOW):
+    """
+    Remet en attente les indicateurs des mesures de [start, end] et de leurs `half_window` voisines.
+
+    Après une suppression, les fenêtres des mesures restantes autour de la
+    période ont changé ; `update_flags` les recalculera.
+    """
+    low = _neighbour(conn, table_name, start, half_window, before=True)
+    high = _neighbour(conn, table_name, end, half_window, before=False)
+    conn.execute(f"UPDATE {table_name} SET {FLAG_COLUMN} = NULL WHERE DateHeure BETWEEN ? AND ?", (low, high))
+
+
+def column_mask(flags, position):
+    """Booléens « aberrante » d'une colonne (bit `position`) à partir de la colonne `Aberrant` lue."""
+    # Colonne entièrement NULL (pas encore calculée) : lue comme texte ou catégorie
+    values = pd.to_numeric(pd.Series(flags, dtype=object), errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    return (values >> position) & 1 == 1
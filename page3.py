@@ -1,163 +1,107 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-import statsmodels.api as sm
-import sqlite3
-
-# --- Database Management Functions ---
-def get_db_connection():
-    try:
-        conn = sqlite3.connect('mesures_sante.db')
-        return conn
-    except sqlite3.Error as e:
-        st.error(f"Erreur de connexion à la base de données : {e}")
-        return None
-
-def create_glycemie_table_if_not_exists():
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS glycemie (
-                DateHeure TEXT PRIMARY KEY,
-                Valeur REAL,
-                Note1 TEXT,
-                Note2 TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
-
-def insert_new_data(df):
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        new_rows_count = 0
-        for _, row in df.iterrows():
-            try:
-                # Use INSERT OR REPLACE for existing keys or new rows
-                cursor.execute('''
-                    INSERT OR REPLACE INTO glycemie (DateHeure, Valeur, Note1, Note2)
-                    VALUES (?, ?, ?, ?)
-                ''', (row['DateHeure'], row['Valeur'], row['Note1'], row['Note2']))
-                new_rows_count += 1
-            except sqlite3.IntegrityError:
-                pass
-        conn.commit()
-        conn.close()
-        return new_rows_count
-    return 0
-
-def read_data_from_db():
-    conn = get_db_connection()
-    if conn:
-        df = pd.read_sql_query("SELECT * FROM glycemie ORDER BY DateHeure", conn)
-        conn.close()
-        return df
-    return pd.DataFrame()
+import datetime
+
+import glucose_analytics
+import metric_widgets
+import metrics
+
+METRIC = metrics.METRICS['glycemie']
 
 # --- Streamlit Page Configuration ---
 st.set_page_config(page_title="Suivi de Glycémie", layout="wide")
-create_glycemie_table_if_not_exists()
+metric_widgets.ensure_tables(METRIC)
 
 # --- Page Title ---
 st.title("🩸 Suivi de Glycémie")
 st.markdown("---")
 
-# --- Section 1: Data Import and Selection ---
+# --- Section 1: Data Import and Column Mapping ---
 st.header("1. Importer votre fichier de données")
-uploaded_file = st.file_uploader(
-    "Choisissez un fichier CSV",
-    type="csv",
-    help="Le fichier doit contenir des colonnes pour la date, la glycémie et des notes."
+st.write("Le fichier doit contenir des colonnes pour la date, la glycémie et des notes.")
+metric_widgets.import_section(
+    METRIC,
+    hint='**Note :** Le format attendu pour la date-heure est `J MMM AAAA, HH "h" MM` (ex: `3 sept. 2025, 09 h 51`).'
 )
 
-if uploaded_file is not None:
-    try:
-        df_input = pd.read_csv(uploaded_file, dtype=str).fillna('')
-        st.success("Fichier importé avec succès ! Voici un aperçu :")
-        st.dataframe(df_input.head())
-
-        st.markdown("---")
-        st.header("2. Associer vos colonnes")
-        st.info('**Note :** Le format attendu pour la date-heure est `J MMM AAAA, HH "h" MM` (ex: `3 sept. 2025, 09 h 51`).')
-
-        with st.form("column_selection_form"):
-            available_columns = df_input.columns.tolist()
-            col_datetime = st.selectbox("Colonne pour la date et l'heure :", available_columns)
-            col_glucose = st.selectbox("Colonne pour la Glycémie (mmol/L) :", available_columns)
-            col_note1 = st.selectbox("Colonne pour la Note 1 :", available_columns)
-            col_note2 = st.selectbox("Colonne pour la Note 2 :", available_columns)
-            submit_button = st.form_submit_button(label="Valider et Enregistrer les Données")
-
-        if submit_button:
-            df_processed = df_input[[col_datetime, col_glucose, col_note1, col_note2]].copy()
-            df_processed.columns = ["Date-Heure", "Glycémie (mmol/L)", "Note-1", "Note-2"]
-
-            # Month map is applied here
-            month_map = {
-                "janv.": "01", "févr.": "02", "mars": "03", "avr.": "04",
-                "mai": "05", "juin": "06", "juill.": "07",
-                "août": "08", "sept.": "09", "oct.": "10", "nov.": "11", "déc.": "12"
-            }
-            date_series = df_processed["Date-Heure"].astype(str)
-            for month_str, month_num in month_map.items():
-                date_series = date_series.str.replace(month_str, month_num, regex=False)
-            date_format_string = "%d %m %Y, %H h %M"
-            df_processed["Date-Heure"] = pd.to_datetime(date_series, format=date_format_string, errors='coerce')
-            
-            # --- The key fix is here ---
-            # Convert Timestamp column to a string format for SQLite
-            df_processed.dropna(subset=["Date-Heure"], inplace=True)
-            df_processed['Glycémie (mmol/L)'] = pd.to_numeric(df_processed['Glycémie (mmol/L)'], errors='coerce')
-            df_processed['Date-Heure'] = df_processed['Date-Heure'].dt.strftime('%Y-%m-%d %H:%M:%S')
-
-            # Rename columns before insertion
-            df_processed.rename(columns={'Date-Heure': 'DateHeure', 'Glycémie (mmol/L)': 'Valeur', 'Note-1': 'Note1', 'Note-2': 'Note2'}, inplace=True)
-            
-            new_rows_count = insert_new_data(df_processed)
-            st.success(f"Données enregistrées avec succès dans la base de données ! {new_rows_count} nouvelles lignes ont été ajoutées.")
-
-    except Exception as e:
-        st.error(f"Une erreur est survenue lors du traitement : {e}")
-        st.warning("Vérifiez que le format de date dans votre fichier correspond bien au format attendu et que les colonnes sélectionnées sont les bonnes.")
-
-# --- Section 3: Data Visualization ---
+# --- Section 2: Data Visualization ---
 st.markdown("---")
-st.header("3. Graphique de suivi de la glycémie")
-
-df_final = read_data_from_db()
+st.header("2. Graphique de suivi de la glycémie")
 
-if not df_final.empty:
-    df_final['DateHeure'] = pd.to_datetime(df_final['DateHeure'])
-    df_final['Valeur'] = pd.to_numeric(df_final['Valeur'], errors='coerce')
-    df_final.dropna(subset=["Valeur"], inplace=True)
+# Chaque section d'affichage est un fragment : le choix de la période de
+# variabilité ne réexécute que sa section, sans retracer la glycémie.
+@st.fragment
+def glucose_chart_section():
+    df_final = metric_widgets.read_data(METRIC.table)
 
-    if not df_final.empty and len(df_final) > 1:
+    if not df_final.empty:
         st.write("Graphique de la glycémie en fonction du temps, avec sa courbe de tendance.")
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df_final['DateHeure'], y=df_final['Valeur'], mode='lines+markers', name='Mesures'))
-        
-        # Calculate and add the LOWESS trend line
-        lowess_data = sm.nonparametric.lowess(endog=df_final['Valeur'], exog=df_final['DateHeure'].astype('int64'), frac=0.3)
-        fig.add_trace(go.Scatter(x=pd.to_datetime(lowess_data[:, 0]), y=lowess_data[:, 1], mode='lines', name='Tendance', line=dict(dash='dash')))
-        
-        fig.update_layout(
-            title="Évolution de la Glycémie avec Courbe de Tendance",
-            xaxis_title="Date et Heure",
-            yaxis_title="Glycémie (mmol/L)",
-            legend_title_text="Légende"
+
+        # Recherche dans les notes : les mesures trouvées sont marquées sur le graphique
+        matches, focus = metric_widgets.notes_search_box(
+            METRIC.table, "glycemie", "Rechercher dans les notes (ex. « après repas ») :"
         )
-        st.plotly_chart(fig, use_container_width=True)
-        
-        with st.expander("Afficher les données enregistrées dans la base de données"):
+        hide_outliers = metric_widgets.hide_outliers_toggle("glycemie")
+        if metric_widgets.show_chart(METRIC, METRIC.chart(), df_final, matches=matches, focus=focus,
+                                     hide_outliers=hide_outliers) is not None:
+            with st.expander("Afficher les données enregistrées dans la base de données"):
+                st.dataframe(df_final)
+        else:
             st.dataframe(df_final)
-    elif not df_final.empty:
-        st.warning("Il faut au moins deux points de données pour dessiner une courbe de tendance.")
-        st.dataframe(df_final)
     else:
-        st.info("La table `glycemie` est vide.")
-else:
-    st.info("Veuillez importer un fichier pour afficher le graphique.")
\ No newline at end of file
+        st.info("Veuillez importer un fichier pour afficher le graphique.")
+
+glucose_chart_section()
+
+# --- Section 3: Glycemic Variability ---
+st.markdown("---")
+st.header("3. Variabilité glycémique")
+st.write(f"Indicateurs calculés par jour puis combinés sur la période choisie "
+         f"(cible : {glucose_analytics.TARGET_LOW} à {glucose_analytics.TARGET_HIGH} mmol/L).")
+
+@st.fragment
+def variability_section():
+    df_daily = glucose_analytics.load_daily_stats()
+
+    if not df_daily.empty:
+        first_day = datetime.date.fromisoformat(df_daily['Jour'].iloc[0])
+        last_day = datetime.date.fromisoformat(df_daily['Jour'].iloc[-1])
+        period = st.date_input(
+            "Période analysée :",
+            value=(max(first_day, last_day - datetime.timedelta(days=13)), last_day),
+            min_value=first_day,
+            max_value=last_day,
+            key="variability_period"
+        )
+        if isinstance(period, (tuple, list)) and len(period) == 2:
+            summary = glucose_analytics.summarize_period(df_daily, period[0], period[1])
+            if summary is None:
+                st.info("Aucune mesure de glycémie sur la période sélectionnée.")
+            else:
+                col1, col2, col3, col4, col5, col6 = st.columns(6)
+                col1.metric("Temps dans la cible", f"{summary['TIR']:.0f} %")
+                col2.metric("Sous la cible", f"{summary['TBR']:.1f} %")
+                col3.metric("Au-dessus de la cible", f"{summary['TAR']:.0f} %")
+                col4.metric("Coefficient de variation", f"{summary['CV']:.1f} %")
+                col5.metric("GMI", f"{summary['GMI']:.1f} %")
+                col6.metric("MAGE", "—" if pd.isna(summary['MAGE']) else f"{summary['MAGE']:.1f} mmol/L")
+                st.caption(f"{int(summary['Mesures'])} mesures sur {summary['Jours']} jours.")
+
+                df_period = df_daily[(df_daily['Jour'] >= str(period[0])) & (df_daily['Jour'] <= str(period[1]))]
+                fig_tir = go.Figure()
+                for column, name, color in (('TBR', 'Sous la cible', '#d62728'),
+                                            ('TIR', 'Dans la cible', '#2ca02c'),
+                                            ('TAR', 'Au-dessus de la cible', '#ff7f0e')):
+                    fig_tir.add_trace(go.Bar(x=df_period['Jour'], y=df_period[column], name=name, marker_color=color))
+                fig_tir.update_layout(barmode='stack', title="Répartition quotidienne du temps par zone",
+                                      xaxis_title="Jour", yaxis_title="% des mesures", legend_title_text="Zone")
+                st.plotly_chart(fig_tir, use_container_width=True)
+
+                with st.expander("Afficher les indicateurs journaliers"):
+                    st.dataframe(df_period[['Jour', 'Mesures', 'Moyenne', 'CV', 'TIR', 'TBR', 'TAR', 'GMI', 'MAGE']].round(2),
+                                 use_container_width=True)
+    else:
+        st.info("Aucune donnée de glycémie à analyser.")
+
+variability_section()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Génération de rapports de santé statiques (HTML) sans Streamlit.
+
+Chaque table n'est lue qu'une fois ; les mesures sont ensuite découpées par
+période et les rapports (graphiques et tableaux de synthèse) sont produits en
+parallèle dans un groupe de processus, avec les mêmes graphiques que le
+tableau de bord (`metrics`).
+
+Exemple : python report_builder.py --year 2025 --output rapports
+"""
+
+import argparse
+import calendar
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+
+import pandas as pd
+
+import health_data
+import metrics
+
+
+@dataclass(frozen=True)
+class ReportMetric:
+    """Graphique d'un rapport : mesure du registre et graphique tracé."""
+    metric: metrics.Metric
+    chart: metrics.Chart
+
+    @property
+    def table(self):
+        return self.metric.display_table
+
+
+# Graphiques des mesures du registre ; pour les graphiques exclusifs (unités), le premier seulement
+REPORT_METRICS = {
+    chart.name: ReportMetric(metric, chart)
+    for metric in metrics.METRICS.values()
+    for chart in (metric.charts[:1] if metric.chart_choice else metric.charts)
+}
+
+
+@dataclass(frozen=True)
+class Period:
+    label: str
+    start: date
+    end: date
+
+
+def monthly_periods(year):
+    """Liste des périodes mensuelles d'une année."""
+    return [
+        Period(f"{year}-{month:02d}", date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+        for month in range(1, 13)
+    ]
+
+
+def slice_period(df, period):
+    """Sélectionne les lignes d'une période dans un DataFrame trié par DateHeure."""
+    dates = df['DateHeure'].to_numpy()
+    lo = dates.searchsorted(pd.Timestamp(period.start).to_datetime64(), side='left')
+    hi = dates.searchsorted((pd.Timestamp(period.end) + pd.Timedelta(days=1)).to_datetime64(), side='left')
+    return df.iloc[lo:hi]
+
+
+def summary_table(df, columns):
+    """Tableau de synthèse (nombre, moyenne, min, max, écart-type) des colonnes."""
+    values = df[list(columns)].apply(pd.to_numeric, errors='coerce').astype(float)
+    summary = values.agg(['count', 'mean', 'min', 'max', 'std']).T
+    summary.columns = ['Mesures', 'Moyenne', 'Min', 'Max', 'Écart-type']
+    return summary.round(1)
+
+
+def render_report(period, sections):
+    """
+    Produit le HTML d'un rapport.
+
+    `sections` associe chaque mesure à (ReportMetric, DataFrame de la période).
+    Exécutée dans les processus de travail.
+    """
+    parts = [
+        f"<h1>Rapport de santé — {html.escape(period.label)}</h1>",
+        f"<p>Période du {period.start:%d/%m/%Y} au {period.end:%d/%m/%Y}</p>",
+    ]
+    include_js = 'cdn'
+    for spec, df in sections.values():
+        parts.append(f"<h2>{html.escape(spec.chart.title)}</h2>")
+        fig, messages = metrics.figure(spec.metric, spec.chart, df)
+        for _, text in messages:
+            parts.append(f"<p><em>{html.escape(text)}</em></p>")
+        if fig is not None:
+            parts.append(fig.to_html(full_html=False, include_plotlyjs=include_js))
+            # plotly.js n'est inclus qu'une fois par page
+            include_js = False
+        if not df.empty:
+            parts.append(summary_table(df, spec.chart.columns).to_html(classes='synthese', border=0))
+    body = "\n".join(parts)
+    return (
+        "<!DOCTYPE html>\n<html lang=\"fr\"><head><meta charset=\"utf-8\">"
+        f"<title>Rapport {html.escape(period.label)}</title>"
+        "<style>body{font-family:sans-serif;margin:2em} table.synthese td,table.synthese th{padding:4px 12px}</style>"
+        f"</head><body>\n{body}\n</body></html>\n"
+    )
+
+
+def _write_report(args):
+    period, sections, path = args
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(render_report(period, sections))
+    return path
+
+
+def build_reports(periods, metric_keys=None, output_dir='rapports', workers=None):
+    """
+    Génère un rapport HTML par période et un index.
+
+    `metric_keys` restreint les rapports à ces clés de `REPORT_METRICS` (toutes par défaut).
+
+    Retourne la liste des fichiers produits.
+    """
+    metric_keys = metric_keys or list(REPORT_METRICS)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Une seule lecture par table, quel que soit le nombre de rapports
+    tables = {}
+    for name in metric_keys:
+        table = REPORT_METRICS[name].table
+        if table not in tables:
+            try:
+                tables[table] = health_data.load_table(table)
+            except Exception:
+                tables[table] = pd.DataFrame(columns=['DateHeure'])
+
+    jobs = []
+    for period in periods:
+        sections = {
+            name: (REPORT_METRICS[name], slice_period(tables[REPORT_METRICS[name].table], period))
+            for name in metric_keys
+        }
+        jobs.append((period, sections, os.path.join(output_dir, f"rapport_{period.label}.html")))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        paths = list(executor.map(_write_report, jobs))
+
+    links = "\n".join(
+        f'<li><a href="{html.escape(os.path.basename(path))}">{html.escape(period.label)}</a></li>'
+        for period, path in zip(periods, paths)
+    )
+    index_path = os.path.join(output_dir, 'index.html')
+    with open(index_path, 'w', encoding='utf-8') as f:
+        f.write(f"<!DOCTYPE html>\n<html lang=\"fr\"><head><meta charset=\"utf-8\"><title>Rapports de santé</title>"
+                f"</head><body><h1>Rapports de santé</h1><ul>\n{links}\n</ul></body></html>\n")
+    return paths + [index_path]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Génère des rapports de santé mensuels en HTML.")
+    parser.add_argument('--year', type=int, default=date.today().year)
+    parser.add_argument('--metrics', nargs='+', choices=list(REPORT_METRICS), default=list(REPORT_METRICS))
+    parser.add_argument('--output', default='rapports')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    files = build_reports(monthly_periods(args.year), args.metrics, args.output, args.workers)
+    print(f"{len(files)} fichiers générés dans '{args.output}' en {time.perf_counter() - started:.1f} s.")
@@ -10,6 +10,10 @@ import pandas as pd
 import numpy as np
 import time
 
+import archive
+
+# Archivage des mesures anciennes et maintenance de la base (un seul fil par processus)
+archive.start_scheduler()
 
 # Define the pages
 main_page = st.Page("main.py", title="Accueil MyHealth")
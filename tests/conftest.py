@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures communes : chaque test tourne sur une base en mémoire restaurée
+depuis un instantané synthétique (module `fixtures`), sans toucher à la
+base sur disque.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Jamais la base réelle, y compris dans les processus lancés par les tests
+os.environ['MYHEALTH_DB_PATH'] = ':memory:'
+
+import fixtures  # noqa: E402
+import health_data  # noqa: E402
+import load_test  # noqa: E402
+
+# Durée des mesures synthétiques de l'instantané commun (jours)
+SNAPSHOT_DAYS = 60
+
+
+@pytest.fixture(scope='session')
+def snapshot(tmp_path_factory):
+    """Instantané d'une base synthétique, créé une fois pour toute la session."""
+    previous = fixtures.use_memory_database()
+    try:
+        conn = health_data.get_db_connection()
+        try:
+            load_test.seed_database(conn, days=SNAPSHOT_DAYS)
+        finally:
+            conn.close()
+        return fixtures.save_snapshot(tmp_path_factory.mktemp('instantanes') / 'synthetique.zip')
+    finally:
+        health_data.configure(*previous)
+
+
+@pytest.fixture
+def empty_db():
+    """Base vide en mémoire ; la base d'origine est rétablie après le test."""
+    previous = fixtures.use_memory_database()
+    yield
+    health_data.configure(*previous)
+
+
+@pytest.fixture
+def db(snapshot):
+    """Base en mémoire remplie avec l'instantané synthétique."""
+    previous = fixtures.use_memory_database(snapshot)
+    yield
+    health_data.configure(*previous)
+
+
+@pytest.fixture
+def conn(db):
+    connection = health_data.get_db_connection()
+    yield connection
+    connection.close()
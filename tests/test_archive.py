@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+import archive
+import batches
+import health_data
+import load_test
+import metrics
+import notes_search
+
+
+def test_archived_rows_are_read_transparently(conn):
+    notes_search.ensure_index(conn)
+    before = health_data.read_table('PressionBrut', conn)
+    compact = health_data.load_table('PressionBrut')
+    notes = notes_search.search_notes('stress', limit=10_000, conn=conn)
+    hot = len(before)
+
+    moved = archive.archive_old_readings(max_age_days=30)
+
+    assert 0 < moved['PressionBrut'] < hot
+    assert metrics.archived_tables() == ('PressionBrut',)
+    assert archive.archive_stats() == [{'Table': 'PressionBrut', 'Lignes chaudes': hot - moved['PressionBrut'],
+                                        'Lignes archivées': moved['PressionBrut']}]
+    after = health_data.read_table('PressionBrut', conn)
+    pd.testing.assert_frame_equal(after, before)
+    pd.testing.assert_frame_equal(health_data.load_table('PressionBrut'), compact)
+    assert notes_search.search_notes('stress', limit=10_000, conn=conn).equals(notes)
+
+    # Une mesure archivée réimportée est lue une seule fois, depuis la partie chaude
+    oldest = before.iloc[0]
+    conn.execute("INSERT INTO PressionBrut (DateHeure, Systolique, Diastolique) VALUES (?, 99, 66)",
+                 (oldest['DateHeure'],))
+    conn.commit()
+    reread = health_data.read_table('PressionBrut', conn)
+    assert len(reread) == hot
+    assert reread.iloc[0][['Systolique', 'Diastolique']].tolist() == [99, 66]
+
+
+def test_reimported_archived_readings_are_skipped(conn):
+    metric = metrics.METRICS['pression']
+    archive.archive_old_readings(max_age_days=30)
+    hot = conn.execute("SELECT COUNT(*) FROM PressionBrut").fetchone()[0]
+    health_data.attach_archive(conn)
+    archived = pd.read_sql_query("SELECT DateHeure, Systolique, Diastolique FROM archive.PressionBrut LIMIT 5", conn)
+    uploaded = pd.concat([archived, pd.DataFrame({'DateHeure': ['2000-01-01 08:00:00'], 'Systolique': [120],
+                                                  'Diastolique': [80]})])
+    frame, _ = metrics.prepare_frame(metric, uploaded, {name: name for name in uploaded.columns})
+
+    assert metrics.ingest(metric, frame, conn, source='test') == 1
+    assert conn.execute("SELECT COUNT(*) FROM PressionBrut").fetchone()[0] == hot + 1
+    batch = int(batches.list_batches(conn)['Lot'].iloc[0])
+    assert batches.rollback(batch) == {'PressionBrut': 1}
+    assert conn.execute("SELECT COUNT(*) FROM PressionBrut").fetchone()[0] == hot
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    previous = (health_data.DB_PATH, health_data.ARCHIVE_PATH)
+    health_data.configure(str(tmp_path / 'sante.db'))
+    conn = health_data.get_db_connection()
+    load_test.seed_database(conn, days=30)
+    conn.close()
+    yield
+    health_data.configure(*previous)
+
+
+def _auto_vacuum(schema):
+    conn = health_data.get_db_connection()
+    try:
+        health_data.attach_archive(conn)
+        return conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_first_archival_and_full_vacuum_wait_for_the_admin(file_db):
+    done = archive.run_maintenance()
+
+    assert 'archivage' not in done and 'vacuum' in done
+    # Archive créée par le fil de maintenance : vacuum incrémental dès sa création
+    assert _auto_vacuum('archive') == 2
+    assert _auto_vacuum('main') == 0
+
+    done = archive.run_maintenance(force=True)
+
+    assert {'archivage', 'vacuum'} <= set(done)
+    assert _auto_vacuum('main') == 2
+
+    # Après le premier archivage, le fil de maintenance archive chaque jour
+    conn = health_data.get_db_connection()
+    health_data.attach_archive(conn)
+    conn.execute("UPDATE archive.journal_maintenance SET DernierPassage = DernierPassage - ?",
+                 (archive.MAINTENANCE_INTERVAL,))
+    conn.commit()
+    conn.close()
+    assert 'archivage' in archive.run_maintenance()
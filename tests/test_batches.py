@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+import batches
+import health_data
+import health_import
+import metrics
+import notes_search
+
+
+def _rows(conn, table_name, columns):
+    return conn.execute(f"SELECT {', '.join(columns)} FROM {table_name} ORDER BY DateHeure").fetchall()
+
+
+def test_rollback_restores_replaced_glucose(conn):
+    metric = metrics.METRICS['glycemie']
+    notes_search.ensure_index(conn)
+    columns = ['DateHeure', 'Valeur', 'Note1', 'Note2', health_data.BATCH_COLUMN]
+    before = _rows(conn, 'glycemie', columns)
+    replaced = before[100][0]
+    uploaded = pd.DataFrame({'Date': [replaced, '2000-01-01 08:00:00'], 'Glycémie': ['12,5', '6,1'],
+                             'Note': ['réimportée', 'nouvelle']})
+    frame, rejected = metrics.prepare_frame(metric, uploaded, {'DateHeure': 'Date', 'Valeur': 'Glycémie',
+                                                               'Note1': 'Note'})
+    assert rejected == 0
+    assert metrics.ingest(metric, frame, conn, source='test') == 2
+    assert conn.execute("SELECT Valeur FROM glycemie WHERE DateHeure = ?", (replaced,)).fetchone() == (12.5,)
+
+    batch = int(batches.list_batches(conn)['Lot'].iloc[0])
+    assert batches.rollback(batch) == {'glycemie': 2}
+
+    assert _rows(conn, 'glycemie', columns) == before
+    assert notes_search.search_notes('réimportée', conn=conn).empty
+    assert not conn.execute(f"SELECT COUNT(*) FROM {health_data.BATCH_PREIMAGES}").fetchone()[0]
+
+
+APPLE_EXPORT = '''<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="fr_FR">
+ <Correlation type="HKCorrelationTypeIdentifierBloodPressure" startDate="2024-03-01 08:00:00 +0100">
+  <Record type="HKQuantityTypeIdentifierBloodPressureSystolic" value="128" startDate="2024-03-01 08:00:00 +0100"/>
+  <Record type="HKQuantityTypeIdentifierBloodPressureDiastolic" value="84" startDate="2024-03-01 08:00:00 +0100"/>
+ </Correlation>
+ <Correlation type="HKCorrelationTypeIdentifierBloodPressure" startDate="2024-03-01 08:30:00 +0100">
+  <Record type="HKQuantityTypeIdentifierBloodPressureSystolic" value="131" startDate="2024-03-01 08:30:00 +0100"/>
+  <Record type="HKQuantityTypeIdentifierBloodPressureDiastolic" value="86" startDate="2024-03-01 08:30:00 +0100"/>
+ </Correlation>
+ <Record type="HKQuantityTypeIdentifierHeartRate" unit="count/min" value="72" startDate="2024-03-01 08:15:00 +0100"/>
+</HealthData>
+'''
+
+
+def test_rollback_restores_matched_pulses(empty_db, tmp_path):
+    conn = health_data.get_db_connection()
+    try:
+        metrics.create_tables(conn)
+        conn.execute("INSERT INTO PressionBrut (DateHeure, Systolique, Diastolique) "
+                     "VALUES ('2024-03-01 08:15:30', 140, 90)")
+        conn.commit()
+        export = tmp_path / 'export.xml'
+        export.write_text(APPLE_EXPORT, encoding='utf-8')
+
+        report = health_import.import_export(str(export))
+        assert report.pulses == 1
+        assert _rows(conn, 'PressionBrut', ['DateHeure', 'Pouls']) == [
+            ('2024-03-01 08:00:00', None), ('2024-03-01 08:15:30', 72), ('2024-03-01 08:30:00', None)]
+
+        assert batches.rollback(report.batch) == {'PressionBrut': 2}
+        assert _rows(conn, 'PressionBrut', ['DateHeure', 'Systolique', 'Pouls', health_data.BATCH_COLUMN]) == [
+            ('2024-03-01 08:15:30', 140, None, None)]
+    finally:
+        conn.close()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+import pytest
+
+import fhir_bulk
+import health_data
+import metrics
+
+
+def _weight(day, kg):
+    return {
+        'resourceType': 'Observation',
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '29463-7'}]},
+        'effectiveDateTime': f"2024-01-{day:02d}T07:00:00",
+        'valueQuantity': {'value': kg, 'unit': 'kg'},
+    }
+
+
+def test_worker_processes_write_to_configured_database(tmp_path):
+    previous = (health_data.DB_PATH, health_data.ARCHIVE_PATH)
+    health_data.configure(str(tmp_path / 'sante.db'))
+    try:
+        conn = health_data.get_db_connection()
+        metrics.create_tables(conn)
+        conn.close()
+        paths = []
+        for index in range(2):
+            path = tmp_path / f"Observation_{index}.ndjson"
+            path.write_text("\n".join(json.dumps(_weight(index * 10 + day, 80 + day)) for day in range(1, 6)))
+            paths.append(str(path))
+
+        report = fhir_bulk.import_files(paths, workers=2)
+
+        assert report.inserted == {'poids': 10}
+        conn = health_data.get_db_connection()
+        assert conn.execute("SELECT COUNT(*) FROM poids").fetchone()[0] == 10
+        conn.close()
+    finally:
+        health_data.configure(*previous)
+
+
+def test_observations_outside_registry_bounds_are_rejected(empty_db, tmp_path):
+    conn = health_data.get_db_connection()
+    metrics.create_tables(conn)
+    conn.close()
+    path = tmp_path / 'Observation.ndjson'
+    observations = [_weight(day, kg) for day, kg in ((1, 80), (2, 8000), (3, 5))]
+    # Unité non reconnue : rejetée et comptée
+    observations.append(dict(_weight(4, 80), valueQuantity={'value': 80, 'unit': 'st'}))
+    path.write_text("\n".join(json.dumps(observation) for observation in observations))
+
+    report = fhir_bulk.import_files([str(path)], workers=1)
+
+    assert report.inserted == {'poids': 1}
+    assert report.rejected == 3
+    conn = health_data.get_db_connection()
+    assert conn.execute("SELECT Poids_kg FROM poids").fetchall() == [(80.0,)]
+    conn.close()
+
+
+@pytest.fixture
+def paris(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Paris')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_effective_times_are_converted_to_and_from_local_time(paris):
+    observation = dict(_weight(1, 80), effectiveDateTime='2024-07-01T06:15:00Z')
+    assert fhir_bulk.observation_to_row(observation)[1]['DateHeure'] == '2024-07-01 08:15:00'
+    observation['effectiveDateTime'] = '2024-01-01T08:15:00-05:00'
+    assert fhir_bulk.observation_to_row(observation)[1]['DateHeure'] == '2024-01-01 14:15:00'
+
+    exported = fhir_bulk.row_to_observations('poids', ('2024-07-01 08:15:00', 80.0, 176.37))
+    assert exported[0]['effectiveDateTime'] == '2024-07-01T08:15:00+02:00'
+    assert fhir_bulk.observation_to_row(exported[0])[1]['DateHeure'] == '2024-07-01 08:15:00'
+
+
+def _pulse(minute, bpm):
+    return {
+        'resourceType': 'Observation',
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '8867-4'}]},
+        'effectiveDateTime': f"2024-01-01T08:{minute:02d}:20",
+        'valueQuantity': {'value': bpm, 'unit': '/min'},
+    }
+
+
+def test_concurrent_imports_keep_their_own_pulse_tables(empty_db, tmp_path):
+    conn = health_data.get_db_connection()
+    metrics.create_tables(conn)
+    # Table d'attente d'un autre import en cours
+    other = f"{fhir_bulk.PULSE_TABLE}_999"
+    conn.execute(f"CREATE TABLE {other} (Minute TEXT PRIMARY KEY, Pouls INTEGER)")
+    conn.execute(f"INSERT INTO {other} VALUES ('2024-01-01 09:00', 70)")
+    conn.commit()
+    conn.close()
+    path = tmp_path / 'Observation.ndjson'
+    pressure = {
+        'resourceType': 'Observation',
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '85354-9'}]},
+        'effectiveDateTime': "2024-01-01T08:00:00",
+        'component': [
+            {'code': {'coding': [{'code': '8480-6'}]}, 'valueQuantity': {'value': 120, 'unit': 'mm[Hg]'}},
+            {'code': {'coding': [{'code': '8462-4'}]}, 'valueQuantity': {'value': 80, 'unit': 'mm[Hg]'}},
+        ],
+    }
+    path.write_text(json.dumps(pressure) + "\n" + json.dumps(_pulse(0, 66)))
+
+    report = fhir_bulk.import_files([str(path)], workers=1)
+
+    assert report.pulses == 1
+    conn = health_data.get_db_connection()
+    assert conn.execute(f"SELECT * FROM {other}").fetchall() == [('2024-01-01 09:00', 70)]
+    assert other not in health_data.get_table_list(conn)
+    assert not [name for name in health_data.get_table_list(conn, internal=True)
+                if name.startswith(fhir_bulk.PULSE_TABLE) and name != other]
+    conn.close()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import glucose_analytics
+
+# Capteur : une mesure toutes les 5 minutes, oscillation de 6 mmol/L crête à crête sur 6 heures
+MINUTES = np.arange(0, 24 * 60, 5)
+CLEAN = 7 + 3 * np.sin(2 * np.pi * MINUTES / 360)
+
+
+def test_mage_of_clean_curve():
+    assert glucose_analytics.mage(CLEAN) == pytest.approx(6.0)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_mage_ignores_measurement_noise(seed):
+    rng = np.random.default_rng(seed)
+    noisy = CLEAN + rng.uniform(0.2, 0.4, CLEAN.size) * rng.choice([-1, 1], CLEAN.size)
+
+    assert abs(glucose_analytics.mage(noisy) - glucose_analytics.mage(CLEAN)) < 0.8
+
+
+# Oscillation sur la journée : un pic à 9,5 et un creux à 4,5, soit un MAGE de 5
+DAY = 7 + 2.5 * np.sin(2 * np.pi * MINUTES / (24 * 60))
+
+
+def test_mage_ignores_partial_swing_at_day_start():
+    values = DAY.copy()
+    # Creux de bruit juste après le premier point : excursion coupée par le début de la journée
+    values[2] -= 0.1
+
+    assert glucose_analytics.mage(values) == pytest.approx(5.0)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_mage_of_noisy_sensor_day(seed):
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64('2024-03-01T00:00') + MINUTES.astype('timedelta64[m]')
+    noisy = DAY + rng.normal(0, 0.2, DAY.size)
+
+    daily = glucose_analytics.daily_stats(dates, noisy)
+
+    assert daily['MAGE'].iloc[0] == pytest.approx(5.0, abs=0.4)
+
+
+def test_mage_without_excursion():
+    assert np.isnan(glucose_analytics.mage(np.full(50, 6.0)))
+
+
+def test_days_of_an_older_calculation_are_recomputed(conn):
+    daily = glucose_analytics.refresh_daily_stats()
+    day = daily['Jour'].iloc[0]
+    conn.execute(f"UPDATE {glucose_analytics.DAILY_TABLE} SET MAGE = -1, Calcul = 1 WHERE Jour = ?", (day,))
+    conn.commit()
+
+    refreshed = glucose_analytics.refresh_daily_stats()
+
+    assert refreshed.loc[refreshed['Jour'] == day, 'MAGE'].iloc[0] == daily['MAGE'].iloc[0]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import http.client
+import sqlite3
+import threading
+
+import pytest
+
+import health_api
+import health_data
+import load_test
+
+
+@pytest.fixture
+def api(tmp_path):
+    """Serveur de l'API sur une base fichier (les écritures externes passent par le fichier)."""
+    previous = (health_data.DB_PATH, health_data.ARCHIVE_PATH)
+    health_data.configure(str(tmp_path / 'sante.db'))
+    conn = health_data.get_db_connection()
+    load_test.seed_database(conn, days=10)
+    conn.close()
+    server = health_api.create_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    health_data.configure(*previous)
+
+
+def _get(port, path, etag=None):
+    client = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        client.request('GET', path, headers={'If-None-Match': etag} if etag else {})
+        response = client.getresponse()
+        response.read()
+        return response.status, response.getheader('ETag')
+    finally:
+        client.close()
+
+
+def test_etag_changes_after_own_and_external_writes(api):
+    path = '/metrics/systolique?resolution=day'
+    status, etag = _get(api, path)
+    assert status == 200
+    assert _get(api, path, etag) == (304, etag)
+    # Une autre série garde sa propre validation
+    _, glucose_etag = _get(api, '/metrics/glycemie')
+
+    conn = health_data.get_db_connection()
+    conn.execute("INSERT INTO PressionBrut (DateHeure, Systolique, Diastolique) "
+                 "VALUES ('2000-01-01 08:00:00', 120, 80)")
+    conn.commit()
+    health_data.notify_write('PressionBrut', conn=conn)
+    conn.close()
+    status, own = _get(api, path, etag)
+    assert status == 200 and own != etag
+    assert _get(api, '/metrics/glycemie', glucose_etag)[0] == 304
+
+    # Écriture d'un autre processus, sans notification
+    external = sqlite3.connect(health_data.DB_PATH)
+    external.execute("UPDATE PressionBrut SET Systolique = 121 WHERE DateHeure = '2000-01-01 08:00:00'")
+    external.commit()
+    external.close()
+    status, after = _get(api, path, own)
+    assert status == 200 and after != own
+    assert _get(api, path, after) == (304, after)
+
+
+def test_if_none_match_compares_each_tag(api):
+    path = '/metrics/systolique'
+    _, etag = _get(api, path)
+    assert _get(api, path, f'"autre", W/{etag}')[0] == 304
+    assert _get(api, path, '*')[0] == 304
+    # Les étiquettes sont comparées en entier, pas comme sous-chaînes
+    assert _get(api, path, f'"x{etag[1:]}')[0] == 200
+    assert _get(api, path, f'{etag[:-1]}x"')[0] == 200
+    assert _get(api, path, f'W/"{etag}"')[0] == 200
+
+
+def test_error_while_streaming_truncates_the_response(api, monkeypatch, caplog):
+    def failing_row(row, resolution):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(health_api, 'format_row', failing_row)
+    client = http.client.HTTPConnection('127.0.0.1', api, timeout=10)
+    try:
+        client.request('GET', '/metrics/systolique')
+        response = client.getresponse()
+        assert response.status == 200
+        with pytest.raises(http.client.IncompleteRead) as truncated:
+            response.read()
+        # Pas de seconde réponse d'erreur glissée dans le corps déjà commencé
+        assert b'erreur' not in truncated.value.partial
+    finally:
+        client.close()
+    assert 'interrompue' in caplog.text
+    # Le serveur répond toujours aux requêtes suivantes
+    monkeypatch.undo()
+    assert _get(api, '/metrics')[0] == 200
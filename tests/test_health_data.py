@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import health_data
+import notes_search
+
+
+def _update_weight_in_place(conn):
+    """Écriture externe sans `notify_write` qui ne change ni le nombre de lignes ni les dates."""
+    conn.execute("UPDATE poids SET Poids_kg = Poids_kg + 1 WHERE DateHeure = (SELECT MIN(DateHeure) FROM poids)")
+    conn.commit()
+
+
+def test_in_place_external_update_invalidates_its_table(conn):
+    weight = health_data.load_table('poids')
+    version = health_data.table_version('poids')
+
+    _update_weight_in_place(conn)
+    # Une autre table modifiée dans le même intervalle de surveillance
+    conn.execute("INSERT INTO glycemie (DateHeure, Valeur) VALUES ('2099-01-01 08:00:00', 5.5)")
+    conn.commit()
+
+    assert health_data.table_version('poids') != version
+    assert health_data.load_table('poids')['Poids_kg'].iloc[0] == weight['Poids_kg'].iloc[0] + 1
+
+
+def test_own_write_does_not_hide_concurrent_external_write(db):
+    health_data.load_table('poids')
+    version = health_data.table_version('poids')
+    writer = health_data.get_db_connection()
+    other = health_data.get_db_connection()
+    try:
+        _update_weight_in_place(other)
+        writer.execute("INSERT INTO glycemie (DateHeure, Valeur) VALUES ('2099-01-01 08:00:00', 5.5)")
+        writer.commit()
+        health_data.notify_write('glycemie', conn=writer)
+    finally:
+        writer.close()
+        other.close()
+
+    assert health_data.table_version('poids') != version
+
+
+def test_own_write_only_invalidates_its_table(db):
+    health_data.load_table('poids')
+    version = health_data.table_version('poids')
+    conn = health_data.get_db_connection()
+    try:
+        conn.execute("INSERT INTO glycemie (DateHeure, Valeur) VALUES ('2099-01-01 08:00:00', 5.5)")
+        conn.commit()
+        health_data.notify_write('glycemie', conn=conn)
+    finally:
+        conn.close()
+
+    assert health_data.table_version('poids') == version
+
+
+def test_table_list_hides_internal_tables(conn):
+    notes_search.ensure_index(conn)
+    health_data.create_batch_log(conn)
+    conn.commit()
+
+    tables = health_data.get_table_list(conn)
+
+    assert {'PressionBrut', 'PressionSynthese', 'glycemie', 'poids'} <= set(tables)
+    assert not set(tables) & health_data.INTERNAL_TABLES
+    assert not [name for name in tables if name.startswith(notes_search.INDEX_TABLE)]
+    assert {health_data.BATCH_LOG, notes_search.SOURCE_TABLE} <= set(health_data.get_table_list(conn, internal=True))
+
+
+def test_only_declared_integer_columns_are_downcast(conn):
+    conn.execute("CREATE TABLE essai (DateHeure TEXT, Reel REAL, Entier INTEGER)")
+    conn.executemany("INSERT INTO essai VALUES (?, ?, ?)",
+                     [('2024-01-01 08:00:00', 40000.0, 12), ('2024-01-02 08:00:00', 5.0, None)])
+    conn.commit()
+
+    compact = health_data.load_compact_table('essai', conn)
+
+    # Des valeurs réelles entières restent réelles (pas de débordement en int16)
+    assert compact['Reel'].dtype == 'float32'
+    assert compact['Reel'].tolist() == [40000.0, 5.0]
+    assert compact['Entier'].dtype == 'Int16'
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import health_data
+import health_import
+import metrics
+
+APPLE_EXPORT = '''<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="fr_FR">
+ <Record type="HKQuantityTypeIdentifierBodyMass" unit="kg" value="81.5" startDate="2024-03-01 07:00:00 +0100"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" unit="kg" value="8000" startDate="2024-03-02 07:00:00 +0100"/>
+ <Correlation type="HKCorrelationTypeIdentifierBloodPressure" startDate="2024-03-01 08:00:00 +0100">
+  <Record type="HKQuantityTypeIdentifierBloodPressureSystolic" value="128.4" startDate="2024-03-01 08:00:00 +0100"/>
+  <Record type="HKQuantityTypeIdentifierBloodPressureDiastolic" value="84" startDate="2024-03-01 08:00:00 +0100"/>
+ </Correlation>
+ <Record type="HKQuantityTypeIdentifierHeartRate" unit="count/min" value="900" startDate="2024-03-01 08:00:00 +0100"/>
+</HealthData>
+'''
+
+
+def _fit_point(kind, day, *values):
+    return {'dataTypeName': kind, 'startTimeNanos': str(1709276400 + day * 86400) + '0' * 9,
+            'fitValue': [{'value': {'fpVal': value}} for value in values]}
+
+
+def test_apple_records_outside_registry_bounds_are_rejected(empty_db, tmp_path):
+    export = tmp_path / 'export.xml'
+    export.write_text(APPLE_EXPORT, encoding='utf-8')
+
+    report = health_import.import_export(str(export))
+
+    assert report.inserted == {'poids': 1, 'PressionBrut': 1}
+    assert report.rejected == 2
+    assert report.pulses == 0
+    conn = health_data.get_db_connection()
+    try:
+        assert conn.execute("SELECT Poids_kg FROM poids").fetchall() == [(81.5,)]
+        assert conn.execute("SELECT Systolique, Diastolique FROM PressionBrut").fetchall() == [(128, 84)]
+    finally:
+        conn.close()
+
+
+def test_google_fit_points_outside_registry_bounds_are_rejected(empty_db):
+    report = health_import.ImportReport(source='Fit')
+    document = {'Data Points': [
+        _fit_point('com.google.weight', 0, 80.2),
+        _fit_point('com.google.weight', 1, 8000.0),
+        _fit_point('com.google.blood_glucose', 0, 60.0),
+        _fit_point('com.google.blood_pressure', 0, 400.0, 250.0),
+    ]}
+    conn = health_data.get_db_connection()
+    try:
+        metrics.create_tables(conn)
+        writer = health_import.BatchWriter(conn, report)
+        for table, record in health_import.iter_google_fit([document], report):
+            writer.add(table, record)
+        writer.flush()
+
+        assert report.rejected == 3
+        assert report.inserted == {'poids': 1}
+        assert conn.execute("SELECT Poids_kg, Poids_lbs FROM poids").fetchall() == [(80.2, 176.81)]
+    finally:
+        conn.close()
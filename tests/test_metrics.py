@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+import health_data
+import metrics
+
+
+def _pandas_synthesis(conn, metric):
+    """Synthèse d'origine : par tranche de 30 minutes, la mesure de systolique minimale (idxmin)."""
+    df = pd.read_sql_query(f"SELECT * FROM {health_data.table_source(conn, metric.table)}", conn)
+    df['DateHeure'] = pd.to_datetime(df['DateHeure'])
+    df = df.sort_values(by='DateHeure').reset_index(drop=True)
+    groups = df['DateHeure'].dt.floor(f"{metric.synthesis.minutes}min")
+    synthesis = df.loc[df.groupby(groups)[metric.synthesis.column].idxmin()]
+    return synthesis[list(metric.columns)].reset_index(drop=True)
+
+
+def test_sql_synthesis_matches_pandas_synthesis(conn):
+    metric = metrics.METRICS['pression']
+    # Mesures rapprochées : plusieurs par tranche, dont des égalités
+    rows = conn.execute("SELECT DateHeure, Systolique, Diastolique FROM PressionBrut").fetchall()
+    shifted = [((pd.Timestamp(when) + pd.Timedelta(minutes=offset)).strftime('%Y-%m-%d %H:%M:%S'),
+                systolic + delta, diastolic)
+               for when, systolic, diastolic in rows[::3] for offset, delta in ((7, 0), (13, -4), (21, 5))]
+    conn.executemany("INSERT OR IGNORE INTO PressionBrut (DateHeure, Systolique, Diastolique) VALUES (?, ?, ?)",
+                     shifted)
+    # Sans mesure aberrante, la règle SQL se réduit à celle de pandas
+    conn.execute("UPDATE PressionBrut SET Aberrant = 0")
+    conn.commit()
+    health_data.notify_write('PressionBrut', conn=conn)
+
+    count = metrics.synthesize(metric)
+
+    expected = _pandas_synthesis(conn, metric)
+    actual = pd.read_sql_query(f"SELECT {', '.join(metric.columns)} FROM {metric.synthesis.table} "
+                               "ORDER BY DateHeure", conn)
+    actual['DateHeure'] = pd.to_datetime(actual['DateHeure'])
+    assert count == len(expected)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
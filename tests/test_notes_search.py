@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import health_data
+import metrics
+import notes_search
+
+TEMPERATURE = metrics.Metric(
+    key='temperature',
+    table='temperature',
+    title="Température",
+    measures=(metrics.Measure('Temperature', 'Température', '°C', 'REAL', 34, 43),),
+    charts=(metrics.Chart('temperature', "Température", ('Temperature',), "°C"),),
+    notes=True,
+)
+
+
+@pytest.fixture
+def temperature():
+    metrics.register(TEMPERATURE)
+    yield TEMPERATURE
+    metrics.METRICS.pop(TEMPERATURE.key)
+
+
+def test_every_registered_note_table_is_indexed(empty_db, temperature):
+    conn = health_data.get_db_connection()
+    try:
+        metrics.create_tables(conn)
+        for table_name in metrics.note_tables():
+            value_column = next(metric for metric in metrics.METRICS.values()
+                                if table_name in metric.tables).value_columns[0]
+            conn.execute(f"INSERT INTO {table_name} (DateHeure, {value_column}, Note1) "
+                         "VALUES ('2024-03-01 08:00:00', 40, ?)", (f"fièvre {table_name}",))
+        conn.commit()
+
+        assert set(notes_search.ensure_index(conn)) == set(metrics.note_tables())
+        assert len(metrics.note_tables()) == 4
+        found = notes_search.search_notes('fievre', conn=conn)
+        assert sorted(found['Table']) == sorted(metrics.note_tables())
+
+        conn.execute("DELETE FROM temperature")
+        conn.commit()
+        assert notes_search.search_notes('fievre', tables=['temperature'], conn=conn).empty
+        assert len(notes_search.search_notes('fievre', conn=conn)) == 3
+    finally:
+        conn.close()
+
+
+def test_index_without_table_codes_is_rebuilt(conn):
+    notes_search.ensure_index(conn)
+    expected = notes_search.search_notes('a', limit=10_000, conn=conn)
+    conn.execute(f"DROP TABLE {notes_search.SOURCE_TABLE}")
+    conn.commit()
+
+    assert set(notes_search.ensure_index(conn)) == set(metrics.note_tables())
+    assert notes_search.search_notes('a', limit=10_000, conn=conn).equals(expected)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import metrics
+import outliers
+
+
+def _flags(conn, metric):
+    return conn.execute(f"SELECT DateHeure, {outliers.FLAG_COLUMN} FROM {metric.table} ORDER BY DateHeure").fetchall()
+
+
+def _full_recompute(conn, metric):
+    """Indicateurs recalculés sur toute la table en une passe."""
+    rows = conn.execute(f"SELECT DateHeure, {', '.join(metric.value_columns)} FROM {metric.table} "
+                        "ORDER BY DateHeure").fetchall()
+    bits = outliers.flag_bits([row[1:] for row in rows], metric.outlier_window,
+                              [measure.outlier_floor for measure in metric.measures])
+    return [(row[0], int(bit)) for row, bit in zip(rows, bits)]
+
+
+@pytest.mark.parametrize('key', ['pression', 'glycemie'])
+def test_incremental_flags_match_full_recompute(conn, key):
+    metric = metrics.METRICS[key]
+    metrics.refresh_outliers(metric, conn)
+    assert _flags(conn, metric) == _full_recompute(conn, metric)
+
+    dates = [row[0] for row in conn.execute(f"SELECT DateHeure FROM {metric.table} ORDER BY DateHeure")]
+    rng = np.random.default_rng(1)
+    with conn:
+        # Pics isolés insérés entre deux mesures, puis suppression d'une plage
+        for index in rng.choice(np.arange(20, len(dates) - 20), 5, replace=False):
+            when = dates[index][:-2] + ('30' if dates[index][-2:] != '30' else '45')
+            values = [measure.maximum - 1 for measure in metric.measures]
+            conn.execute(f"INSERT OR IGNORE INTO {metric.table} (DateHeure, {', '.join(metric.value_columns)}) "
+                         f"VALUES (?, {', '.join('?' for _ in values)})", (when, *values))
+        start, end = dates[len(dates) // 2], dates[len(dates) // 2 + 8]
+        conn.execute(f"DELETE FROM {metric.table} WHERE DateHeure BETWEEN ? AND ?", (start, end))
+        outliers.invalidate(conn, metric.table, start, end, metric.outlier_window)
+
+    period, count = metrics.refresh_outliers(metric, conn)
+
+    assert period is not None and count > 0
+    flags = _flags(conn, metric)
+    assert flags == _full_recompute(conn, metric)
+    assert sum(1 for _, flag in flags if flag) >= 5
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+import health_data
+import time_profiles
+
+
+def _expected(conn, table_name, start):
+    """Profil recalculé avec pandas à partir des mesures (partie chaude et archive)."""
+    df = pd.read_sql_query(f"SELECT * FROM {health_data.table_source(conn, table_name)}", conn)
+    df['DateHeure'] = pd.to_datetime(df['DateHeure'])
+    df = df[df['DateHeure'] >= pd.Timestamp(start)]
+    columns = list(time_profiles.PROFILE_COLUMNS[table_name])
+    grouped = df.groupby([df['DateHeure'].dt.weekday.rename('Jour'), df['DateHeure'].dt.hour.rename('Heure')])
+    expected = grouped[columns].mean().round(1).reset_index()
+    for column in columns:
+        expected[f"Mesures_{column}"] = grouped[column].count().to_numpy()
+    return expected
+
+
+@pytest.mark.parametrize('table_name', sorted(time_profiles.PROFILE_COLUMNS))
+def test_profile_matches_pandas_after_analyze(conn, table_name):
+    start = pd.Timestamp.today().normalize() - pd.Timedelta(days=30)
+    time_profiles.ensure_indexes(conn, table_name)
+    # Avec des statistiques, l'ancienne jointure sur les 168 cases donnait des cases manquantes
+    conn.execute("ANALYZE")
+    conn.commit()
+
+    profile = time_profiles.hourly_profile(table_name, start)
+    expected = _expected(conn, table_name, start)
+
+    assert len(profile) == len(expected)
+    for column in time_profiles.PROFILE_COLUMNS[table_name]:
+        pd.testing.assert_series_equal(profile[column], expected[column], check_dtype=False, check_names=False)
+        pd.testing.assert_series_equal(profile[f"Mesures_{column}"], expected[f"Mesures_{column}"],
+                                       check_dtype=False, check_names=False)
+
+
+def test_profile_counts_archived_rows_once(conn):
+    conn.execute("INSERT INTO PressionBrut (DateHeure, Systolique, Diastolique) "
+                 "VALUES ('2020-01-06 08:10:00', 120, 80)")
+    health_data.attach_archive(conn, create=True)
+    conn.execute("CREATE TABLE archive.PressionBrut AS SELECT * FROM main.PressionBrut WHERE DateHeure < '2021'")
+    conn.execute("INSERT INTO archive.PressionBrut (DateHeure, Systolique, Diastolique) "
+                 "VALUES ('2020-01-06 08:40:00', 140, 90)")
+    conn.commit()
+    health_data.notify_write('PressionBrut', conn=conn)
+
+    profile = time_profiles.hourly_profile('PressionBrut', '2020-01-01', '2020-01-31')
+
+    assert profile[['Jour', 'Heure', 'Mesures_Systolique', 'Systolique']].values.tolist() == [[0, 8, 2, 130.0]]
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Profils jour de la semaine × heure de la journée (matin / soir) des mesures.
+
+Les moyennes par case (7 jours × 24 heures) sont calculées en SQL, sans
+charger les mesures dans pandas, par un simple GROUP BY sur le jour de la
+semaine et l'heure. Chaque table profilée reçoit un index sur expressions
+(jour de la semaine, heure, DateHeure, valeurs) qui couvre la requête : le
+regroupement se fait en le parcourant dans l'ordre, sans accéder aux lignes
+de la table. L'archive des mesures brutes a le même index et ses sommes sont
+ajoutées à celles de la partie chaude.
+
+Les profils sont mémorisés par période et par version de la table : un
+profil réaffiché sans nouvelle mesure ne relit pas la base.
+"""
+
+import collections
+import threading
+
+import pandas as pd
+
+import health_data
+import metrics
+
+# Colonnes profilées par table (mesures déclarées avec `profile` dans le registre)
+PROFILE_COLUMNS = metrics.profile_columns()
+
+# Jours dans l'ordre d'affichage (lundi en premier ; SQLite numérote à partir du dimanche)
+WEEKDAYS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+# Profils déjà calculés, partagés entre les sessions
+PROFILE_CACHE_SIZE = 32
+_profile_cache = collections.OrderedDict()
+_profile_lock = threading.Lock()
+
+
+def _weekday(column='DateHeure'):
+    return f"CAST(strftime('%w', {column}) AS INTEGER)"
+
+
+def _hour(column='DateHeure'):
+    return f"CAST(strftime('%H', {column}) AS INTEGER)"
+
+
+def _index_name(table_name):
+    return f"idx_{table_name.lower()}_profil"
+
+
+def ensure_indexes(conn, table_name):
+    """Crée l'index de profil de la table, et celui de son archive si elle existe."""
+    columns = ", ".join(PROFILE_COLUMNS[table_name])
+    schemas = ['main']
+    if health_data.attach_archive(conn) and health_data.table_columns(conn, table_name, 'archive'):
+        schemas.append('archive')
+    for schema in schemas:
+        # Les expressions doivent être identiques à celles des requêtes pour que l'index soit utilisé
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {schema}.{_index_name(table_name)} ON {table_name} "
+            f"({_weekday()}, {_hour()}, DateHeure, {columns})"
+        )
+    conn.commit()
+    return schemas
+
+
+def _aggregate(conn, schema, table_name, start, end):
+    """Nombre de mesures et somme de chaque colonne, par case (jour SQLite, heure)."""
+    columns = PROFILE_COLUMNS[table_name]
+    sums = ", ".join(f"COUNT({column}), TOTAL({column})" for column in columns)
+    # Une mesure réimportée après archivage n'est comptée que dans la partie chaude
+    duplicate = (f" AND DateHeure NOT IN (SELECT DateHeure FROM main.{table_name})"
+                 if schema == 'archive' else "")
+    sql = f'''
+        SELECT {_weekday()}, {_hour()}, {sums}
+        FROM {schema}.{table_name}
+        WHERE DateHeure >= :start AND DateHeure < :end{duplicate}
+        GROUP BY 1, 2
+    '''
+    return conn.execute(sql, {'start': start, 'end': end}).fetchall()
+
+
+def hourly_profile(table_name, start=None, end=None):
+    """
+    Profil d'une table sur la période [start, end] (dates incluses, toute l'histoire par défaut).
+
+    Retourne un DataFrame (Jour, Heure, puis Mesures_<colonne> et <colonne>
+    moyenne pour chaque colonne profilée), une ligne par case renseignée ;
+    Jour vaut 0 pour lundi.
+    """
+    start_text = pd.Timestamp(start).strftime('%Y-%m-%d') if start is not None else ''
+    end_text = (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime('%Y-%m-%d') if end is not None else '9999'
+    key = (table_name, start_text, end_text)
+    version = health_data.table_version(table_name)
+    with _profile_lock:
+        entry = _profile_cache.get(key)
+        if entry is not None and entry[0] == version:
+            _profile_cache.move_to_end(key)
+            return entry[1].copy()
+
+    columns = PROFILE_COLUMNS[table_name]
+    names = ['JourSQL', 'Heure'] + [name for column in columns for name in (f"Mesures_{column}", f"Somme_{column}")]
+    conn = health_data.get_db_connection()
+    try:
+        if not health_data.table_columns(conn, table_name):
+            rows = []
+        else:
+            rows = [row for schema in ensure_indexes(conn, table_name)
+                    for row in _aggregate(conn, schema, table_name, start_text, end_text)]
+    finally:
+        conn.close()
+
+    totals = pd.DataFrame(rows, columns=names).groupby(['JourSQL', 'Heure'], as_index=False).sum()
+    profile = pd.DataFrame({'Jour': (totals['JourSQL'] + 6) % 7, 'Heure': totals['Heure']})
+    for column in columns:
+        counts = totals[f"Mesures_{column}"]
+        profile[f"Mesures_{column}"] = counts
+        profile[column] = (totals[f"Somme_{column}"] / counts.where(counts > 0)).round(1)
+    profile = profile.sort_values(['Jour', 'Heure'], ignore_index=True)
+
+    with _profile_lock:
+        _profile_cache[key] = (version, profile)
+        if len(_profile_cache) > PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+    return profile.copy()
+
+
+def profile_matrix(profile, column):
+    """Tableau 7 × 24 (jours × heures) des moyennes d'une colonne, cases vides à NaN."""
+    matrix = profile.pivot(index='Jour', columns='Heure', values=column)
+    matrix = matrix.reindex(index=range(7), columns=range(24))
+    matrix.index = WEEKDAYS
+    return matrix
+
+
+def count_matrix(profile, column):
+    """Tableau 7 × 24 du nombre de mesures de chaque case."""
+    matrix = profile.pivot(index='Jour', columns='Heure', values=f"Mesures_{column}")
+    matrix = matrix.reindex(index=range(7), columns=range(24)).fillna(0).astype(int)
+    matrix.index = WEEKDAYS
+    return matrix